@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import numpy as np
+import uniflex_module_wifi_ath
+from uniflex_module_wifi_ath.ath_module import CSIReaderThread
+from uniflex_module_wifi_ath.csi import receiver, sim
+from uniflex_module_wifi_ath.csi.batch import decode_csi_batch
+from uniflex_module_wifi_ath.csi.decoder import get_csi_matrix, get_csi_matrix_scalar
+from uniflex_module_wifi_ath.csi.pool import CSIDecodePool
+from uniflex_module_wifi_ath.csi.ring import CSIRingBuffer
+
+'''
+    CSI pipeline benchmark on synthetic CSI; no Atheros hardware required.
+    Reports packets/s and us/packet for decoding, reading, draining into
+    the ring (in the reader thread and with --workers in worker processes)
+    and collector delivery. With --min-pps the script fails if any stage is
+    slower, which allows to catch performance regressions in CI.
+'''
+
+
+def report(name, num_pkts, duration):
+    pps = num_pkts / duration
+    print("%-24s %10.0f pkts/s %10.2f us/pkt" % (name, pps, 1e6 * duration / num_pkts))
+    return pps
+
+
+def bench_decode(records, scalar=False):
+    pkts = [rec for rec in records]
+    decode = get_csi_matrix_scalar if scalar else get_csi_matrix
+    start = time.perf_counter()
+    for hdr, csi, pld in pkts:
+        decode(csi, hdr[0]['nr'], hdr[0]['nc'], hdr[0]['num_tones'])
+    return time.perf_counter() - start
+
+
+def bench_decode_batch(records):
+    hdrs = np.concatenate([hdr for hdr, csi, pld in records])
+    bufs = [csi for hdr, csi, pld in records]
+    out = {}
+    start = time.perf_counter()
+    decode_csi_batch(bufs, hdrs, out)
+    return time.perf_counter() - start
+
+
+def bench_read(path):
+    num_pkts = 0
+    start = time.perf_counter()
+    with receiver.CSIReader(path) as reader:
+        for rec in reader.records():
+            num_pkts += 1
+    return num_pkts, time.perf_counter() - start
+
+
+class BenchModule(object):
+    log = logging.getLogger('bench_csi')
+
+
+def bench_drain(path, num_workers=0):
+    # reader thread draining all records into the ring; w/ workers decoded by
+    # the pool directly into the ring in shared memory
+    pool = CSIDecodePool(num_workers) if num_workers else None
+    ring = CSIRingBuffer(1024, shared=pool is not None)
+    reader = CSIReaderThread(BenchModule(), ring, path, decode_pool=pool)
+    reader.fill_ring = True
+    if pool is not None:
+        # start the workers before measuring
+        with receiver.CSIReader(path) as csi_reader:
+            reader.drain(csi_reader)
+    start = time.perf_counter()
+    with receiver.CSIReader(path) as csi_reader:
+        num_pkts = reader.drain(csi_reader)
+    duration = time.perf_counter() - start
+    if pool is not None:
+        pool.close()
+    ring.close()
+    return num_pkts, duration
+
+
+def bench_collector(path, num_pkts, batch_size, timeout):
+    # CSI collector reading from a FIFO fed by the simulator
+    fifo = path + '.fifo'
+    simulator = sim.CSISimulator(fifo, num_pkts, seed=0).start()
+
+    wifi = uniflex_module_wifi_ath.AthModule(csi_dev=fifo)
+    delivered = []
+    wifi.send_event = lambda event: delivered.append(len(event.sample))
+
+    start = time.perf_counter()
+    wifi.csi_collector_start(0.01, batch_size=batch_size, batch_ival=0.01 if batch_size > 1 else None)
+    while sum(delivered) + wifi.get_csi_collector_stats()['dropped'] < num_pkts:
+        if time.perf_counter() - start > timeout:
+            # e.g. reader thread died; the simulator may block on the FIFO, do not wait for it
+            wifi.csi_collector_stop()
+            wifi.csi_reader_stop()
+            os.unlink(fifo)
+            raise RuntimeError("collector delivered %d of %d packets within %.1f s"
+                               % (sum(delivered), num_pkts, timeout))
+        time.sleep(0.001)
+    duration = time.perf_counter() - start
+
+    wifi.csi_collector_stop()
+    wifi.csi_reader_stop()
+    simulator.stop()
+    os.unlink(fifo)
+    return sum(delivered), duration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='CSI pipeline benchmark')
+    parser.add_argument('--num', type=int, default=10000, help='number of packets')
+    parser.add_argument('--shape', type=int, nargs=3, default=[3, 3, 114], help='nr nc num_tones')
+    parser.add_argument('--batch', type=int, default=64, help='collector batch size')
+    parser.add_argument('--scalar', action='store_true', help='include the reference decoder')
+    parser.add_argument('--no-collector', action='store_true', help='skip collector delivery')
+    parser.add_argument('--workers', type=int, nargs='*', default=[],
+                        help='also drain with these numbers of decode worker processes')
+    parser.add_argument('--min-pps', type=float, default=None, help='fail below this rate')
+    parser.add_argument('--timeout', type=float, default=60, help='max. time per collector run in seconds')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'csi.bin')
+    sim.write_csi_file(path, args.num, shapes=[tuple(args.shape)], seed=0)
+    records = [(h.copy(), c.copy(), p.copy()) for h, c, p in receiver.CSIReader(path)]
+
+    results = {}
+    if args.scalar:
+        num = min(args.num, 200)
+        results['decode (scalar)'] = report('decode (scalar)', num, bench_decode(records[:num], scalar=True))
+    results['decode'] = report('decode', args.num, bench_decode(records))
+    results['decode (batch)'] = report('decode (batch)', args.num, bench_decode_batch(records))
+
+    num, duration = bench_read(path)
+    results['read'] = report('read', num, duration)
+    for num_workers in [0] + args.workers:
+        name = 'drain (%d workers)' % num_workers if num_workers else 'drain'
+        num, duration = bench_drain(path, num_workers)
+        results[name] = report(name, num, duration)
+
+    if not args.no_collector:
+        for batch_size in sorted(set([1, args.batch])):
+            name = 'collector (batch %d)' % batch_size
+            try:
+                num, duration = bench_collector(path, args.num, batch_size, args.timeout)
+            except RuntimeError as e:
+                print("%s failed: %s" % (name, str(e)))
+                sys.exit(1)
+            results[name] = report(name, num, duration)
+
+    os.unlink(path)
+    os.rmdir(tmpdir)
+
+    if args.min_pps is not None:
+        slow = [name for name, pps in results.items() if pps < args.min_pps and 'scalar' not in name]
+        if slow:
+            print("Below %.0f pkts/s: %s" % (args.min_pps, ', '.join(slow)))
+            sys.exit(1)
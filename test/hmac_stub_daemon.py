@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import zmq
+
+'''
+    Stub of the hMAC userspace daemon speaking its ZMQ REQ/REP control
+    protocol; use it instead of the real daemon for testing, e.g.:
+    wifi.exec_file = 'test/hmac_stub_daemon.py'
+    Env.: HMAC_STUB_PORT control port (default 1217),
+          HMAC_STUB_DELAY startup delay in seconds (default 0)
+'''
+if __name__ == '__main__':
+
+    port = int(os.environ.get('HMAC_STUB_PORT', 1217))
+    time.sleep(float(os.environ.get('HMAC_STUB_DELAY', 0)))
+
+    # initial configuration is passed as: -c<conf>
+    conf = [arg[2:] for arg in sys.argv[1:] if arg.startswith('-c')]
+    print("hMAC stub started: %s" % (conf[0] if conf else None))
+
+    context = zmq.Context()
+    socket = context.socket(zmq.REP)
+    socket.bind("tcp://*:" + str(port))
+
+    while True:
+        message = socket.recv()
+        print("hMAC stub received: %s" % message)
+        socket.send(b'OK')
+        if message == b'TERMINATE':
+            break
+
+    socket.close()
+    context.term()
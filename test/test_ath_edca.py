@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import errno
+import pytest
+import uniflex_module_wifi_ath
+from uniflex.core import exceptions
+
+'''
+    EDCA configuration and readback against a temp debugfs root.
+'''
+
+
+class FakeResolver(object):
+    def get_phy_name(self, iface):
+        return 'phy0'
+
+
+class QueueParams(object):
+    def __init__(self, aifs, cwmin, cwmax, txop):
+        self.params = (aifs, cwmin, cwmax, txop)
+
+    def getAifs(self):
+        return self.params[0]
+
+    def getCwMin(self):
+        return self.params[1]
+
+    def getCwMax(self):
+        return self.params[2]
+
+    def getTxOp(self):
+        return self.params[3]
+
+
+def make_module(tmp_path):
+    os.makedirs(str(tmp_path / 'phy0' / 'ath9k'))
+    (tmp_path / 'phy0' / 'ath9k' / 'txq_params').write_text('')
+
+    wifi = uniflex_module_wifi_ath.AthModule(debugfs_root=str(tmp_path))
+    wifi._phy_resolver.stop_monitor()
+    wifi._phy_resolver = FakeResolver()
+
+    writes = []
+    write = wifi._debugfs.write
+
+    def logged_write(phy, driver, name, value):
+        writes.append(value)
+        return write(phy, driver, name, value)
+    wifi._debugfs.write = logged_write
+    return wifi, writes
+
+
+def test_bulk_edca(tmp_path):
+    wifi, writes = make_module(tmp_path)
+    params = {0: QueueParams(2, 3, 7, 0), 1: QueueParams(2, 7, 15, 0)}
+
+    assert wifi.set_mac_access_parameters_bulk('wlan0', params) == {0: 'written', 1: 'written'}
+    assert writes == ['0 2 3 7 0', '1 2 7 15 0']
+
+    # unchanged queues are skipped unless forced
+    del writes[:]
+    assert wifi.set_mac_access_parameters_bulk('wlan0', params) == {0: 'skipped', 1: 'skipped'}
+    assert writes == []
+    assert wifi.set_mac_access_parameters_bulk('wlan0', params, force=True) == {0: 'written', 1: 'written'}
+    assert len(writes) == 2
+
+    del writes[:]
+    params[1] = QueueParams(3, 7, 15, 0)
+    assert wifi.set_mac_access_parameters_bulk('wlan0', params) == {0: 'skipped', 1: 'written'}
+    assert writes == ['1 3 7 15 0']
+
+    # single queue setter updates the state as well
+    wifi.set_mac_access_parameters('wlan0', 0, QueueParams(1, 1, 3, 0))
+    assert wifi.set_mac_access_parameters_bulk('wlan0', {0: QueueParams(1, 1, 3, 0)}) == {0: 'skipped'}
+
+
+def test_bulk_edca_failed_write(tmp_path):
+    wifi, writes = make_module(tmp_path)
+    params = {0: QueueParams(2, 3, 7, 0)}
+    wifi.set_mac_access_parameters_bulk('wlan0', params)
+
+    # the driver rejects the value: the state of the queue is unknown afterwards
+    write = wifi._debugfs.write
+
+    def failing_write(phy, driver, name, value):
+        raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+    wifi._debugfs.write = failing_write
+    with pytest.raises(exceptions.FunctionExecutionFailedException):
+        wifi.set_mac_access_parameters_bulk('wlan0', {0: QueueParams(1, 1, 3, 0)})
+
+    wifi._debugfs.write = write
+    del writes[:]
+    assert wifi.set_mac_access_parameters_bulk('wlan0', params) == {0: 'written'}
+    assert writes == ['0 2 3 7 0']
+
+
+TXQ_PARAMS = ("(VO):  qnum: 3 aifs: 2 cwmin: 3 cwmax: 7 burstTime: 15 readyTime: 0\n"
+              "(VI):  qnum: 2 aifs: 2 cwmin: 7 cwmax: 15 burstTime: 30 readyTime: 0\n"
+              "(BE):  qnum: 1 aifs: 3 cwmin: 15 cwmax: 1023 burstTime: 0 readyTime: 0\n"
+              "(BK):  qnum: 0 aifs: 7 cwmin: 15 cwmax: 1023 burstTime: 0 readyTime: 0\n")
+
+
+def test_get_edca_cached(tmp_path):
+    wifi, writes = make_module(tmp_path)
+    wifi._debugfs_cache.ttl = 60
+    path = tmp_path / 'phy0' / 'ath9k' / 'txq_params'
+    path.write_text(TXQ_PARAMS)
+
+    params = wifi.get_mac_access_parameters('wlan0')
+    assert list(params) == ['VO', 'VI', 'BE', 'BK']
+    assert (params['BE'].aifs, params['BE'].cwmin, params['BE'].cwmax) == (3, 15, 1023)
+
+    # served from the cache; callers get copies
+    path.write_text(TXQ_PARAMS.replace('aifs: 3', 'aifs: 4'))
+    params.clear()
+    assert wifi.get_mac_access_parameters('wlan0')['BE'].aifs == 3
+
+    # invalidated by the module's own setters
+    wifi.set_mac_access_parameters('wlan0', 1, QueueParams(4, 15, 1023, 0))
+    path.write_text(TXQ_PARAMS.replace('aifs: 3', 'aifs: 4'))
+    assert wifi.get_mac_access_parameters('wlan0')['BE'].aifs == 4
+
+
+if __name__ == '__main__':
+    import pathlib
+    import tempfile
+    test_bulk_edca(pathlib.Path(tempfile.mkdtemp()))
+    test_bulk_edca_failed_write(pathlib.Path(tempfile.mkdtemp()))
+    test_get_edca_cached(pathlib.Path(tempfile.mkdtemp()))
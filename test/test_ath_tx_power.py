@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import pytest
+import uniflex_module_wifi_ath
+import uniflex_module_wifi_ath.ath_module as ath_module
+from uniflex.core import exceptions
+
+'''
+    Per flow TX power: flow index, iptables transactions and driver table,
+    with a fake iptc and a fake per_flow_tx_power debugfs file.
+'''
+
+FlowId = collections.namedtuple('FlowId', ['srcAddress', 'dstAddress', 'prot', 'srcPort', 'dstPort'])
+
+
+def flow(ii):
+    return FlowId('10.0.0.1', '10.0.1.%d' % ii, 'udp', None, 5000 + ii)
+
+
+class FakeRule(object):
+    def __init__(self):
+        self.src = self.dst = self.protocol = None
+        self.matches = []
+        self.target = None
+
+    def add_match(self, match):
+        self.matches.append(match)
+
+
+class FakeMatch(object):
+    def __init__(self, rule, name):
+        self.name = name
+        self.sport = self.dport = None
+
+
+class FakeTarget(object):
+    def __init__(self, rule, name):
+        self.name = name
+        self.set_mark = None
+
+    def get_all_parameters(self):
+        return {'set-xmark': ['0x%x/0xffffffff' % int(self.set_mark)]}
+
+
+class FakeIptc(object):
+    """
+    Minimal python-iptables: changes are staged while autocommit is off
+    and discarded by refresh().
+    """
+    Rule = FakeRule
+    Match = FakeMatch
+    Target = FakeTarget
+
+    def __init__(self):
+        self.committed = collections.defaultdict(list)
+        self.commits = 0
+        self.fail_commit = False
+        iptc = self
+
+        class Table(object):
+            def __init__(self, name):
+                self.name = name
+                self.work = None
+
+            @property
+            def autocommit(self):
+                return self.work is None
+
+            @autocommit.setter
+            def autocommit(self, value):
+                self.work = None if value else iptc.copy()
+
+            def rules(self, chain):
+                return (iptc.committed if self.work is None else self.work)[(self.name, chain)]
+
+            def commit(self):
+                if iptc.fail_commit:
+                    raise RuntimeError('commit failed')
+                iptc.committed = self.work
+                self.work = iptc.copy()
+                iptc.commits += 1
+
+            def refresh(self):
+                if self.work is not None:
+                    self.work = iptc.copy()
+
+        class Chain(object):
+            def __init__(self, table, name):
+                self.table = table
+                self.name = name
+
+            @property
+            def rules(self):
+                return list(self.table.rules(self.name))
+
+            def insert_rule(self, rule):
+                self.table.rules(self.name).insert(0, rule)
+
+            def delete_rule(self, rule):
+                self.table.rules(self.name).remove(rule)
+
+        self.Table = Table
+        self.Chain = Chain
+
+    def copy(self):
+        return collections.defaultdict(list, ((k, list(v)) for k, v in self.committed.items()))
+
+    def marks(self, table='mangle', chain='POSTROUTING'):
+        return sorted(int(rule.target.set_mark) for rule in self.committed[(table, chain)])
+
+
+class FakeDriver(object):
+    """
+    per_flow_tx_power file of the patched ath9k driver.
+    """
+    BUF_SIZE = 1024
+
+    def __init__(self):
+        # newest entry first, as in the driver list
+        self.table = collections.OrderedDict()
+        self.writes = []
+
+    def write(self, phy, driver, name, value):
+        self.writes.append(value)
+        mark, power, rate = [int(v) for v in value.split()]
+        if mark == 0:
+            self.table.clear()
+        elif mark < 0:
+            self.table.pop(-mark, None)
+        elif mark in self.table:
+            self.table[mark] = power
+        else:
+            self.table[mark] = power
+            self.table.move_to_end(mark, last=False)
+        return len(value)
+
+    def read(self, phy, driver, name):
+        buf = "Per-flow TxPower list\n"
+        for mark, power in self.table.items():
+            buf += "Mark: %d Power: %d Rate: %d\n" % (mark, power, 0)
+        return buf[:self.BUF_SIZE - 1]
+
+
+class FakeTrafficControl(object):
+    def __init__(self):
+        self.mark = 0
+
+    def generateMark(self):
+        self.mark += 1
+        return self.mark
+
+
+class FakeResolver(object):
+    def get_phy_name(self, iface):
+        return 'phy0'
+
+
+def make_module(monkeypatch):
+    iptc = FakeIptc()
+    monkeypatch.setattr(ath_module, 'iptc', iptc)
+
+    wifi = uniflex_module_wifi_ath.AthModule()
+    wifi._phy_resolver.stop_monitor()
+    wifi._phy_resolver = FakeResolver()
+    wifi._tc_mgr = FakeTrafficControl()
+    wifi._debugfs = FakeDriver()
+    return wifi, iptc, wifi._debugfs
+
+
+def test_set_per_flow_tx_power(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+
+    # repeated calls keep mark and rule of the flow
+    assert wifi.set_per_flow_tx_power('wlan0', flow(1), 10)
+    assert wifi.set_per_flow_tx_power('wlan0', flow(1), 10)
+    assert wifi.set_per_flow_tx_power('wlan0', flow(1), 12)
+    assert iptc.marks() == [1]
+    assert iptc.commits == 1
+    assert dict(driver.table) == {1: 12}
+
+    assert wifi.set_per_flow_tx_power('wlan0', flow(2), 5)
+    assert iptc.marks() == [1, 2]
+    assert dict(driver.table) == {1: 12, 2: 5}
+    assert wifi.get_per_flow_tx_power_table('wlan0') == {1: 12, 2: 5}
+
+
+def test_batch(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+
+    report = wifi.set_per_flow_tx_power_batch('wlan0', dict((flow(ii), 10 + ii) for ii in range(3)))
+    assert report == {'added': 3, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    assert iptc.marks() == [1, 2, 3]
+    assert iptc.commits == 1
+
+    report = wifi.set_per_flow_tx_power_batch('wlan0', [(flow(0), 10), (flow(1), 20), (flow(3), 13)],
+                                              removeFlows=[flow(2)])
+    assert report == {'added': 1, 'updated': 1, 'removed': 1, 'unchanged': 1}
+    assert iptc.marks() == [1, 2, 4]
+    assert iptc.commits == 2
+    assert dict(driver.table) == {1: 10, 2: 20, 4: 13}
+
+    # a flow given twice is rejected before anything is changed
+    with pytest.raises(exceptions.FunctionExecutionFailedException):
+        wifi.set_per_flow_tx_power_batch('wlan0', [(flow(5), 1), (flow(5), 2)])
+    assert iptc.marks() == [1, 2, 4]
+    assert iptc.commits == 2
+
+
+def test_failed_commit_rolls_back(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+    wifi.set_per_flow_tx_power_batch('wlan0', {flow(0): 10})
+
+    iptc.fail_commit = True
+    with pytest.raises(exceptions.FunctionExecutionFailedException):
+        wifi.set_per_flow_tx_power_batch('wlan0', {flow(1): 11, flow(2): 12}, removeFlows=[flow(0)])
+    assert iptc.marks() == [1]
+    assert dict(driver.table) == {1: 10}
+
+    # nothing was recorded for the failed transaction
+    iptc.fail_commit = False
+    report = wifi.set_per_flow_tx_power_batch('wlan0', {flow(0): 10, flow(1): 11})
+    assert report == {'added': 1, 'updated': 0, 'removed': 0, 'unchanged': 1}
+    assert len(iptc.marks()) == 2
+    assert sorted(driver.table.values()) == [10, 11]
+
+
+def test_clean(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+    wifi.set_per_flow_tx_power_batch('wlan0', dict((flow(ii), 10) for ii in range(3)))
+
+    assert wifi.clean_per_flow_tx_power_table('wlan0')
+    assert iptc.marks() == []
+    assert dict(driver.table) == {}
+
+    # flows are installed again from scratch
+    wifi.set_per_flow_tx_power('wlan0', flow(0), 10)
+    assert iptc.marks() == [4]
+    assert dict(driver.table) == {4: 10}
+
+
+def test_get_table_cached(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+    wifi._debugfs_cache.ttl = 60
+    wifi.set_per_flow_tx_power('wlan0', flow(0), 10)
+
+    table = wifi.get_per_flow_tx_power_table('wlan0')
+    assert table == {1: 10}
+
+    # served from the cache; callers get copies
+    driver.table[7] = 3
+    table.clear()
+    assert wifi.get_per_flow_tx_power_table('wlan0') == {1: 10}
+
+    # invalidated by the module's own setters
+    wifi.set_per_flow_tx_power('wlan0', flow(0), 12)
+    assert wifi.get_per_flow_tx_power_table('wlan0') == {1: 12, 7: 3}
+
+
+def test_reconcile(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+    wifi.set_per_flow_tx_power_batch('wlan0', {flow(0): 10, flow(1): 11, flow(2): 12})
+
+    # changed underneath in the driver
+    driver.table[2] = 3
+    del driver.writes[:]
+    report = wifi.reconcile_per_flow_tx_power('wlan0', {flow(0): 10, flow(1): 11, flow(3): 13})
+    assert report == {'added': 1, 'updated': 1, 'removed': 1, 'unchanged': 1, 'stale': 0}
+    assert iptc.marks() == [1, 2, 4]
+    assert dict(driver.table) == {1: 10, 2: 11, 4: 13}
+    assert sorted(driver.writes) == ['-3 0 0', '2 11 0', '4 13 0']
+
+
+def test_reconcile_stale_entries(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+
+    # left by a previous instance: driver entries, one with its rule, and a
+    # foreign rule w/o driver entry
+    driver.table.update({1: 10, 2: 12})
+    rules = iptc.committed[('mangle', 'POSTROUTING')]
+    rules.append(wifi._make_marking_rule(flow(9), 2))
+    rules.append(wifi._make_marking_rule(flow(8), 3))
+
+    report = wifi.reconcile_per_flow_tx_power('wlan0', {flow(0): 15, flow(1): 16})
+    assert report == {'added': 2, 'updated': 0, 'removed': 0, 'unchanged': 0, 'stale': 2}
+    # marks in use are not reused; one transaction
+    assert iptc.marks() == [3, 4, 5]
+    assert iptc.commits == 1
+    assert dict(driver.table) == {4: 15, 5: 16}
+
+    report = wifi.reconcile_per_flow_tx_power('wlan0', {flow(0): 15, flow(1): 16})
+    assert report == {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 2, 'stale': 0}
+
+
+def test_reconcile_truncated_readback(monkeypatch):
+    wifi, iptc, driver = make_module(monkeypatch)
+    flows = dict((flow(ii), 10) for ii in range(60))
+    wifi.set_per_flow_tx_power_batch('wlan0', flows)
+    assert len(wifi.get_per_flow_tx_power_table('wlan0')) < 60
+
+    # entries missing from the readback are not rewritten
+    del driver.writes[:]
+    report = wifi.reconcile_per_flow_tx_power('wlan0', flows)
+    assert report == {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 60, 'stale': 0}
+    assert driver.writes == []
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from uniflex_module_wifi_ath.csi.constants import DTYPE_CSI_HDR, CSI_REPRS
+from uniflex_module_wifi_ath.csi.decoder import get_csi_matrix
+from uniflex_module_wifi_ath.csi.batch import group_csi_shapes, decode_csi_batch, CSIBatchDecoder
+
+'''
+    Batch decoding of CSI packets of mixed shapes compared to decoding
+    packet by packet.
+'''
+
+SHAPES = [(3, 3, 114), (2, 1, 56), (1, 2, 56)]
+
+
+def make_packets(num_pkts, shapes=SHAPES, seed=0):
+    rng = np.random.RandomState(seed)
+    hdrs = np.zeros(num_pkts, dtype=DTYPE_CSI_HDR)
+    bufs = []
+    for ii in range(num_pkts):
+        nr, nc, num_tones = shapes[ii % len(shapes)]
+        hdrs[ii]['nr'], hdrs[ii]['nc'], hdrs[ii]['num_tones'] = nr, nc, num_tones
+        bufs.append(rng.randint(0, 256, (2 * 10 * nr * nc * num_tones + 7) // 8).astype(np.uint8))
+    return hdrs, bufs
+
+
+def test_group_csi_shapes():
+    hdrs, bufs = make_packets(8)
+    groups = group_csi_shapes(hdrs)
+    assert sorted(groups) == sorted(SHAPES)
+    assert list(groups[(3, 3, 114)]) == [0, 3, 6]
+    assert list(groups[(2, 1, 56)]) == [1, 4, 7]
+    assert list(groups[(1, 2, 56)]) == [2, 5]
+
+    assert group_csi_shapes(hdrs[:0]) == {}
+
+
+@pytest.mark.parametrize('csi_repr', CSI_REPRS)
+def test_decode_csi_batch(csi_repr):
+    hdrs, bufs = make_packets(10)
+
+    # short buffer and invalid dimensions are skipped
+    bufs[4] = bufs[4][:10]
+    hdrs[8]['nr'] = 0
+    with pytest.warns(RuntimeWarning):
+        result = decode_csi_batch(bufs, hdrs, csi_repr=csi_repr)
+
+    decoded = {}
+    for shape, (idx, matrices) in result.items():
+        assert len(idx) == len(matrices)
+        for ii, csi_matrix in zip(idx, matrices):
+            decoded[int(ii)] = csi_matrix
+    assert sorted(decoded) == [0, 1, 2, 3, 5, 6, 7, 9]
+
+    for ii, csi_matrix in decoded.items():
+        shape = (int(hdrs[ii]['nr']), int(hdrs[ii]['nc']), int(hdrs[ii]['num_tones']))
+        ref = get_csi_matrix(bufs[ii], *shape, csi_repr=csi_repr)
+        assert csi_matrix.dtype == ref.dtype
+        assert np.array_equal(csi_matrix, ref)
+
+
+@pytest.mark.parametrize('csi_repr', CSI_REPRS)
+def test_batch_decoder_reuses_output(csi_repr):
+    decoder = CSIBatchDecoder(csi_repr)
+    hdrs, bufs = make_packets(9)
+    first = decoder.decode(bufs, hdrs)
+
+    # same or fewer packets per shape: decoded into the same arrays
+    hdrs, bufs = make_packets(6, seed=1)
+    second = decoder.decode(bufs, hdrs)
+    for shape, (idx, matrices) in second.items():
+        assert np.shares_memory(matrices, first[shape][1])
+        for ii, csi_matrix in zip(idx, matrices):
+            assert np.array_equal(csi_matrix, get_csi_matrix(bufs[ii], *shape, csi_repr=csi_repr))
+
+    # more packets: grown
+    hdrs, bufs = make_packets(30, seed=2)
+    third = decoder.decode(bufs, hdrs)
+    assert len(third[(3, 3, 114)][1]) == 10
+    assert not np.shares_memory(third[(3, 3, 114)][1], first[(3, 3, 114)][1])
+
+    decoder.clear()
+    assert decoder.decode(bufs[:0], hdrs[:0]) == {}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from uniflex_module_wifi_ath.csi.constants import CSI_REPRS, CSI_REPR_INT16
+from uniflex_module_wifi_ath.csi.decoder import get_csi_matrix, get_csi_matrix_scalar, pack_csi_matrix, csi_matrix_repr
+
+'''
+    Equivalence of vectorized and reference CSI decoder, in all CSI
+    representations; packing CSI matrices again.
+'''
+
+
+def test_vectorized_decoder_matches_reference():
+    rng = np.random.RandomState(0)
+
+    for nr, nc, num_tones in [(1, 1, 56), (2, 2, 56), (3, 3, 114), (3, 2, 114), (2, 1, 3)]:
+        csi_len = (2 * 10 * nr * nc * num_tones + 7) // 8
+        # odd and even buffer lengths exercise the zero padding at the end
+        for extra in [0, 1, 2]:
+            buf = rng.randint(0, 256, csi_len + extra).astype(np.uint8)
+            ref = get_csi_matrix_scalar(buf, nr, nc, num_tones)
+            vec = get_csi_matrix(buf, nr, nc, num_tones)
+            assert vec.shape == (nr, nc, num_tones)
+            assert vec.dtype == ref.dtype
+            assert np.array_equal(vec, ref)
+
+
+@pytest.mark.parametrize('csi_repr', CSI_REPRS)
+def test_csi_representations(csi_repr):
+    rng = np.random.RandomState(1)
+
+    for nr, nc, num_tones in [(1, 1, 56), (3, 2, 114), (2, 1, 3)]:
+        buf = rng.randint(0, 256, (2 * 10 * nr * nc * num_tones + 7) // 8).astype(np.uint8)
+        ref = get_csi_matrix_scalar(buf, nr, nc, num_tones)
+        csi_matrix = get_csi_matrix(buf, nr, nc, num_tones, csi_repr=csi_repr)
+        assert csi_matrix.dtype == np.dtype(csi_repr)
+
+        # 10 bit values are exact in every representation
+        if csi_repr == CSI_REPR_INT16:
+            assert csi_matrix.shape == (nr, nc, num_tones, 2)
+            assert np.array_equal(csi_matrix[..., 0], ref.real)
+            assert np.array_equal(csi_matrix[..., 1], ref.imag)
+        else:
+            assert csi_matrix.shape == (nr, nc, num_tones)
+            assert np.array_equal(csi_matrix, ref)
+
+        assert csi_matrix_repr(csi_matrix) == csi_repr
+        assert np.array_equal(pack_csi_matrix(csi_matrix), buf)
+
+
+if __name__ == '__main__':
+    test_vectorized_decoder_matches_reference()
+    for csi_repr in CSI_REPRS:
+        test_csi_representations(csi_repr)
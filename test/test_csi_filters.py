@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from uniflex_module_wifi_ath.csi import sim
+from uniflex_module_wifi_ath.csi.constants import DTYPE_CSI_HDR
+from uniflex_module_wifi_ath.csi.receiver import CSI_HDR_LEN
+from uniflex_module_wifi_ath.csi.filters import CSIFilter, CSIFilterChain, FieldFilter, PhyErrFilter, \
+    RateFilter, ChanBwFilter, StreamsFilter, RSSIFilter, PayloadFilter, MACFilter
+
+'''
+    CSI record filters on simulated records: header fields, payload and
+    transmitter address; drop counters of the filter chain.
+'''
+
+RA = '00:11:22:33:44:55'
+TA = '66:77:88:99:aa:bb'
+
+
+def wlan_frame(ta=TA, ra=RA, data=b'hello'):
+    # data frame: frame control, duration, addr1 (RA), addr2 (TA), addr3, seq
+    mac = [bytes(int(b, 16) for b in addr.split(':')) for addr in (ra, ta, ra)]
+    return b'\x08\x00' + b'\x00\x00' + b''.join(mac) + b'\x00\x00' + data
+
+
+def make_record(shape=(3, 3, 114), pld=None, **kwargs):
+    rec = sim.make_csi_record(sim.random_csi_matrix(*shape), wlan_frame() if pld is None else pld, **kwargs)
+    hdr = np.frombuffer(rec[:CSI_HDR_LEN], dtype=DTYPE_CSI_HDR)
+    pld = np.frombuffer(rec, dtype=np.uint8)[len(rec) - int(hdr[0]['pld_len']):]
+    return hdr, hdr.tobytes(), pld
+
+
+def accepts(f, **kwargs):
+    return bool(f.accept(*make_record(**kwargs)))
+
+
+def test_header_filters():
+    f = PhyErrFilter()
+    assert accepts(f) and not accepts(f, phyerr=3)
+
+    f = RateFilter([0x80, 0x88])
+    assert accepts(f, shape=(2, 2, 56)) and accepts(f, shape=(2, 1, 56))
+    assert not accepts(f) and not accepts(f, shape=(2, 1, 56), rate=0x0b)
+
+    f = ChanBwFilter([1])
+    assert accepts(f, shape=(3, 3, 114)) and not accepts(f, shape=(3, 3, 56))
+
+    f = StreamsFilter(nr=[3])
+    assert accepts(f, shape=(3, 1, 56)) and not accepts(f, shape=(2, 1, 56))
+    f = StreamsFilter(nr=[2, 3], nc=[1])
+    assert accepts(f, shape=(2, 1, 56)) and not accepts(f, shape=(2, 2, 56))
+    assert accepts(StreamsFilter(), shape=(1, 1, 56))
+
+    f = RSSIFilter(30)
+    assert accepts(f, rssi=(10, 30, 20)) and not accepts(f, rssi=(10, 29, 20))
+    f = RSSIFilter(30, field='rssi_1')
+    assert accepts(f, rssi=(50, 30, 50)) and not accepts(f, rssi=(50, 29, 50))
+
+    # only single byte header fields
+    with pytest.raises(ValueError):
+        FieldFilter('channel', [2437])
+
+
+def test_payload_filters():
+    f = PayloadFilter(b'hello')
+    assert accepts(f) and not accepts(f, pld=wlan_frame(data=b'world'))
+    f = PayloadFilter(b'hello', offset=24)
+    assert accepts(f) and not accepts(f, pld=wlan_frame(data=b'xhello'))
+    assert not accepts(f, pld=b'short')
+
+    # transmitter, not receiver address at WLAN_TA_OFFSET
+    assert accepts(MACFilter(TA)) and accepts(MACFilter(['01:02:03:04:05:06', TA.upper()]))
+    assert not accepts(MACFilter(RA))
+    assert accepts(MACFilter(bytes.fromhex('66778899aabb')))
+    assert not accepts(MACFilter(TA), pld=wlan_frame()[:12])
+
+
+def test_abstract_filter():
+    with pytest.raises(TypeError):
+        CSIFilter()
+
+
+def test_filter_chain():
+    chain = CSIFilterChain([PhyErrFilter(), RSSIFilter(30), RSSIFilter(20, field='rssi_0'), MACFilter(TA)])
+    records = [make_record(), make_record(phyerr=1), make_record(rssi=(10, 10, 10)),
+               make_record(rssi=(10, 40, 40)), make_record(pld=wlan_frame(ta=RA)), make_record()]
+
+    # dropped by the first rejecting filter
+    assert [chain(hdr, pld) for hdr, raw, pld in records] == [True, False, False, False, False, True]
+    assert chain.get_stats() == {'passed': 2, 'phyerr': 1, 'rssi': 1, 'rssi_0': 1, 'mac': 1}
+
+    # w/o filters all records pass
+    chain = CSIFilterChain()
+    assert all(chain(hdr, pld) for hdr, raw, pld in records)
+    assert chain.get_stats() == {'passed': 6}
+
+    # filters of the same name are counted together
+    chain = CSIFilterChain([PhyErrFilter((0, 1)), PhyErrFilter((0,))])
+    assert [chain(hdr, pld) for hdr, raw, pld in records[:2]] == [True, False]
+    assert chain.get_stats() == {'passed': 1, 'phyerr': 1}
+
+
+if __name__ == '__main__':
+    test_header_filters()
+    test_payload_filters()
+    test_abstract_filter()
+    test_filter_chain()
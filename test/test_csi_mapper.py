@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import warnings
+import numpy as np
+from uniflex_module_wifi_ath.csi.constants import DTYPE_CSI_HDR
+from uniflex_module_wifi_ath.csi.mapper import map_csi_hdrs, map_csi_pkt_bw, map_csi_pkt_rate, map_csi_pkt_phyerr
+
+'''
+    Equivalence of vectorized and scalar CSI header mappers.
+'''
+
+
+def test_vectorized_mapper_matches_scalar():
+    rng = np.random.RandomState(0)
+    hdrs = np.zeros(1000, dtype=DTYPE_CSI_HDR)
+    hdrs['rate'] = rng.randint(120, 160, len(hdrs))
+    hdrs['chanbw'] = rng.randint(0, 3, len(hdrs))
+    hdrs['phyerr'] = rng.randint(0, 10, len(hdrs))
+    hdrs['noise'] = rng.randint(0, 256, len(hdrs))
+
+    meta, valid = map_csi_hdrs(hdrs)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for hdr, m, v in zip(hdrs, meta, valid):
+            bw = map_csi_pkt_bw(hdr['chanbw'])
+            rate = map_csi_pkt_rate(hdr['rate'], hdr['chanbw'])
+            phyerr = map_csi_pkt_phyerr(hdr['phyerr'])
+            assert v == (bw is not None and rate is not None and phyerr is not None)
+            if v:
+                assert (m['bw'], m['rate'], m['phyerr']) == (bw, np.float32(rate), phyerr)
+            assert m['noise'] == np.uint8(hdr['noise']).astype(np.int8)
+
+
+if __name__ == '__main__':
+    test_vectorized_mapper_matches_scalar()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pickle
+import numpy as np
+from uniflex_module_wifi_ath.csi import receiver, sim
+from uniflex_module_wifi_ath.csi.packet import CSIPacket, decode_csi_packets
+
+'''
+    Lazy CSI packets: decoding on access and round-trip with the structured form.
+'''
+
+
+def test_lazy_packet_round_trip(tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(path, 6, shapes=[(3, 3, 114), (2, 1, 56)], seed=0)
+
+    with receiver.CSIReader(path) as reader:
+        pkts = [CSIPacket(hdr, csi, pld) for hdr, csi, pld in reader.records()]
+
+    for pkt in pkts:
+        assert not pkt.is_decoded
+        csi_pkt = pkt.to_structured()
+        assert pkt.is_decoded
+        assert pkt.csi_matrix.shape == pkt.shape
+
+        # structured -> lazy -> structured keeps header, CSI and payload
+        again = CSIPacket.from_structured(csi_pkt)
+        assert again.csi == pkt.csi
+        assert again.payload == pkt.payload
+        assert again.to_structured().tobytes() == csi_pkt.tobytes()
+
+        # the decoded matrix is not pickled
+        restored = pickle.loads(pickle.dumps(pkt))
+        assert not restored.is_decoded
+        assert np.array_equal(restored.csi_matrix, pkt.csi_matrix)
+        assert len(pickle.dumps(pkt)) < csi_pkt.nbytes
+
+    lazy = [pickle.loads(pickle.dumps(pkt)) for pkt in pkts]
+    decode_csi_packets(lazy)
+    for pkt, ref in zip(lazy, pkts):
+        assert pkt.is_decoded
+        assert np.array_equal(pkt.csi_matrix, ref.csi_matrix)
+
+
+if __name__ == '__main__':
+    import pathlib
+    import tempfile
+    test_lazy_packet_round_trip(pathlib.Path(tempfile.mkdtemp()))
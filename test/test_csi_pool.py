@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import numpy as np
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from uniflex_module_wifi_ath.ath_module import CSIReaderThread
+from uniflex_module_wifi_ath.csi import receiver, sim
+from uniflex_module_wifi_ath.csi.decoder import get_csi_matrix
+from uniflex_module_wifi_ath.csi.filters import CSIFilterChain, StreamsFilter
+from uniflex_module_wifi_ath.csi.pool import CSIDecodePool
+from uniflex_module_wifi_ath.csi.ring import CSIRingBuffer
+
+'''
+    Decoding CSI records in worker processes, directly, into a shared CSI
+    ring and by the CSI reader thread, compared to decoding in the reader
+    thread; falling back to the reader thread if the pool is broken and no
+    decoding for raw sinks only.
+'''
+
+SHAPES = [(3, 3, 114), (2, 1, 56), (1, 2, 56)]
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = CSIDecodePool(2, chunk_size=4)
+    yield pool
+    pool.close()
+
+
+def read_records(path):
+    with receiver.CSIReader(path) as reader:
+        return [tuple(x.copy() for x in rec) for rec in reader.records()]
+
+
+def test_decode(pool, tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(path, 11, shapes=SHAPES, seed=0)
+    records = read_records(path)
+
+    # invalid buffer
+    hdr, csi, pld = records[5]
+    records[5] = (hdr, csi[:10], pld)
+
+    matrices = pool.decode(np.concatenate([hdr for hdr, csi, pld in records]),
+                           [csi for hdr, csi, pld in records])
+    assert len(matrices) == 11
+    assert matrices[5] is None
+    for (hdr, csi, pld), csi_matrix in zip(records, matrices):
+        if csi_matrix is not None:
+            shape = (int(hdr[0]['nr']), int(hdr[0]['nc']), int(hdr[0]['num_tones']))
+            assert np.array_equal(csi_matrix, get_csi_matrix(csi, *shape))
+
+    assert pool.decode(records[0][0][:0], []) == []
+
+
+class Module(object):
+    log = logging.getLogger('test_csi_pool')
+
+
+class BrokenPool(object):
+    def decode_into(self, ring, slots, hdrs, bufs):
+        raise BrokenProcessPool('worker died')
+
+
+def test_decode_into(pool, tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(path, 11, shapes=SHAPES, seed=0)
+    records = read_records(path)
+    hdrs = np.concatenate([hdr for hdr, csi, pld in records])
+
+    with pytest.raises(ValueError):
+        pool.decode_into(CSIRingBuffer(capacity=16), np.arange(11), hdrs, [])
+
+    ring = CSIRingBuffer(capacity=16, shared=True)
+    try:
+        ring.append(*records[0][:2])
+        slots = ring.reserve(hdrs, [0.0] * 11)
+        pool.decode_into(ring, slots, hdrs, [bytes(csi) for hdr, csi, pld in records])
+        matrices = ring.commit(slots)
+        for (hdr, csi, pld), csi_matrix in zip(records, matrices):
+            shape = (int(hdr[0]['nr']), int(hdr[0]['nc']), int(hdr[0]['num_tones']))
+            assert np.array_equal(csi_matrix, get_csi_matrix(csi, *shape))
+        assert ring.count == 12
+    finally:
+        ring.close()
+
+
+def drain(path, decode_pool=None, csi_filter=None):
+    # decode pool workers decode into the ring in shared memory
+    ring = CSIRingBuffer(capacity=64, shared=decode_pool is not None)
+    reader = CSIReaderThread(Module(), ring, path, csi_filter=csi_filter, decode_pool=decode_pool)
+    samples, raw = [], []
+    reader.add_sink(lambda hdr, csi_matrix, pld: samples.append((hdr.copy(), csi_matrix.copy(), pld.copy())))
+    reader.add_sink(lambda hdr, csi, pld: raw.append(int(hdr[0]['tstamp'])), raw=True)
+    with receiver.CSIReader(path) as csi_reader:
+        assert reader.drain(csi_reader) == 20
+    return ring, samples, raw
+
+
+def test_reader_drain(pool, tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(path, 20, shapes=SHAPES, seed=0)
+
+    csi_filter = CSIFilterChain([StreamsFilter(nc=[1, 3])])
+    ref_ring, ref_samples, ref_raw = drain(path, csi_filter=csi_filter)
+    ring, samples, raw = drain(path, pool, csi_filter=CSIFilterChain([StreamsFilter(nc=[1, 3])]))
+
+    # same records in the same order
+    assert raw == ref_raw
+    assert len(samples) == len(ref_samples) == 14
+    for (hdr, csi_matrix, pld), ref in zip(samples, ref_samples):
+        assert hdr.tobytes() == ref[0].tobytes()
+        assert np.array_equal(csi_matrix, ref[1])
+        assert np.array_equal(pld, ref[2])
+
+    for shape in SHAPES[:2]:
+        hdrs, matrices, rx_times = ring.latest(64, rx_times=True, shape=shape)
+        ref_hdrs, ref_matrices = ref_ring.latest(64, shape=shape)
+        assert hdrs.tobytes() == ref_hdrs.tobytes()
+        assert np.array_equal(matrices, ref_matrices)
+        assert np.all(np.diff(rx_times) >= 0)
+    ring.close()
+
+
+def test_reader_broken_pool(tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(path, 20, shapes=SHAPES, seed=0)
+    ref_ring, ref_samples, ref_raw = drain(path)
+
+    # decoded by the reader thread instead
+    ring, samples, raw = drain(path, BrokenPool())
+    assert len(samples) == len(ref_samples) == 20
+    for (hdr, csi_matrix, pld), ref in zip(samples, ref_samples):
+        assert hdr.tobytes() == ref[0].tobytes()
+        assert np.array_equal(csi_matrix, ref[1])
+    assert ring.count == 20
+    ring.close()
+
+
+@pytest.mark.parametrize('pooled', [False, True])
+def test_reader_raw_sinks_only(pooled, request, tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(path, 20, shapes=SHAPES, seed=0)
+    ring = CSIRingBuffer(capacity=64, shared=pooled)
+    reader = CSIReaderThread(Module(), ring, path, decode_pool=request.getfixturevalue('pool') if pooled else None)
+    raw = []
+    reader.add_sink(lambda hdr, csi, pld: raw.append(int(hdr[0]['tstamp'])), raw=True)
+
+    # nobody reads the ring
+    with receiver.CSIReader(path) as csi_reader:
+        assert reader.drain(csi_reader) == 20
+    assert len(raw) == 20 and ring.count == 0
+
+    reader.fill_ring = True
+    with receiver.CSIReader(path) as csi_reader:
+        assert reader.drain(csi_reader) == 20
+    assert len(raw) == 40 and ring.count == 20
+    ring.close()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
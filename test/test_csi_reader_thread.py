@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+import pytest
+import numpy as np
+from uniflex_module_wifi_ath.ath_module import CSIReaderThread, CSICollector, CSI_WAIT_POLL, CSI_WAIT_SLEEP
+from uniflex_module_wifi_ath.csi.sample_queue import DROP_NEWEST
+from uniflex_module_wifi_ath.csi import receiver, sim
+from uniflex_module_wifi_ath.csi.constants import DTYPE_CSI_HDR, CSI_REPRS
+from uniflex_module_wifi_ath.csi.decoder import csi_matrix_shape, csi_to_complex, get_csi_matrix_scalar
+from uniflex_module_wifi_ath.csi.ring import CSIRingBuffer
+
+'''
+    Waiting of the CSI reader thread on a FIFO as CSI device: no wakeups
+    while idle in poll mode, immediate stop and the fallback to sleep mode;
+    the CSI collector blocking on its queue and its events in all CSI
+    representations.
+'''
+
+
+class FakeLog(object):
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, msg):
+        self.warnings.append(msg)
+
+    def info(self, msg):
+        pass
+
+    debug = info
+
+
+class FakeModule(object):
+    def __init__(self, csi_repr=None):
+        self.log = FakeLog()
+        self.csi_repr = csi_repr
+        self.events = []
+        self.reader_ival = None
+
+    def send_event(self, event):
+        self.events.append(event)
+
+    def csi_reader_start(self, iface=None, fill_ring=True, ival=None):
+        self.reader_ival = ival
+        return self
+
+    def add_sink(self, sink, raw=False):
+        self.sink = sink
+
+    def remove_sink(self, sink):
+        self.sink = None
+
+
+def make_reader(path, wait_mode=CSI_WAIT_POLL, ival=0.01):
+    reader = CSIReaderThread(FakeModule(), CSIRingBuffer(capacity=16), path, ival=ival, wait_mode=wait_mode)
+    reader.drains = 0
+    drain = reader.drain
+
+    def counting_drain(csi_reader):
+        reader.drains += 1
+        return drain(csi_reader)
+    reader.drain = counting_drain
+
+    reader.done = threading.Event()
+    task = reader.task
+
+    def task_done():
+        try:
+            task()
+        finally:
+            reader.done.set()
+    reader.task = task_done
+    return reader
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def fifo(tmp_path):
+    path = str(tmp_path / 'csi_fifo')
+    os.mkfifo(path)
+    return path
+
+
+def test_poll_wakeup_and_stop(fifo):
+    # keeps the FIFO open for writing, i.e. no hangup
+    writer = os.open(fifo, os.O_RDWR)
+    reader = make_reader(fifo)
+    received = threading.Event()
+    reader.add_sink(lambda hdr, csi_matrix, pld: received.set())
+    try:
+        reader.start()
+        assert wait_for(lambda: reader.drains >= 1)
+
+        # idle: blocked in poll instead of waking up every ival
+        time.sleep(0.3)
+        assert reader.drains == 1
+
+        # woken up by a new record
+        os.write(writer, sim.make_csi_record(sim.random_csi_matrix(2, 1, 56)))
+        assert received.wait(1.0)
+        assert reader.drains == 2 and reader.ring.count == 1
+
+        # woken up by stop
+        start = time.monotonic()
+        reader.stop()
+        assert reader.done.wait(1.0)
+        assert time.monotonic() - start < 0.5
+        assert reader.module.log.warnings == []
+    finally:
+        reader.stop()
+        os.close(writer)
+
+
+def test_stop_sleep_mode(fifo):
+    writer = os.open(fifo, os.O_RDWR)
+    reader = make_reader(fifo, wait_mode=CSI_WAIT_SLEEP, ival=10.0)
+    try:
+        reader.start()
+        assert wait_for(lambda: reader.drains >= 1)
+        start = time.monotonic()
+        reader.stop()
+        assert reader.done.wait(1.0)
+        assert time.monotonic() - start < 0.5
+
+        # restarted after stop, the pending wakeup of the stop is discarded
+        reader.done.clear()
+        reader.start()
+        assert wait_for(lambda: reader.drains >= 2)
+        time.sleep(0.1)
+        assert reader.drains == 2 and not reader.done.is_set()
+    finally:
+        reader.stop()
+        os.close(writer)
+
+
+def test_fallback_and_reprobe(fifo):
+    reader = make_reader(fifo)
+    reader.POLL_REPROBE_IVAL = 0.1
+    try:
+        reader.start()
+        assert wait_for(lambda: reader.drains >= 1)
+
+        # writer gone: the FIFO is readable (hangup) w/o delivering records
+        os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+        assert wait_for(lambda: len(reader.module.log.warnings) == 1)
+        assert 'fall back to sleep mode' in reader.module.log.warnings[0]
+
+        # sleep mode: still reading, poll is probed again after POLL_REPROBE_IVAL
+        drains = reader.drains
+        assert wait_for(lambda: reader.drains > drains + 2)
+        assert wait_for(lambda: len(reader.module.log.warnings) >= 2)
+    finally:
+        reader.stop()
+    assert reader.done.wait(1.0)
+
+
+def test_collector_blocks_on_queue():
+    module = FakeModule()
+    collector = CSICollector(module, ival=0.5)
+    collector.done = threading.Event()
+    task = collector.task
+
+    def task_done():
+        try:
+            task()
+        finally:
+            collector.done.set()
+    collector.task = task_done
+
+    collector.start()
+    assert wait_for(lambda: module.reader_ival is not None)
+    assert module.reader_ival == 0.5
+
+    csi_matrix = sim.random_csi_matrix(2, 1, 56)
+    hdr = np.frombuffer(sim.make_csi_record(csi_matrix), dtype=DTYPE_CSI_HDR, count=1)
+    module.sink(hdr, csi_matrix, np.zeros(0, dtype=np.uint8))
+    assert wait_for(lambda: len(module.events) == 1)
+
+    # woken up by stop, not by a timeout
+    start = time.monotonic()
+    collector.stop()
+    assert collector.done.wait(1.0)
+    assert time.monotonic() - start < 0.25
+    assert module.sink is None
+
+
+def test_collector_positional_args():
+    # lazy comes after the radio, i.e. positional calls keep working
+    collector = CSICollector(FakeModule(), 0.5, 4, None, 16, DROP_NEWEST, 'wlan1', 'phy1')
+    assert (collector.iface, collector.phy, collector.lazy) == ('wlan1', 'phy1', False)
+    assert collector.batch_size == 4 and collector.queue.drop_policy == DROP_NEWEST
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('csi_repr', CSI_REPRS)
+def test_collector_events(csi_repr, lazy, tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    # runs of two samples of the same shape
+    sim.write_csi_file(path, 6, shapes=[(3, 3, 114), (3, 3, 114), (2, 1, 56), (2, 1, 56)], seed=0)
+    with receiver.CSIReader(path) as csi_reader:
+        records = [tuple(x.copy() for x in rec) for rec in csi_reader.records()]
+
+    module = FakeModule(csi_repr)
+    reader = CSIReaderThread(module, CSIRingBuffer(capacity=16, csi_repr=csi_repr), path)
+    collector = CSICollector(module, lazy=lazy)
+    reader.add_sink(collector.put_lazy if lazy else collector.put, raw=lazy)
+    with receiver.CSIReader(path) as csi_reader:
+        assert reader.drain(csi_reader) == 6
+    collector.send_batch(collector.queue.get_batch(6))
+
+    # eager: one stacked event per run of a shape; lazy: one list of packets
+    if lazy:
+        assert len(module.events) == 1
+        matrices = [pkt.csi_matrix for pkt in module.events[0].sample]
+    else:
+        assert [len(event.sample) for event in module.events] == [2, 2, 2]
+        matrices = [csi_matrix for event in module.events for csi_matrix in event.sample['csi_matrix']]
+
+    assert len(matrices) == 6
+    for (hdr, csi, pld), csi_matrix in zip(records, matrices):
+        shape = (int(hdr[0]['nr']), int(hdr[0]['nc']), int(hdr[0]['num_tones']))
+        assert csi_matrix.dtype == np.dtype(csi_repr)
+        assert csi_matrix.shape == csi_matrix_shape(*shape, csi_repr=csi_repr)
+        assert np.array_equal(csi_to_complex(csi_matrix), get_csi_matrix_scalar(csi, *shape))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import numpy as np
+from uniflex_module_wifi_ath.csi import receiver, sim
+
+'''
+    Streaming CSI reader: framing, buffer growth, truncated records and FIFOs.
+'''
+
+
+def read_all(reader, num_records, timeout=5.0):
+    records = []
+    deadline = time.monotonic() + timeout
+    while len(records) < num_records and time.monotonic() < deadline:
+        rec = reader.read()
+        if rec is None:
+            time.sleep(0.001)
+            continue
+        records.append(tuple(x.copy() for x in rec))
+    return records
+
+
+def check_records(records, expected):
+    assert len(records) == len(expected)
+    for (hdr, csi, pld), raw in zip(records, expected):
+        assert hdr.tobytes() + b'\0' + csi.tobytes() + pld.tobytes() == raw
+
+
+def test_regular_file(tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(path, 20, shapes=[(3, 3, 114), (2, 1, 56)], seed=0)
+    expected = list(sim.generate_csi_records(20, shapes=[(3, 3, 114), (2, 1, 56)], seed=0))
+
+    # small buffer: records straddle reads and the buffer has to grow
+    for buf_size in [receiver.CSI_BUF_SIZE, 64]:
+        with receiver.CSIReader(path, buf_size=buf_size) as reader:
+            assert reader.framing == 'stream'
+            records = [tuple(x.copy() for x in rec) for rec in reader.records()]
+            assert reader.read() is None
+            assert reader.truncated == 0
+        check_records(records, expected)
+
+
+def test_partial_record_completed_later(tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    raw = list(sim.generate_csi_records(2, seed=0))
+    with open(path, 'wb') as f:
+        f.write(raw[0] + raw[1][:100])
+
+    with receiver.CSIReader(path) as reader:
+        assert len(list(reader.records())) == 1
+        # the incomplete record is kept until the rest arrives
+        assert reader.read() is None
+        with open(path, 'ab') as f:
+            f.write(raw[1][100:])
+        check_records(read_all(reader, 1), raw[1:])
+
+
+def test_record_larger_than_buffer(tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    big = sim.make_csi_record(sim.random_csi_matrix(3, 3, 200, np.random.RandomState(0)), b'x' * 200)
+    small = next(sim.generate_csi_records(1, seed=0))
+    assert len(big) > receiver.CSI_BUF_SIZE
+    with open(path, 'wb') as f:
+        f.write(small + big + small)
+
+    with receiver.CSIReader(path) as reader:
+        records = [tuple(x.copy() for x in rec) for rec in reader.records()]
+    check_records(records, [small, big, small])
+    assert records[1][0][0]['num_tones'] == 200
+
+
+def test_truncated_records(tmp_path):
+    path = str(tmp_path / 'csi.bin')
+    raw = next(sim.generate_csi_records(1, seed=0))
+    with open(path, 'wb') as f:
+        f.write(raw[:-10])
+
+    # with record framing every read has to return a complete record
+    with receiver.CSIReader(path, framing='record') as reader:
+        assert reader.read() is None
+        assert reader.truncated == 1
+
+
+def test_fifo(tmp_path):
+    fifo = str(tmp_path / 'csi.fifo')
+    shapes = [(3, 3, 114), (1, 1, 56)]
+    simulator = sim.CSISimulator(fifo, 200, shapes=shapes, seed=0)
+    os.mkfifo(fifo)
+
+    # the reader opens the FIFO non-blocking before the writer
+    with receiver.CSIReader(fifo) as reader:
+        assert reader.framing == 'stream'
+        simulator.start()
+        records = read_all(reader, 200)
+        simulator.join(5.0)
+        # writer closed the FIFO
+        assert reader.read() is None
+
+    check_records(records, list(sim.generate_csi_records(200, shapes=shapes, seed=0)))
+    assert simulator.sent == 200
+
+
+if __name__ == '__main__':
+    import pathlib
+    import tempfile
+    for test in [test_regular_file, test_partial_record_completed_later, test_record_larger_than_buffer,
+                 test_truncated_records, test_fifo]:
+        test(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from uniflex_module_wifi_ath.csi import receiver, sim
+from uniflex_module_wifi_ath.csi.decoder import get_csi_matrix
+from uniflex_module_wifi_ath.csi.recorder import CSIRecorder, CSIRecording, CSI_IDX_SUFFIX
+
+'''
+    CSI recordings: round-trip, lookups and continuation after a crash.
+'''
+
+SHAPES = [(3, 3, 114), (2, 1, 56)]
+
+
+def read_records(path):
+    with receiver.CSIReader(path) as reader:
+        return [tuple(x.copy() for x in rec) for rec in reader.records()]
+
+
+def record(path, records):
+    with CSIRecorder(path) as recorder:
+        for hdr, csi, pld in records:
+            recorder.write(hdr, csi, pld)
+    return recorder.num_records
+
+
+def check_recording(path, records):
+    rec = CSIRecording(path)
+    assert len(rec) == len(records)
+    assert list(rec.tstamps) == [hdr[0]['tstamp'] for hdr, csi, pld in records]
+    for (hdr, csi, pld), ref in zip(rec, records):
+        assert hdr.tobytes() == ref[0].tobytes()
+        assert np.array_equal(csi, ref[1])
+        assert np.array_equal(pld, ref[2])
+    rec.close()
+
+
+def test_round_trip(tmp_path):
+    sim_path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(sim_path, 10, shapes=SHAPES, seed=0)
+    records = read_records(sim_path)
+
+    path = str(tmp_path / 'rec.csi')
+    assert record(path, records) == 10
+    check_recording(path, records)
+
+    rec = CSIRecording(path)
+    # tstamps are 0, 1000, ..., 9000
+    assert rec.time_range(2000, 5000) == slice(2, 5)
+    assert rec.time_range(2500) == slice(3, 10)
+    assert rec.time_range(stop=0) == slice(0, 0)
+    assert list(rec.headers(rec.time_range(2000, 5000))['tstamp']) == [2000, 3000, 4000]
+
+    for shape, (idx, matrices) in rec.csi_matrices(slice(2, 8)).items():
+        assert shape == SHAPES[idx[0] % 2]
+        for ii, csi_matrix in zip(idx, matrices):
+            hdr, csi, pld = records[ii]
+            ref = get_csi_matrix(csi, *shape)
+            assert np.array_equal(csi_matrix, ref)
+            assert np.array_equal(rec.csi_matrix(ii), ref)
+    rec.close()
+
+
+def test_continue_after_partial_writes(tmp_path):
+    sim_path = str(tmp_path / 'csi.bin')
+    sim.write_csi_file(sim_path, 16, shapes=SHAPES, seed=0)
+    records = read_records(sim_path)
+
+    path = str(tmp_path / 'rec.csi')
+    record(path, records[:10])
+
+    # partial index entry
+    with open(path + CSI_IDX_SUFFIX, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    assert record(path, records[10:13]) == 13
+    check_recording(path, records[:13])
+
+    # partial record w/o index entry
+    hdr, csi, pld = records[13]
+    with open(path, 'ab') as f:
+        f.write(hdr.tobytes() + csi.tobytes()[:100])
+    assert record(path, records[13:14]) == 14
+    check_recording(path, records[:14])
+
+    # partial record with index entry
+    with CSIRecorder(path) as recorder:
+        recorder.write(*records[14])
+        recorder.flush()
+        with open(path, 'r+b') as f:
+            f.truncate(recorder._offset - 10)
+    assert record(path, records[14:16]) == 16
+    check_recording(path, records)
+
+
+if __name__ == '__main__':
+    import pathlib
+    import tempfile
+    test_round_trip(pathlib.Path(tempfile.mkdtemp()))
+    test_continue_after_partial_writes(pathlib.Path(tempfile.mkdtemp()))
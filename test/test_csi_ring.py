@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from uniflex_module_wifi_ath.csi import receiver, sim
+from uniflex_module_wifi_ath.csi.constants import DTYPE_CSI_HDR, CSI_REPRS
+from uniflex_module_wifi_ath.csi.decoder import csi_matrix_shape, csi_to_complex, get_csi_matrix_scalar
+from uniflex_module_wifi_ath.csi.ring import CSIRingBuffer
+
+'''
+    CSI ring buffer: wrap-around, contiguous copies, mixed matrix shapes,
+    reads overlapping the writer and CSI representations.
+'''
+
+
+def make_records(shapes, num_records):
+    rng = np.random.RandomState(0)
+    records = []
+    for ii in range(num_records):
+        csi_matrix = sim.random_csi_matrix(*shapes[ii % len(shapes)], rng=rng)
+        raw = sim.make_csi_record(csi_matrix, tstamp=ii)
+        hdr = np.frombuffer(raw, dtype=DTYPE_CSI_HDR, count=1)
+        csi = np.frombuffer(raw, dtype=np.uint8, count=int(hdr[0]['csi_len']), offset=receiver.CSI_DATA_OFFSET)
+        records.append((hdr, csi, csi_matrix))
+    return records
+
+
+def test_wrap_around_and_views():
+    ring = CSIRingBuffer(capacity=8)
+    records = make_records([(3, 3, 114)], 20)
+
+    for ii, (hdr, csi, csi_matrix) in enumerate(records[:5]):
+        assert np.array_equal(ring.append(hdr, csi, rx_time=ii), csi_matrix)
+
+    # copies, not views overwritten by the writer
+    hdrs, matrices, rx_times = ring.latest(3, rx_times=True)
+    assert not np.shares_memory(matrices, ring.matrices)
+    assert list(hdrs['tstamp']) == [2, 3, 4]
+    assert list(rx_times) == [2, 3, 4]
+    for csi, (hdr, raw, csi_matrix) in zip(matrices, records[2:5]):
+        assert np.array_equal(csi, csi_matrix)
+
+    for ii, (hdr, csi, csi_matrix) in enumerate(records[5:], 5):
+        ring.append(hdr, csi, rx_time=ii)
+
+    # one slot is kept free for the writer
+    assert len(ring) == 7
+    hdrs, matrices = ring.latest(100)
+    assert list(hdrs['tstamp']) == list(range(13, 20))
+    for csi, (hdr, raw, csi_matrix) in zip(matrices, records[13:]):
+        assert np.array_equal(csi, csi_matrix)
+
+
+def test_mixed_shapes():
+    ring = CSIRingBuffer(capacity=4)
+    shapes = [(3, 3, 114), (2, 1, 56)]
+    records = make_records(shapes, 10)
+
+    for hdr, csi, csi_matrix in records:
+        ring.append(hdr, csi)
+    assert len(ring) == 3
+
+    # default: latest samples of the shape of the latest sample
+    hdrs, matrices = ring.latest(4)
+    assert matrices.shape == (2, 2, 1, 56)
+    assert matrices.flags.c_contiguous
+    assert list(hdrs['tstamp']) == [7, 9]
+    assert np.array_equal(matrices, np.stack([records[7][2], records[9][2]]))
+
+    hdrs, matrices = ring.latest(4, shape=(3, 3, 114))
+    assert matrices.shape == (1, 3, 3, 114)
+    assert list(hdrs['tstamp']) == [8]
+    assert np.array_equal(matrices[0], records[8][2])
+
+    assert len(ring.latest(4, shape=(1, 1, 56))[0]) == 0
+
+    # matrices exceeding the slot shape are dropped
+    small = CSIRingBuffer(capacity=4, max_shape=(2, 2, 56))
+    assert small.append(*records[0][:2]) is None
+    assert small.append(*records[1][:2]) is not None
+    assert small.dropped == 1
+    assert len(small) == 1
+
+
+def test_put_decoded():
+    ring = CSIRingBuffer(capacity=4)
+    records = make_records([(3, 3, 114), (2, 1, 56)], 4)
+
+    for ii, (hdr, csi, csi_matrix) in enumerate(records):
+        stored = ring.put(hdr, csi_matrix, rx_time=ii)
+        assert np.shares_memory(stored, ring.matrices)
+        assert np.array_equal(stored, csi_matrix)
+
+    hdrs, matrices, rx_times = ring.latest(4, rx_times=True, shape=(2, 1, 56))
+    assert list(hdrs['tstamp']) == [1, 3] and list(rx_times) == [1, 3]
+    assert matrices.flags.c_contiguous
+    assert np.array_equal(matrices, np.stack([records[1][2], records[3][2]]))
+
+    small = CSIRingBuffer(capacity=4, max_shape=(2, 2, 56))
+    assert small.put(records[0][0], records[0][2]) is None
+    assert small.dropped == 1
+
+
+def test_read_overlapping_writer():
+    ring = CSIRingBuffer(capacity=4)
+    records = make_records([(2, 1, 56)], 12)
+    for hdr, csi, csi_matrix in records[:3]:
+        ring.append(hdr, csi)
+
+    # the writer wraps around while the reads copy the slots: two samples
+    # per copy, the first overwrites the free slot only
+    copy_latest = ring._copy_latest
+    writes = iter(records[3:8])
+
+    def overlapping(*args):
+        latest = copy_latest(*args)
+        for _, (hdr, csi, csi_matrix) in zip(range(2), writes):
+            ring.append(hdr, csi)
+        return latest
+
+    ring._copy_latest = overlapping
+    hdrs, matrices = ring.latest(3)
+    assert list(hdrs['tstamp']) == [4, 5, 6]
+    for csi, (hdr, raw, csi_matrix) in zip(matrices, records[4:7]):
+        assert np.array_equal(csi, csi_matrix)
+    assert matrices.flags.c_contiguous
+
+
+def test_reserve_and_commit():
+    ring = CSIRingBuffer(capacity=8, shared=True)
+    try:
+        records = make_records([(2, 1, 56)], 6)
+        ring.append(*records[0][:2])
+        hdrs = np.concatenate([hdr for hdr, csi, csi_matrix in records[1:6]])
+        slots = ring.reserve(hdrs, [1.0] * 5)
+        assert list(slots) == [1, 2, 3, 4, 5]
+
+        # reserved slots are not visible before commit
+        assert list(ring.latest(8)[0]['tstamp']) == [0]
+        for slot, (hdr, csi, csi_matrix) in zip(slots, records[1:6]):
+            nr, nc, num_tones = csi_matrix.shape
+            ring.matrices[slot, :nr, :nc, :num_tones] = csi_matrix
+        for stored, (hdr, csi, csi_matrix) in zip(ring.commit(slots), records[1:6]):
+            assert np.array_equal(stored, csi_matrix)
+        assert list(ring.latest(8)[0]['tstamp']) == [0, 1, 2, 3, 4, 5]
+
+        with pytest.raises(ValueError):
+            ring.reserve(np.concatenate([hdrs, hdrs]), [1.0] * 10)
+
+        # short buffer is skipped, too large matrix is dropped
+        hdr, csi, csi_matrix = records[0]
+        assert ring.accepts(hdr, csi)
+        with pytest.warns(RuntimeWarning):
+            assert not ring.accepts(hdr, csi[:10])
+        assert ring.dropped == 0
+        small = CSIRingBuffer(capacity=8, max_shape=(1, 1, 56))
+        assert not small.accepts(hdr, csi) and small.dropped == 1
+    finally:
+        ring.close()
+
+
+@pytest.mark.parametrize('csi_repr', CSI_REPRS)
+def test_csi_representations(csi_repr):
+    ring = CSIRingBuffer(capacity=8, csi_repr=csi_repr)
+    records = make_records([(3, 3, 114), (2, 1, 56)], 6)
+
+    for hdr, csi, csi_matrix in records:
+        stored = ring.append(hdr, csi)
+        assert stored.dtype == np.dtype(csi_repr)
+
+    for shape in [(3, 3, 114), (2, 1, 56)]:
+        hdrs, matrices = ring.latest(8, shape=shape)
+        assert matrices.dtype == np.dtype(csi_repr)
+        assert matrices.shape == (3,) + csi_matrix_shape(*shape, csi_repr=csi_repr)
+        for csi, tstamp in zip(matrices, hdrs['tstamp']):
+            hdr, raw, csi_matrix = records[tstamp]
+            assert np.array_equal(csi_to_complex(csi), get_csi_matrix_scalar(raw, *shape))
+
+
+if __name__ == '__main__':
+    test_wrap_around_and_views()
+    test_mixed_shapes()
+    test_put_decoded()
+    test_read_overlapping_writer()
+    test_reserve_and_commit()
+    for csi_repr in CSI_REPRS:
+        test_csi_representations(csi_repr)
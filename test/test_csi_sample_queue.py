@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import pytest
+from uniflex_module_wifi_ath.csi.sample_queue import CSISampleQueue, DROP_OLDEST, DROP_NEWEST
+
+'''
+    Bounded CSI sample queue: drop policies, batching and waking up
+    waiting consumers.
+'''
+
+
+def test_drop_policies():
+    queue = CSISampleQueue(maxlen=3, drop_policy=DROP_OLDEST)
+    assert all(queue.put(ii) for ii in range(5))
+    assert (queue.received, queue.dropped, len(queue)) == (5, 2, 3)
+    assert queue.get_batch(10) == [2, 3, 4]
+
+    queue = CSISampleQueue(maxlen=3, drop_policy=DROP_NEWEST)
+    assert [queue.put(ii) for ii in range(5)] == [True, True, True, False, False]
+    assert (queue.received, queue.dropped, len(queue)) == (5, 2, 3)
+    assert queue.get_batch(10) == [0, 1, 2]
+
+    with pytest.raises(ValueError):
+        CSISampleQueue(drop_policy='drop-random')
+
+
+def test_get_batch():
+    queue = CSISampleQueue()
+
+    # timeout w/o items
+    start = time.monotonic()
+    assert queue.get_batch(4, timeout=0.05) == []
+    assert time.monotonic() - start >= 0.04
+
+    # w/o max_wait the queued items are returned at once
+    for ii in range(6):
+        queue.put(ii)
+    assert queue.get_batch(4) == [0, 1, 2, 3]
+    assert queue.get_batch(4) == [4, 5]
+
+    # max_wait: wait for a full batch, at most max_wait after the first item
+    queue.put(0)
+    start = time.monotonic()
+    assert queue.get_batch(4, max_wait=0.1, timeout=1.0) == [0]
+    assert 0.05 <= time.monotonic() - start < 1.0
+
+    # a full batch is returned before max_wait
+    def producer():
+        for ii in range(4):
+            time.sleep(0.01)
+            queue.put(ii)
+    thread = threading.Thread(target=producer)
+    thread.start()
+    start = time.monotonic()
+    assert queue.get_batch(4, max_wait=2.0, timeout=1.0) == [0, 1, 2, 3]
+    assert time.monotonic() - start < 1.0
+    thread.join()
+
+    queue.put(0)
+    queue.clear()
+    assert len(queue) == 0
+
+
+def test_interrupt():
+    queue = CSISampleQueue()
+
+    # w/o timeout get_batch blocks until interrupted
+    thread = threading.Timer(0.05, queue.interrupt)
+    thread.start()
+    start = time.monotonic()
+    assert queue.get_batch(4) == []
+    assert time.monotonic() - start < 1.0
+    thread.join()
+
+    # does not wait while interrupted, queued items are still returned
+    assert queue.get_batch(4) == []
+    queue.put(0)
+    assert queue.get_batch(4, max_wait=1.0) == [0]
+
+    queue.resume()
+    assert queue.get_batch(4, timeout=0.05) == []
+
+
+if __name__ == '__main__':
+    test_drop_policies()
+    test_get_batch()
+    test_interrupt()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from uniflex_module_wifi_ath.csi.constants import DTYPE_CSI_HDR
+from uniflex_module_wifi_ath.csi.shm import CSISharedMemoryPublisher, CSISharedMemoryReader
+
+'''
+    Shared memory CSI ring: zero-copy reading and overrun detection.
+'''
+
+
+def make_sample(ii, shape):
+    hdr = np.zeros(1, dtype=DTYPE_CSI_HDR)
+    hdr['tstamp'] = ii
+    hdr['nr'], hdr['nc'], hdr['num_tones'] = shape
+    csi = np.full(shape, ii, dtype=complex)
+    return hdr, csi
+
+
+def test_shm_ring():
+    with CSISharedMemoryPublisher(capacity=8) as pub:
+        reader = CSISharedMemoryReader(pub.name)
+
+        for ii in range(5):
+            pub.put(*make_sample(ii, (3, 3, 114) if ii % 2 else (2, 1, 56)))
+        samples = list(reader.read(copy=True))
+        assert [seq for seq, hdr, csi in samples] == list(range(5))
+        for seq, hdr, csi in samples:
+            assert hdr[0]['tstamp'] == seq
+            assert csi.shape == ((3, 3, 114) if seq % 2 else (2, 1, 56))
+            assert np.all(csi == seq)
+
+        # views are zero-copy and invalidated once the ring wraps
+        pub.put(*make_sample(5, (1, 1, 56)))
+        seq, hdr, csi = next(reader.read())
+        assert reader.is_valid(seq)
+
+        # a second reader starting with the oldest sample available
+        other = CSISharedMemoryReader(pub.name, latest=False)
+        copies = list(other.read(copy=True))
+        assert [s[0] for s in copies] == list(range(6))
+        assert np.array_equal(copies[-1][2], csi)
+
+        for ii in range(6, 26):
+            pub.put(*make_sample(ii, (1, 1, 56)))
+        assert not reader.is_valid(seq)
+        # the view shows the sample now in its slot, the copy is unchanged
+        assert np.all(csi == 21) and np.all(copies[-1][2] == 5)
+        del hdr, csi, copies
+        other.close()
+        samples = list(reader.read(copy=True))
+        assert reader.overruns == 20 - 7
+        assert [s[0] for s in samples] == list(range(19, 26))
+        del samples
+        reader.close()
+
+
+if __name__ == '__main__':
+    test_shm_ring()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import errno
+import pytest
+from uniflex_module_wifi_ath import debugfs
+from uniflex_module_wifi_ath.debugfs import DebugfsAccessor, DebugfsCache, TxqParams, \
+    parse_txq_params, parse_per_flow_tx_power
+
+'''
+    Debugfs access against a temp directory standing in for debugfs,
+    parsing of the readbacks of the patched ath9k driver and their cache.
+'''
+
+# size of the readback buffers of the patched driver
+DRIVER_BUF_SIZE = 1024
+
+
+def scnprintf(buf, fmt, *args):
+    # appends like scnprintf into a buffer of DRIVER_BUF_SIZE bytes
+    return (buf + fmt % args)[:DRIVER_BUF_SIZE - 1]
+
+
+def read_file_txq_params(queues):
+    # see read_file_txq_params in patches/edca_tpc_patch.patch
+    buf = ''
+    for name, (qnum, aifs, cwmin, cwmax, burst, ready) in queues:
+        buf = scnprintf(buf, "(%s):  ", name)
+        buf = scnprintf(buf, "%s: %d ", "qnum", qnum)
+        buf = scnprintf(buf, "%s: %d ", "aifs", aifs)
+        buf = scnprintf(buf, "%s: %d ", "cwmin", cwmin)
+        buf = scnprintf(buf, "%s: %d ", "cwmax", cwmax)
+        buf = scnprintf(buf, "%s: %d ", "burstTime", burst)
+        buf = scnprintf(buf, "%s: %d\n", "readyTime", ready)
+    return buf
+
+
+def read_file_per_flow_tx_power(entries):
+    # see read_file_per_flow_tx_power in patches/edca_tpc_patch.patch
+    buf = scnprintf('', "%s", "Per-flow TxPower list\n")
+    for mark, power, rate in entries:
+        buf = scnprintf(buf, "%s: %d ", "Mark", mark)
+        buf = scnprintf(buf, "%s: %d ", "Power", power)
+        buf = scnprintf(buf, "%s: %d\n", "Rate", rate)
+    return buf
+
+
+def make_file(root, phy, driver, name, content=''):
+    os.makedirs(os.path.join(str(root), phy, driver), exist_ok=True)
+    path = os.path.join(str(root), phy, driver, name)
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+
+def test_read_write(tmp_path):
+    path = make_file(tmp_path, 'phy0', 'ath9k', 'txq_params')
+    make_file(tmp_path, 'phy1', 'ath9k', 'txq_params', 'phy1')
+    accessor = DebugfsAccessor(str(tmp_path))
+
+    # positional writes at offset 0
+    assert accessor.write('phy0', 'ath9k', 'txq_params', '0 1 2 3 4') == 9
+    assert accessor.write('phy0', 'ath9k', 'txq_params', b'1 2 3 4 5') == 9
+    assert accessor.read('phy0', 'ath9k', 'txq_params') == '1 2 3 4 5'
+    with open(path) as f:
+        assert f.read() == '1 2 3 4 5'
+
+    # files are kept open per phy
+    dfile = accessor.get('phy0', 'ath9k', 'txq_params')
+    accessor.write('phy0', 'ath9k', 'txq_params', 7)
+    assert accessor.get('phy0', 'ath9k', 'txq_params') is dfile
+    assert accessor.read('phy1', 'ath9k', 'txq_params') == 'phy1'
+
+    accessor.close('phy0')
+    assert dfile.fd is None
+    assert accessor.get('phy1', 'ath9k', 'txq_params').fd is not None
+    accessor.close()
+
+    with pytest.raises(FileNotFoundError):
+        accessor.read('phy2', 'ath9k', 'txq_params')
+
+
+def test_reopen_on_stale_fd(tmp_path):
+    make_file(tmp_path, 'phy0', 'ath9k', 'ani', '0')
+    accessor = DebugfsAccessor(str(tmp_path))
+    dfile = accessor.get('phy0', 'ath9k', 'ani')
+
+    # closed underneath, e.g. by the driver being reloaded
+    os.close(dfile.fd)
+    assert accessor.write('phy0', 'ath9k', 'ani', '1') == 1
+    assert accessor.get('phy0', 'ath9k', 'ani') is not dfile
+    assert accessor.read('phy0', 'ath9k', 'ani') == '1'
+    accessor.close()
+
+
+def test_no_retry_on_rejected_value(tmp_path, monkeypatch):
+    make_file(tmp_path, 'phy0', 'ath9k', 'per_flow_tx_power')
+    accessor = DebugfsAccessor(str(tmp_path))
+    dfile = accessor.get('phy0', 'ath9k', 'per_flow_tx_power')
+
+    writes = []
+
+    def pwrite(fd, value, offset):
+        writes.append(value)
+        raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+    monkeypatch.setattr(debugfs.os, 'pwrite', pwrite)
+
+    with pytest.raises(OSError) as e:
+        accessor.write('phy0', 'ath9k', 'per_flow_tx_power', 'x')
+    assert e.value.errno == errno.EINVAL
+    assert len(writes) == 1
+    assert accessor.get('phy0', 'ath9k', 'per_flow_tx_power') is dfile
+    accessor.close()
+
+
+def test_parse_txq_params():
+    queues = [('VO', (3, 2, 3, 7, 15, 0)), ('VI', (2, 2, 7, 15, 30, 0)),
+              ('BE', (1, 3, 15, 1023, 0, 0)), ('BK', (0, 7, 15, 1023, 0, -1))]
+    params = parse_txq_params(read_file_txq_params(queues))
+    assert list(params) == ['VO', 'VI', 'BE', 'BK']
+    for name, values in queues:
+        assert params[name] == TxqParams(*values)
+    assert params['BE'].cwmax == 1023
+
+    assert parse_txq_params('') == {}
+
+
+def test_parse_per_flow_tx_power():
+    assert parse_per_flow_tx_power(read_file_per_flow_tx_power([])) == {}
+
+    entries = [(12, 20, 0), (3, 5, 0), (7, 15, 1)]
+    assert parse_per_flow_tx_power(read_file_per_flow_tx_power(entries)) == {12: 20, 3: 5, 7: 15}
+
+    # readback truncated by the driver: the partial last line is ignored
+    entries = [(mark, 12, 0) for mark in range(1, 100)]
+    data = read_file_per_flow_tx_power(entries)
+    assert len(data) == DRIVER_BUF_SIZE - 1
+    table = parse_per_flow_tx_power(data)
+    assert 30 < len(table) < 99
+    assert table == dict((mark, 12) for mark in range(1, len(table) + 1))
+    # "Mark: N Power: 1" of "Power: 12" must not be parsed as power 1
+    assert parse_per_flow_tx_power(data[:data.rindex('Power: 12') + len('Power: 1')]) == \
+        dict((mark, 12) for mark in range(1, len(table)))
+
+
+def test_cache():
+    cache = DebugfsCache(ttl=0.05)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get('a', load) == 1
+    assert cache.get('a', load) == 1
+    assert cache.get('b', load) == 2
+
+    # expired
+    time.sleep(0.06)
+    assert cache.get('a', load) == 3
+
+    cache.invalidate('a')
+    assert cache.get('a', load) == 4
+    assert cache.get('b', load) == 5
+
+    cache.invalidate()
+    assert cache.get('a', load) == 6
+    assert cache.get('b', load) == 7
+
+
+if __name__ == '__main__':
+    test_parse_txq_params()
+    test_parse_per_flow_tx_power()
+    test_cache()
+    import pathlib
+    import tempfile
+    test_read_write(pathlib.Path(tempfile.mkdtemp()))
+    test_reopen_on_stale_fd(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import pytest
+import zmq
+from uniflex_module_wifi_ath.hmac_control import HMACControlChannel
+
+'''
+    hMAC control channel against an in-process REP socket: timeouts,
+    reconnects, coalescing of asynchronous updates and closing.
+'''
+
+
+class Responder(threading.Thread):
+    """
+    REP side of the control protocol; replies are held back while the gate
+    is closed.
+    """
+
+    def __init__(self, context):
+        super(Responder, self).__init__()
+        self.daemon = True
+        self.socket = context.socket(zmq.REP)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.port = self.socket.bind_to_random_port('tcp://127.0.0.1')
+        self.gate = threading.Event()
+        self.gate.set()
+        self.received = []
+        self.stopped = False
+
+    def run(self):
+        while not self.stopped:
+            if not self.socket.poll(20):
+                continue
+            msg = self.socket.recv()
+            self.received.append(msg)
+            while not self.gate.wait(0.02):
+                if self.stopped:
+                    return
+            self.socket.send(b'OK ' + msg)
+
+    def stop(self):
+        self.stopped = True
+        self.join()
+        self.socket.close()
+
+
+@pytest.fixture
+def responder():
+    context = zmq.Context()
+    responder = Responder(context)
+    responder.start()
+    yield responder
+    responder.stop()
+    context.term()
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def make_channel(responder, timeout=0.2, retries=1):
+    return HMACControlChannel(port=responder.port, host='127.0.0.1', timeout=timeout, retries=retries,
+                              context=responder.socket.context)
+
+
+def test_request(responder):
+    channel = make_channel(responder)
+    assert channel.request('a') == b'OK a'
+    assert channel.request(b'b') == b'OK b'
+    assert channel.sent == 2
+    channel.close()
+
+
+def test_timeout_and_reconnect(responder):
+    channel = make_channel(responder)
+    assert channel.request('a') == b'OK a'
+
+    # unresponsive daemon: each attempt times out on its own socket
+    responder.gate.clear()
+    start = time.monotonic()
+    with pytest.raises(zmq.Again):
+        channel.request('b')
+    elapsed = time.monotonic() - start
+    assert 0.9 * 0.2 * 2 <= elapsed < 0.2 * 2 + 0.5
+    assert channel._socket is None
+
+    # the next request is sent on a new connection
+    responder.gate.set()
+    assert channel.request('c') == b'OK c'
+    assert channel.sent == 2
+    channel.close()
+
+
+def test_coalescing(responder):
+    channel = make_channel(responder, timeout=2.0)
+    replies = []
+
+    def callback(reply, error):
+        replies.append((reply, error))
+
+    # 'a' is in flight while 'b', 'c' and 'd' are submitted: only 'd' is sent
+    responder.gate.clear()
+    channel.submit('a', callback)
+    wait_for(lambda: responder.received == [b'a'])
+    channel.submit('b', callback)
+    channel.submit('c', callback)
+    channel.submit('d', callback)
+    assert channel.coalesced == 2
+    responder.gate.set()
+    assert channel.flush(timeout=2.0)
+    assert responder.received == [b'a', b'd']
+    assert replies == [(b'OK a', None), (b'OK d', None)]
+
+    # cancelled before being sent
+    responder.gate.clear()
+    channel.submit('e', callback)
+    wait_for(lambda: len(responder.received) == 3)
+    channel.submit('f', callback)
+    channel.cancel()
+    responder.gate.set()
+    assert channel.flush(timeout=2.0)
+    assert responder.received == [b'a', b'd', b'e']
+    assert replies[-1] == (b'OK e', None)
+    assert channel.sent == 3
+    channel.close()
+
+
+def test_worker_errors(responder):
+    channel = make_channel(responder)
+    replies = []
+
+    # a failing request is reported, the worker keeps running
+    channel.submit(u'\u00e4', lambda reply, error: replies.append((reply, error)))
+    assert channel.flush(timeout=2.0)
+    assert replies[0][0] is None and isinstance(replies[0][1], UnicodeEncodeError)
+    assert channel._worker.is_alive()
+    channel.submit('a', lambda reply, error: replies.append((reply, error)))
+    assert channel.flush(timeout=2.0)
+    assert replies[1] == (b'OK a', None)
+    channel.close()
+
+
+def test_close(responder):
+    channel = make_channel(responder, timeout=2.0)
+
+    # the message in flight is completed, the pending one dropped
+    responder.gate.clear()
+    channel.submit('a')
+    wait_for(lambda: responder.received == [b'a'])
+    channel.submit('b')
+    worker = channel._worker
+    threading.Timer(0.1, responder.gate.set).start()
+    channel.close()
+    assert not worker.is_alive()
+    assert responder.received == [b'a']
+    assert channel._socket is None
+
+    with pytest.raises(RuntimeError):
+        channel.request('c')
+    with pytest.raises(RuntimeError):
+        channel.submit('c')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
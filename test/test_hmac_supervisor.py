@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import socket
+import pytest
+import uniflex_module_wifi_ath
+from uniflex.core import exceptions
+from uniflex_module_wifi_ath.hmac_control import HMACControlChannel, HMACSupervisor, HMACConfCache
+
+'''
+    hMAC daemon supervision against test/hmac_stub_daemon.py and misbehaving
+    daemons: readiness by control round-trip, exit, hang; the cache of
+    configuration strings and the Ath9kModule radio programs and their errors.
+'''
+
+STUB_DAEMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hmac_stub_daemon.py')
+
+# answers the readiness probe, then hangs; replies to one more request
+# and keeps running if 'reply' is given
+HANGING_DAEMON = '''
+import os, sys, time, zmq
+socket = zmq.Context().socket(zmq.REP)
+socket.bind("tcp://*:" + os.environ['HMAC_STUB_PORT'])
+for ii in range(2 if 'reply' in sys.argv else 1):
+    socket.recv()
+    socket.send(b'OK')
+time.sleep(60)
+'''
+
+# binds the control port but never answers
+MUTE_DAEMON = '''
+import os, time, zmq
+socket = zmq.Context().socket(zmq.REP)
+socket.bind("tcp://*:" + os.environ['HMAC_STUB_PORT'])
+time.sleep(60)
+'''
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.fixture
+def port(monkeypatch):
+    port = free_port()
+    monkeypatch.setenv('HMAC_STUB_PORT', str(port))
+    monkeypatch.setenv('HMAC_STUB_DELAY', '0')
+    return port
+
+
+def make_supervisor(port, timeout=1.0, retries=1, **kwargs):
+    channel = HMACControlChannel(port, timeout=timeout, retries=retries)
+    return HMACSupervisor(channel, **kwargs)
+
+
+def test_start_stop(port, monkeypatch):
+    monkeypatch.setenv('HMAC_STUB_DELAY', '0.3')
+    supervisor = make_supervisor(port)
+
+    # start returns once the daemon accepts control messages
+    start = time.monotonic()
+    proc = supervisor.start([sys.executable, STUB_DAEMON])
+    assert time.monotonic() - start >= 0.3
+    assert supervisor.is_running()
+    assert supervisor.channel.request('0,FF:FF:FF:FF:FF:FF,255') == b'OK'
+
+    supervisor.stop('allow all')
+    assert proc.returncode == 0
+    assert not supervisor.is_running()
+
+
+def test_ready_timeout(port, monkeypatch):
+    monkeypatch.setenv('HMAC_STUB_DELAY', '10')
+    supervisor = make_supervisor(port, ready_timeout=0.3)
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        supervisor.start([sys.executable, STUB_DAEMON])
+    assert time.monotonic() - start < 2.0
+    # not left behind
+    assert supervisor.proc is None
+
+
+def test_ready_round_trip(port):
+    # accepting connections is not enough, the daemon has to answer
+    supervisor = make_supervisor(port, ready_timeout=0.3)
+    start = time.monotonic()
+    with pytest.raises(RuntimeError) as e:
+        supervisor.start([sys.executable, '-c', MUTE_DAEMON])
+    assert 'not ready' in str(e.value)
+    assert time.monotonic() - start < 2.0
+    assert supervisor.proc is None
+
+    # the probe is sent as control message
+    supervisor = make_supervisor(port)
+    proc = supervisor.start([sys.executable, STUB_DAEMON], probe='0,FF:FF:FF:FF:FF:FF,255')
+    assert supervisor.channel.sent == 1
+    supervisor.stop()
+    assert proc.returncode == 0
+
+
+def test_daemon_exit(port):
+    supervisor = make_supervisor(port)
+
+    with pytest.raises(RuntimeError) as e:
+        supervisor.start([sys.executable, '-c', 'import sys; sys.exit(3)'])
+    assert 'code 3' in str(e.value)
+    assert not supervisor.is_running()
+
+
+def test_kill_on_hang(port):
+    # no reply to the control messages
+    supervisor = make_supervisor(port, timeout=0.2, retries=0)
+    proc = supervisor.start([sys.executable, '-c', HANGING_DAEMON])
+    start = time.monotonic()
+    supervisor.stop()
+    assert time.monotonic() - start < 2.0
+    assert proc.returncode is not None and proc.returncode < 0
+    assert supervisor.proc is None
+
+    # terminate acknowledged, but the daemon does not exit
+    supervisor = make_supervisor(port, timeout=1.0, stop_timeout=0.2)
+    proc = supervisor.start([sys.executable, '-c', HANGING_DAEMON, 'reply'])
+    supervisor.stop()
+    assert proc.returncode is not None and proc.returncode < 0
+    assert supervisor.proc is None
+
+
+class AccessPolicy(object):
+    def __init__(self, entries):
+        self.entries = entries
+
+    def getEntries(self):
+        return self.entries
+
+
+class HmacConf(object):
+    def __init__(self, slots, slot_duration=20000):
+        self.slots = slots
+        self.slot_duration = slot_duration
+        self.compiled = 0
+
+    def getNumSlots(self):
+        return len(self.slots)
+
+    def getSlotDuration(self):
+        return self.slot_duration
+
+    def getAccessPolicy(self, slot):
+        return AccessPolicy(self.slots[slot])
+
+    def createConfString(self):
+        self.compiled += 1
+        return '#'.join('%d,%s,%d' % (slot, mac, tid) for slot, entries in enumerate(self.slots)
+                        for mac, tid in entries)
+
+    def createAllowAllConfString(self):
+        return '#'.join('%d,FF:FF:FF:FF:FF:FF,255' % slot for slot in range(len(self.slots)))
+
+
+def test_conf_cache():
+    mac = '00:11:22:33:44:55'
+    cache = HMACConfCache(maxsize=2)
+    conf = HmacConf([[(mac, 255)], []])
+    assert cache.conf_string(conf) == '0,%s,255' % mac
+    assert cache.allow_all_string(conf) == '0,FF:FF:FF:FF:FF:FF,255#1,FF:FF:FF:FF:FF:FF,255'
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # same contents, other object: not compiled again
+    other = HmacConf([[(mac, 255)], []])
+    assert cache.conf_string(other) == '0,%s,255' % mac
+    assert other.compiled == 0 and cache.hits == 1
+
+    # changed contents: compiled, i.e. the cached string is not reused
+    changed = HmacConf([[(mac, 255)], [(mac, 1)]])
+    assert cache.conf_string(changed) == '0,%s,255#1,%s,1' % (mac, mac)
+    assert changed.compiled == 1
+    assert cache.conf_string(HmacConf([[(mac, 255)], []], slot_duration=10000)) == '0,%s,255' % mac
+    assert cache.misses == 4
+
+    # least recently used evicted
+    assert cache.conf_string(conf) == '0,%s,255' % mac
+    assert cache.misses == 5
+
+    # not inspectable: compiled every time
+    conf.getAccessPolicy = None
+    cache.conf_string(conf)
+    cache.conf_string(conf)
+    assert cache.misses == 7
+
+    cache.clear()
+    assert cache.conf_string(other) and other.compiled == 1
+
+
+def test_radio_program(port, capfd):
+    wifi = uniflex_module_wifi_ath.Ath9kModule(local_mac_processor_port=port)
+    wifi._phy_resolver.stop_monitor()
+    wifi.exec_file = sys.executable + ' ' + STUB_DAEMON
+    mac = '00:11:22:33:44:55'
+
+    # ready once the initial configuration is acknowledged
+    assert wifi.activate_radio_program('tdma', HmacConf([[(mac, 255)], []]), 'wlan0')
+    assert wifi.hmac_ctrl.sent == 1
+    # full configuration, also if only a slot changed
+    assert wifi.update_radio_program('tdma', HmacConf([[(mac, 255)], [(mac, 255)]]), 'wlan0')
+    assert wifi.hmac_ctrl.sent == 2
+    # unchanged, not sent
+    assert wifi.update_radio_program('tdma', HmacConf([[(mac, 255)], [(mac, 255)]]), 'wlan0')
+    assert wifi.hmac_ctrl.sent == 2
+
+    assert wifi.update_radio_program_async('tdma', HmacConf([[(mac, 1)], [(mac, 2)]]), 'wlan0')
+    assert wifi.hmac_ctrl.flush(timeout=2.0)
+    assert wifi.hmac_ctrl.last_error is None
+    assert wifi.hmac_ctrl.sent == 3
+    assert wifi.update_radio_program_async('tdma', HmacConf([[(mac, 1)], [(mac, 2)]]), 'wlan0')
+    assert wifi.hmac_ctrl.flush(timeout=2.0)
+    assert wifi.hmac_ctrl.sent == 3
+
+    proc = wifi.hmac_supervisor.proc
+    assert wifi.deactivate_radio_program('tdma')
+    assert proc.returncode == 0
+    assert wifi.active_hmac_conf is None
+
+    out = capfd.readouterr().out
+    assert "hMAC stub started: 0,%s,255" % mac in out
+    assert "received: b'0,%s,255'" % mac in out
+    assert "received: b'0,%s,255#1,%s,255'" % (mac, mac) in out
+    assert "received: b'0,%s,1#1,%s,2'" % (mac, mac) in out
+    assert "received: b'0,FF:FF:FF:FF:FF:FF,255#1,FF:FF:FF:FF:FF:FF,255'" in out
+    assert "received: b'TERMINATE'" in out
+
+
+def test_radio_program_errors(port):
+    wifi = uniflex_module_wifi_ath.Ath9kModule(local_mac_processor_port=port, hmac_ctrl_timeout=0.1)
+    wifi._phy_resolver.stop_monitor()
+    wifi.hmac_ctrl.retries = 0
+    mac = '00:11:22:33:44:55'
+    wifi.active_hmac_conf = HmacConf([[(mac, 255)], []])
+    wifi._hmac_conf_str = wifi.active_hmac_conf.createConfString()
+
+    # no daemon: the request times out
+    with pytest.raises(exceptions.FunctionExecutionFailedException):
+        wifi.update_radio_program('tdma', HmacConf([[], [(mac, 255)]]), 'wlan0')
+    assert wifi._hmac_conf_str is None
+
+    # closed channel
+    wifi.hmac_ctrl.close()
+    with pytest.raises(exceptions.FunctionExecutionFailedException):
+        wifi.update_radio_program('tdma', HmacConf([[], [(mac, 255)]]), 'wlan0')
+    with pytest.raises(exceptions.FunctionExecutionFailedException):
+        wifi.deactivate_radio_program('tdma')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
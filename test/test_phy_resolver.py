@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from uniflex_module_wifi_ath.phy_resolver import PhyResolver
+
+'''
+    Resolving the wiphy of interfaces from a temp directory standing in
+    for sysfs: cache hits, invalidation by link events of renamed and
+    removed interfaces and unknown interfaces.
+'''
+
+
+class LinkMsg(dict):
+    def __init__(self, event, ifname, index):
+        super().__init__(event=event, index=index)
+        self.attrs = {'IFLA_IFNAME': ifname}
+
+    def get_attr(self, name):
+        return self.attrs.get(name)
+
+
+class FailingIPRoute(object):
+    def get(self):
+        raise OSError('netlink socket closed')
+
+
+def add_iface(root, iface, phy_idx, ifindex):
+    os.makedirs(os.path.join(root, iface, 'phy80211'))
+    set_phy(root, iface, phy_idx)
+    with open(os.path.join(root, iface, 'ifindex'), 'w') as f:
+        f.write('%d\n' % ifindex)
+
+
+def set_phy(root, iface, phy_idx):
+    with open(os.path.join(root, iface, 'phy80211', 'index'), 'w') as f:
+        f.write('%d\n' % phy_idx)
+
+
+@pytest.fixture
+def sysfs_root(tmp_path):
+    root = str(tmp_path / 'net')
+    add_iface(root, 'wlan0', 0, 5)
+    add_iface(root, 'wlan1', 1, 6)
+    return root
+
+
+def test_resolve_and_cache(sysfs_root):
+    resolver = PhyResolver(sysfs_root, monitor=False)
+    assert resolver.get_phy_index('wlan0') == 0
+    assert resolver.get_phy_name('wlan1') == 'phy1'
+
+    # cache hit: sysfs is not read again
+    set_phy(sysfs_root, 'wlan0', 2)
+    assert resolver.get_phy_index('wlan0') == 0
+
+    resolver.invalidate('wlan0')
+    assert resolver.get_phy_index('wlan0') == 2
+    set_phy(sysfs_root, 'wlan1', 3)
+    resolver.invalidate()
+    assert resolver.get_phy_name('wlan1') == 'phy3'
+
+
+def test_link_events(sysfs_root):
+    resolver = PhyResolver(sysfs_root, monitor=False)
+    assert resolver.get_phy_index('wlan0') == 0
+    assert resolver.get_phy_index('wlan1') == 1
+
+    # events of other interfaces or not link related are ignored
+    set_phy(sysfs_root, 'wlan0', 2)
+    resolver._handle_link_event(LinkMsg('RTM_NEWLINK', 'eth0', 2))
+    resolver._handle_link_event(LinkMsg('RTM_NEWADDR', 'wlan0', 5))
+    assert resolver.get_phy_index('wlan0') == 0
+
+    # changed interface
+    resolver._handle_link_event(LinkMsg('RTM_NEWLINK', 'wlan0', 5))
+    assert resolver.get_phy_index('wlan0') == 2
+
+    # renamed interface, reported under the new name
+    os.rename(os.path.join(sysfs_root, 'wlan0'), os.path.join(sysfs_root, 'mon0'))
+    resolver._handle_link_event(LinkMsg('RTM_NEWLINK', 'mon0', 5))
+    with pytest.raises(ValueError):
+        resolver.get_phy_index('wlan0')
+    assert resolver.get_phy_index('mon0') == 2
+
+    # removed interface
+    os.rename(os.path.join(sysfs_root, 'wlan1'), os.path.join(sysfs_root, 'removed'))
+    resolver._handle_link_event(LinkMsg('RTM_DELLINK', 'wlan1', 6))
+    with pytest.raises(ValueError):
+        resolver.get_phy_index('wlan1')
+    assert resolver.get_phy_index('mon0') == 2
+
+
+def test_monitor_failure_invalidates(sysfs_root):
+    resolver = PhyResolver(sysfs_root, monitor=False)
+    assert resolver.get_phy_index('wlan0') == 0
+    set_phy(sysfs_root, 'wlan0', 2)
+
+    # w/o link events cached entries could be stale
+    resolver._ipr = FailingIPRoute()
+    resolver._run_monitor()
+    assert resolver.get_phy_index('wlan0') == 2
+
+
+def test_unknown_interface(sysfs_root):
+    resolver = PhyResolver(sysfs_root, monitor=False)
+    with pytest.raises(ValueError):
+        resolver.get_phy_index('wlan9')
+    with pytest.raises(ValueError):
+        resolver.get_phy_name('wlan9')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import logging
+from uniflex_module_wifi_ath import survey
+from uniflex_module_wifi_ath.ath_module import AirtimeSampler
+from uniflex_module_wifi_ath.survey import SurveySample, SurveyMonitor, parse_survey, airtime_utilization
+
+'''
+    Survey dumps, airtime utilization from counter deltas and the sliding
+    window of the survey monitor, with a fake nl80211 survey dump.
+'''
+
+
+class Attrs(object):
+    def __init__(self, **attrs):
+        self.attrs = attrs
+
+    def get_attr(self, name):
+        return self.attrs.get(name)
+
+
+def survey_msg(frequency, in_use=True, noise=None, time=None, busy=None, rx=None, tx=None):
+    info = Attrs(NL80211_SURVEY_INFO_FREQUENCY=frequency, NL80211_SURVEY_INFO_IN_USE=in_use or None,
+                 NL80211_SURVEY_INFO_NOISE=noise, NL80211_SURVEY_INFO_TIME=time,
+                 NL80211_SURVEY_INFO_TIME_BUSY=busy, NL80211_SURVEY_INFO_TIME_RX=rx,
+                 NL80211_SURVEY_INFO_TIME_TX=tx)
+    return Attrs(NL80211_ATTR_SURVEY_INFO=info)
+
+
+class Dump(object):
+    """
+    Survey dump read message by message from the netlink socket.
+    """
+
+    def __init__(self, msgs):
+        self.msgs = msgs
+        self.read = 0
+
+    def __iter__(self):
+        for msg in self.msgs:
+            self.read += 1
+            yield msg
+
+
+def test_parse_survey():
+    dump = Dump([survey_msg(2412, in_use=False, noise=160),
+                 survey_msg(5180, noise=160, time=1000, busy=300, rx=200, tx=100),
+                 survey_msg(5200, in_use=False)])
+    sample = parse_survey(dump, tstamp=1.0)
+    assert sample == SurveySample(1.0, 5180, -96, 1000, 300, None, 200, 100)
+    # the whole dump is read
+    assert dump.read == 3
+
+    assert parse_survey([survey_msg(2412, in_use=False), Attrs()]) is None
+
+
+def sample(tstamp, time, busy, rx, tx, frequency=5180):
+    return SurveySample(tstamp, frequency, -95, time, busy, None, rx, tx)
+
+
+def test_airtime_utilization():
+    old = sample(1.0, 1000, 100, 50, 20)
+    util = airtime_utilization(old, sample(1.5, 1500, 300, 150, 70))
+    assert util.duration == 0.5
+    assert (util.busy, util.rx, util.tx) == (0.4, 0.2, 0.1)
+
+    # counters wrapped or reset, e.g. by a channel switch of the driver
+    assert airtime_utilization(old, sample(1.5, 400, 300, 150, 70)) is None
+    assert airtime_utilization(old, sample(1.5, 1000, 100, 50, 20)) is None
+    util = airtime_utilization(old, sample(1.5, 1500, 50, 150, 70))
+    assert (util.busy, util.rx, util.tx) == (None, 0.2, 0.1)
+
+    # channel changed
+    assert airtime_utilization(old, sample(1.5, 1500, 300, 150, 70, frequency=5200)) is None
+
+    # no channel time reported
+    assert airtime_utilization(old, sample(1.5, None, 300, 150, 70)) is None
+
+    # at most fully busy
+    assert airtime_utilization(old, sample(1.5, 1500, 700, 150, 70)).busy == 1.0
+
+
+class FakeIW(object):
+    def __init__(self):
+        self.frequency = 5180
+        self.counters = [0, 0, 0, 0]
+        self.dumps = []
+
+    def step(self, time, busy, rx, tx):
+        self.counters = [c + d for c, d in zip(self.counters, (time, busy, rx, tx))]
+
+    def survey(self, ifindex):
+        time, busy, rx, tx = self.counters
+        dump = Dump([survey_msg(self.frequency, time=time, busy=busy, rx=rx, tx=tx)])
+        self.dumps.append(dump)
+        return iter(dump)
+
+    def close(self):
+        pass
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_monitor(monkeypatch, window):
+    clock = FakeTime()
+    monkeypatch.setattr(survey, 'time', clock)
+    monitor = SurveyMonitor(window=window)
+    monitor._iw = FakeIW()
+    monitor._ifindex['wlan0'] = 3
+    return monitor, monitor._iw, clock
+
+
+def test_monitor_window(monkeypatch):
+    monitor, iw, clock = make_monitor(monkeypatch, window=1.0)
+    assert monitor.get_utilization('wlan0') is None
+
+    # samples every 250 ms; the utilization covers the last second
+    for ii in range(1, 9):
+        clock.now += 0.25
+        iw.step(250, 100 if ii < 5 else 200, 50, 25)
+        util = monitor.get_utilization('wlan0')
+        assert util.duration == min(0.25 * ii, 1.0)
+        assert len(monitor._samples['wlan0']) <= 5
+    assert (util.busy, util.rx, util.tx) == (0.8, 0.2, 0.1)
+    assert monitor.get_last_sample('wlan0').tstamp == 2.0
+    assert all(dump.read == 1 for dump in iw.dumps)
+
+    # w/o window: since the previous sample
+    monitor.window = 0
+    clock.now += 0.25
+    iw.step(250, 50, 50, 25)
+    util = monitor.get_utilization('wlan0')
+    assert (util.duration, util.busy) == (0.25, 0.2)
+
+
+def test_monitor_counter_reset(monkeypatch):
+    monitor, iw, clock = make_monitor(monkeypatch, window=1.0)
+    for ii in range(3):
+        clock.now += 0.25
+        iw.step(250, 100, 50, 25)
+        monitor.get_utilization('wlan0')
+
+    # the window restarts with the sample after the reset
+    iw.counters = [10, 5, 0, 0]
+    clock.now += 0.25
+    assert monitor.get_utilization('wlan0') is None
+    assert len(monitor._samples['wlan0']) == 1
+    clock.now += 0.25
+    iw.step(250, 25, 0, 0)
+    util = monitor.get_utilization('wlan0')
+    assert (util.duration, util.busy) == (0.25, 0.1)
+
+    # channel changed
+    iw.frequency = 5200
+    clock.now += 0.25
+    iw.step(250, 25, 0, 0)
+    assert monitor.get_utilization('wlan0') is None
+    clock.now += 0.25
+    iw.step(250, 250, 0, 0)
+    util = monitor.get_utilization('wlan0')
+    assert (util.frequency, util.duration, util.busy) == (5200, 0.25, 1.0)
+
+    monitor.reset('wlan0')
+    assert monitor.get_last_sample('wlan0') is None
+
+
+class FakeModule(object):
+    def __init__(self):
+        self.log = logging.getLogger('FakeModule')
+        self.events = []
+
+    def send_event(self, event):
+        self.events.append(event)
+
+
+class FakeNoise(object):
+    def __init__(self):
+        self.surveys = []
+
+    def update_survey(self, sample):
+        self.surveys.append(sample)
+
+
+def run_sampler(sampler, iterations):
+    ticks = iter(range(iterations + 1))
+    sampler.is_stopped = lambda: next(ticks) == iterations
+    sampler.task()
+
+
+@pytest.mark.parametrize('window', [0, 1.0])
+def test_noise_sampler_keeps_window(monkeypatch, window):
+    monitor, iw, clock = make_monitor(monkeypatch, window=window)
+    module, noise = FakeModule(), FakeNoise()
+    airtime = AirtimeSampler(module, monitor, ['wlan0'], ival=0, noise=noise)
+    sampler = AirtimeSampler(module, monitor, ['wlan0'], ival=0, noise=noise, send_events=False,
+                             utilization=False)
+
+    run_sampler(airtime, 1)
+    for ii in range(4):
+        clock.now += 0.25
+        iw.step(250, 100, 50, 25)
+        run_sampler(sampler, 1)
+    assert len(noise.surveys) == 5
+    assert module.events == [] and sampler.latest == {}
+
+    assert len(monitor._samples['wlan0']) == 1
+
+    # the airtime sampler still gets the utilization since its previous
+    # sample, i.e. of its whole window
+    clock.now += 0.25
+    iw.step(250, 100, 50, 25)
+    run_sampler(airtime, 1)
+    util = airtime.latest['wlan0']
+    assert (util.duration, util.busy) == (1.25, 0.4)
+    assert len(module.events) == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -11,8 +11,8 @@ __email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
 
 
 class Ath5kModule(AthModule):
-    def __init__(self):
-        super(Ath5kModule, self).__init__()
+    def __init__(self, **kwargs):
+        super(Ath5kModule, self).__init__(**kwargs)
         self.log = logging.getLogger('Ath5kModule')
         self.prefix = 'ath5k'
 
@@ -62,9 +62,7 @@ class Ath5kModule(AthModule):
         self.log.info('Setting ANI sensitivity w/ = %s' % str(ani_mode))
 
         try:
-            myfile = open('/sys/kernel/debug/ieee80211/' + self.phyName + '/' + self.prefix + '/ani', 'w')
-            myfile.write(ani_mode)
-            myfile.close()
+            self._debugfs.write(self.phyName, self.prefix, 'ani', ani_mode)
             return True
         except Exception as e:
             fname = inspect.currentframe().f_code.co_name
@@ -1,11 +1,9 @@
 import logging
 import inspect
-import subprocess
-import zmq
-import time
 
 from uniflex.core import exceptions
 from .ath_module import AthModule
+from .hmac_control import HMACControlChannel, HMACSupervisor, HMACConfCache
 
 __author__ = "Piotr Gawlowicz, Anatolij Zubow"
 __copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
@@ -18,15 +16,22 @@ __email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
     - sensitivity control
 """
 class Ath9kModule(AthModule):
-    def __init__(self, local_mac_processor_port=1217):
-        super(Ath9kModule, self).__init__()
+    def __init__(self, local_mac_processor_port=1217, hmac_ctrl_timeout=1.0, hmac_ready_timeout=5.0, **kwargs):
+        super(Ath9kModule, self).__init__(**kwargs)
         self.log = logging.getLogger('Ath9kModule')
         # Used by local controller for communication with mac processor
         self.local_mac_processor_port = local_mac_processor_port
+        self.hmac_ctrl = HMACControlChannel(local_mac_processor_port, timeout=hmac_ctrl_timeout)
+        self.hmac_supervisor = HMACSupervisor(self.hmac_ctrl, ready_timeout=hmac_ready_timeout)
         # set-up executable here. note: it is platform-dependent
         self.exec_file = 'hmac_userspace_daemon'
         self.prefix = 'ath9k'
         self.active_hmac_conf = None
+        # compiled configuration strings; the one installed in the daemon and
+        # the last one submitted asynchronously
+        self.hmac_conf_cache = HMACConfCache()
+        self._hmac_conf_str = None
+        self._hmac_submitted_str = None
 
     ''' HMAC '''
 
@@ -47,7 +52,7 @@ class Ath9kModule(AthModule):
                 return
 
             # create configuration string
-            conf_str = hmac_conf.createConfString()
+            conf_str = self.hmac_conf_cache.conf_string(hmac_conf)
 
             processArgs = str(self.exec_file) + " -d 0 " + " -i" +str(interface) \
                           + " -f" + str(hmac_conf.getSlotDuration()) + " -n" + str(hmac_conf.getNumSlots()) \
@@ -55,11 +60,12 @@ class Ath9kModule(AthModule):
 
             self.log.info('Install hMAC executable w/ = %s' % str(processArgs))
 
-            # run as background process
-            subprocess.Popen(processArgs.split(), shell=False)
+            # run as background process and wait until it answers control
+            # messages; probed with the initial configuration, i.e. a no-op
+            self.hmac_supervisor.start(processArgs.split(), probe=conf_str)
 
             self.active_hmac_conf = hmac_conf
-            self.hmac_ctrl_socket = None
+            self._hmac_conf_str = self._hmac_submitted_str = conf_str
             return True
         except Exception as e:
             self.log.fatal("Failed to install MAC processor on %s: err_msg: %s" % (interface, e))
@@ -68,12 +74,14 @@ class Ath9kModule(AthModule):
                 err_msg='Failed to install MAC processor; check HMAC installation.: ' + str(e))
 
 
-    def update_radio_program(self, hmac_name=None, hmac_conf=None, interface=None):
+    def update_radio_program(self, hmac_name=None, hmac_conf=None, interface=None, force=False):
         """
-        Updates a running hMAC configuration on-the-fly
+        Updates a running hMAC configuration on-the-fly. Nothing is sent if the
+        configuration equals the installed one.
         :param hmac_name: hmac name/ID
         :param hmac_conf: the hMac configuration
         :param interface: the name of interface
+        :param force: send the configuration even if unchanged
         :return: True if successful
         """
 
@@ -85,28 +93,74 @@ class Ath9kModule(AthModule):
                 return
 
             # create configuration string
-            conf_str = hmac_conf.createConfString()
+            conf_str = self.hmac_conf_cache.conf_string(hmac_conf)
 
-            if self.hmac_ctrl_socket is None:
-                context = zmq.Context()
-                self.hmac_ctrl_socket = context.socket(zmq.REQ)
-                self.hmac_ctrl_socket.connect("tcp://localhost:" + str(self.local_mac_processor_port))
+            # pending asynchronous updates are superseded by this one
+            self.hmac_ctrl.cancel()
+            self.hmac_ctrl.flush(self.hmac_ctrl.timeout)
+
+            if conf_str == self._hmac_conf_str and not force:
+                self.log.debug("hMAC configuration unchanged; not sent")
+                self.active_hmac_conf = hmac_conf
+                self._hmac_submitted_str = conf_str
+                return True
 
             #  update MAC processor configuration
             self.log.info("Send ctrl req message to HMAC: %s" % conf_str)
-            self.hmac_ctrl_socket.send(conf_str.encode('ascii'))
-            message = self.hmac_ctrl_socket.recv()
+            message = self.hmac_ctrl.request(conf_str)
             self.log.info("Received ctrl reply message from HMAC: %s" % message)
             self.active_hmac_conf = hmac_conf
+            self._hmac_conf_str = self._hmac_submitted_str = conf_str
 
             return True
-        except zmq.ZMQError as e:
+        except Exception as e:
+            # e.g. timeout, closed channel or dead worker; state of the daemon
+            # is unknown, send the full configuration next time
+            self._hmac_conf_str = self._hmac_submitted_str = None
             self.log.fatal("Update MAC processor failed: %s" % (e))
             raise exceptions.FunctionExecutionFailedException(
                 func_name=inspect.currentframe().f_code.co_name,
                 err_msg='Update MAC processor failed: ' + str(e))
 
 
+    def update_radio_program_async(self, hmac_name=None, hmac_conf=None, interface=None):
+        """
+        Updates a running hMAC configuration on-the-fly without waiting for the
+        hMAC daemon. Updates submitted while a previous one is still being sent
+        are coalesced, i.e. only the latest configuration is sent.
+        :param hmac_name: hmac name/ID
+        :param hmac_conf: the hMac configuration
+        :param interface: the name of interface
+        :return: True if submitted
+        """
+
+        self.log.debug('Function: update_radio_program_async')
+
+        if interface == None:
+            self.log.warn('Iface is required')
+            return
+
+        # create configuration string
+        conf_str = self.hmac_conf_cache.conf_string(hmac_conf)
+        self.active_hmac_conf = hmac_conf
+
+        if conf_str == self._hmac_submitted_str:
+            self.log.debug("hMAC configuration unchanged; not sent")
+            return True
+
+        def sent(reply, error):
+            if error is None:
+                self._hmac_conf_str = conf_str
+            elif self._hmac_submitted_str == conf_str:
+                # state of the daemon is unknown, do not skip a retry
+                self._hmac_submitted_str = None
+                self._hmac_conf_str = None
+
+        self._hmac_submitted_str = conf_str
+        self.hmac_ctrl.submit(conf_str, sent)
+        return True
+
+
     def deactivate_radio_program(self, hmac_name=None, do_pause=False):
         """
         Stops running hMAC configuration, i.e. standard CSMA/CA is used afterwards.
@@ -122,33 +176,22 @@ class Ath9kModule(AthModule):
                 return
 
             # set allow all configuration string
-            conf_str = self.active_hmac_conf.createAllowAllConfString()
+            conf_str = self.hmac_conf_cache.allow_all_string(self.active_hmac_conf)
 
-            # command string
-            terminate_str = 'TERMINATE'
+            # pending asynchronous updates are obsolete
+            self.hmac_ctrl.cancel()
+            self.hmac_ctrl.flush(self.hmac_ctrl.timeout)
 
-            if self.hmac_ctrl_socket is None:
-                context = zmq.Context()
-                self.hmac_ctrl_socket = context.socket(zmq.REQ)
-                self.hmac_ctrl_socket.connect("tcp://localhost:" + str(self.local_mac_processor_port))
-
-            #  update MAC processor configuration
+            # install allow all configuration, then terminate MAC processor;
+            # the daemon acknowledges the configuration once it is applied
             self.log.info("Send ctrl req message to HMAC: %s" % conf_str)
-            self.hmac_ctrl_socket.send(conf_str.encode('ascii'))
-            message = self.hmac_ctrl_socket.recv()
-            self.log.info("Received ctrl reply from HMAC: %s" % message)
-
-            # give one second to settle down
-            time.sleep(1)
-
-            # send termination signal to MAC
-            self.hmac_ctrl_socket.send(terminate_str)
-            message = self.hmac_ctrl_socket.recv()
-            self.log.info("Received ctrl reply from HMAC: %s" % message)
+            self.hmac_supervisor.stop(conf_str)
+            self.log.info("HMAC terminated")
 
             self.active_hmac_conf = None
+            self._hmac_conf_str = self._hmac_submitted_str = None
             return True
-        except zmq.ZMQError as e:
+        except Exception as e:
             self.log.fatal("Failed to uninstall MAC processor %s" % str(e))
             raise exceptions.FunctionExecutionFailedException(
                 func_name=inspect.currentframe().f_code.co_name,
@@ -170,9 +213,7 @@ class Ath9kModule(AthModule):
         self.log.info('Setting ANI sensitivity w/ = %s' % str(ani_mode))
 
         try:
-            myfile = open('/sys/kernel/debug/ieee80211/' + self.phyName + '/' + self.prefix + '/ani', 'w')
-            myfile.write(ani_mode)
-            myfile.close()
+            self._debugfs.write(self.phyName, self.prefix, 'ani', ani_mode)
         except Exception as e:
             fname = inspect.currentframe().f_code.co_name
             self.log.fatal("An error occurred in %s: %s" % (fname, e))
@@ -1,11 +1,28 @@
 import os
 import logging
+import collections
+import select
 import inspect
-import subprocess
 import iptc
 from pytc.TrafficControl import TrafficControl
 import time
+import numpy as np
+from concurrent.futures.process import BrokenProcessPool
+from .phy_resolver import PhyResolver
+from .debugfs import DebugfsAccessor, DebugfsCache, parse_txq_params, parse_per_flow_tx_power, is_truncated
+from .survey import SurveyMonitor
+from .noise import NoiseFloorEstimator
+from .events import AirtimeUtilizationEvent
 from .csi import receiver as csi_receiver
+from .csi.constants import CSI_REPR_COMPLEX128
+from .csi.mapper import map_csi_hdrs
+from .csi.ring import CSIRingBuffer
+from .csi.recorder import CSIRecorder
+from .csi.sample_queue import CSISampleQueue, DROP_OLDEST
+from .csi.filters import CSIFilterChain
+from .csi.pool import CSIDecodePool, decode_into_slots
+from .csi.merge import merge_csi_samples
+from .csi.packet import CSIPacket
 
 import uniflex_module_wifi
 from uniflex.core import exceptions
@@ -17,28 +34,392 @@ __copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
 __version__ = "0.1.0"
 __email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
 
+CSI_WAIT_POLL = 'poll'
+CSI_WAIT_SLEEP = 'sleep'
+
+
+class CSIReaderThread(UniFlexThread):
+    """
+    Reads CSI records in the background, decodes them into the CSI ring
+    buffer of its radio and hands them to the registered sinks.
+
+    Wait modes:
+    - poll: block until the CSI device is readable, then drain it
+    - sleep: check the CSI device every ival seconds
+    Poll mode falls back to sleep mode if the driver reports the device as
+    readable without delivering data, i.e. does not support poll, and is
+    probed again after POLL_REPROBE_IVAL seconds. In both modes, stop()
+    wakes up the thread immediately through a pipe.
+
+    With a decode_pool (csi.pool.CSIDecodePool), the records of a wakeup are
+    decoded by its worker processes directly into reserved slots of the
+    ring, which has to be in shared memory. If the pool breaks, e.g. a
+    worker was killed, records are decoded by the reader thread again.
+
+    Records are only decoded if there are decoded sinks or fill_ring is set,
+    i.e. consumers of the raw records only (recorder, lazy collector) do not
+    pay for decoding into the ring nobody reads.
+    """
+
+    # consecutive wakeups w/o data before falling back to sleep mode
+    MAX_SPURIOUS_WAKEUPS = 3
+    # seconds in sleep mode before poll mode is tried again
+    POLL_REPROBE_IVAL = 60.0
+
+    def __init__(self, module, ring, csi_dev='/dev/CSI_dev', ival=0.01, wait_mode=CSI_WAIT_POLL,
+                 csi_filter=None, decode_pool=None):
+        super().__init__(module)
+        self.ring = ring
+        self.decode_pool = decode_pool
+        # called as csi_filter(hdr, pld) before decoding, records are dropped if False
+        self.csi_filter = csi_filter
+        self.csi_dev = csi_dev
+        self.ival = ival
+        self.wait_mode = wait_mode
+        self.sinks = ()
+        self.raw_sinks = ()
+        # decode into the ring even w/o decoded sinks, e.g. for get_csi
+        self.fill_ring = False
+        # pipe written by stop() to wake up the thread
+        self._wakeup = None
+
+    def add_sink(self, sink, raw=False):
+        # sinks are called as sink(hdr, csi_matrix, pld) from the reader thread,
+        # raw sinks as sink(hdr, csi, pld) with the packed CSI before decoding
+        if raw:
+            self.raw_sinks = self.raw_sinks + (sink,)
+        else:
+            self.sinks = self.sinks + (sink,)
+
+    def remove_sink(self, sink):
+        self.sinks = tuple(s for s in self.sinks if s != sink)
+        self.raw_sinks = tuple(s for s in self.raw_sinks if s != sink)
+
+    def drain(self, reader):
+        if self.decode_pool is not None:
+            return self._drain_pooled(reader)
+
+        num_records = 0
+        for hdr, csi, pld in reader.records():
+            num_records += 1
+            csi_filter = self.csi_filter
+            if csi_filter is not None and not csi_filter(hdr, pld):
+                continue
+            for sink in self.raw_sinks:
+                sink(hdr, csi, pld)
+            if not (self.sinks or self.fill_ring):
+                continue
+            csi_matrix = self.ring.append(hdr, csi)
+            if csi_matrix is None:
+                continue
+            for sink in self.sinks:
+                sink(hdr, csi_matrix, pld)
+        return num_records
+
+    def _drain_pooled(self, reader):
+        num_records = 0
+        records = []
+        for hdr, csi, pld in reader.records():
+            num_records += 1
+            rx_time = time.time()
+            csi_filter = self.csi_filter
+            if csi_filter is not None and not csi_filter(hdr, pld):
+                continue
+            for sink in self.raw_sinks:
+                sink(hdr, csi, pld)
+            if not (self.sinks or self.fill_ring) or not self.ring.accepts(hdr, csi):
+                continue
+            # records are views into the read buffer of the reader
+            records.append((hdr.copy(), bytes(csi), pld.copy(), rx_time))
+            # a reservation has to leave slots of the ring to readers
+            if len(records) >= self.ring.capacity // 2:
+                self._decode_pooled(records)
+                records = []
+
+        if records:
+            self._decode_pooled(records)
+        return num_records
+
+    def _decode_pooled(self, records):
+        # workers decode into reserved slots of the ring, readers see them after commit
+        hdrs = np.concatenate([rec[0] for rec in records])
+        bufs = [rec[1] for rec in records]
+        slots = self.ring.reserve(hdrs, [rec[3] for rec in records])
+        try:
+            self.decode_pool.decode_into(self.ring, slots, hdrs, bufs)
+        except BrokenProcessPool as e:
+            self.module.log.error("CSI decode pool broken (%s); decode in the reader thread" % str(e))
+            self.decode_pool = None
+            decode_into_slots(self.ring.matrices, slots, hdrs, b''.join(bufs), [len(buf) for buf in bufs],
+                              self.ring.csi_repr)
+
+        for (hdr, csi, pld, rx_time), csi_matrix in zip(records, self.ring.commit(slots)):
+            for sink in self.sinks:
+                sink(hdr, csi_matrix, pld)
+
+    def start(self):
+        if self._wakeup is None:
+            self._wakeup = os.pipe()
+            for fd in self._wakeup:
+                os.set_blocking(fd, False)
+        super().start()
+
+    def stop(self):
+        super().stop()
+        if self._wakeup is not None:
+            try:
+                os.write(self._wakeup[1], b'\0')
+            except BlockingIOError:
+                # pipe full, a wakeup is pending anyway
+                pass
+
+    def _clear_wakeup(self):
+        try:
+            while os.read(self._wakeup[0], 64):
+                pass
+        except BlockingIOError:
+            pass
+
+    def task(self):
+        self._clear_wakeup()
+        # keep CSI device open and drain all available records per wakeup
+        with csi_receiver.CSIReader(self.csi_dev) as reader:
+            poller = select.poll()
+            poller.register(self._wakeup[0], select.POLLIN)
+            poll_mode = False
+            reprobe = time.monotonic() if self.wait_mode == CSI_WAIT_POLL else None
+
+            woken = False
+            spurious = 0
+            while not self.is_stopped():
+                num_records = self.drain(reader)
+
+                if not poll_mode:
+                    if reprobe is None or time.monotonic() < reprobe:
+                        # sleep mode: wake up every ival or on stop
+                        poller.poll(self.ival * 1000)
+                        continue
+                    poller.register(reader.fileno(), select.POLLIN | select.POLLPRI)
+                    poll_mode, woken, spurious = True, False, 0
+
+                if num_records:
+                    spurious = 0
+                elif woken:
+                    spurious += 1
+                    if spurious >= self.MAX_SPURIOUS_WAKEUPS:
+                        self.module.log.warning("CSI device %s does not support poll; fall back to sleep "
+                                                "mode for %d s" % (self.csi_dev, self.POLL_REPROBE_IVAL))
+                        poller.unregister(reader.fileno())
+                        poll_mode = False
+                        reprobe = time.monotonic() + self.POLL_REPROBE_IVAL
+                        continue
+
+                # block until the device is readable or stop
+                woken = any(fd == reader.fileno() for fd, event in poller.poll())
+
 
 class CSICollector(UniFlexThread):
-    """docstring for CSICollector"""
+    """
+    Sends the CSI samples read by the CSI reader of the module as events.
+
+    Samples are passed through a bounded queue. With batch_size > 1 or
+    batch_ival set, a single CSISampleEvent carries a stacked structured
+    array of up to batch_size samples or of the samples received within
+    batch_ival seconds, whatever comes first.
 
-    def __init__(self, module, ival=0.01):
+    With lazy set, samples are sent as list of csi.packet.CSIPacket, which
+    carry the packed CSI and decode it only if accessed by the consumer.
+
+    The collector blocks until samples are queued or it is stopped; ival is
+    the interval of the CSI reader in sleep mode.
+    """
+
+    def __init__(self, module, ival=0.01, batch_size=None, batch_ival=None,
+                 queue_size=1024, drop_policy=DROP_OLDEST, iface=None, phy=None, lazy=False):
+        super().__init__(module)
+        self.ival = ival
+        self.lazy = lazy
+        # radio to collect from, events are tagged with iface and phy
+        self.iface = iface
+        self.phy = phy
+        if batch_size is None:
+            batch_size = 1 if batch_ival is None else queue_size
+        self.batch_size = batch_size
+        self.batch_ival = batch_ival
+        self.queue = CSISampleQueue(queue_size, drop_policy)
+        self.sent_events = 0
+        self.sent_samples = 0
+
+    def put(self, hdr, csi_matrix, pld):
+        self.queue.put(csi_receiver.make_csi_pkt(hdr, csi_matrix, pld))
+
+    def put_lazy(self, hdr, csi, pld):
+        self.queue.put(CSIPacket(hdr, csi, pld, self.module.csi_repr))
+
+    def get_stats(self):
+        return {
+            'received': self.queue.received,
+            'dropped': self.queue.dropped,
+            'queued': len(self.queue),
+            'sent_events': self.sent_events,
+            'sent_samples': self.sent_samples,
+        }
+
+    def send_batch(self, batch):
+        if self.lazy:
+            self.send_samples(batch)
+            return
+
+        # samples of different shape can not be stacked, send one event each
+        start = 0
+        for ii in range(1, len(batch) + 1):
+            if ii < len(batch) and batch[ii].dtype == batch[start].dtype:
+                continue
+            csi = batch[start] if ii - start == 1 else np.concatenate(batch[start:ii])
+            self.send_samples(csi)
+            start = ii
+
+    def send_samples(self, csi):
+        self.module.log.debug("CSI sample batch of %d" % len(csi))
+        sample = CSISampleEvent(sample=csi)
+        sample.iface = self.iface
+        sample.phy = self.phy
+        self.module.send_event(sample)
+        self.sent_events += 1
+        self.sent_samples += len(csi)
+
+    def start(self):
+        self.queue.resume()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        self.queue.interrupt()
+
+    def task(self):
+        reader = self.module.csi_reader_start(self.iface, fill_ring=False, ival=self.ival)
+        sink = self.put_lazy if self.lazy else self.put
+        reader.add_sink(sink, raw=self.lazy)
+        try:
+            while not self.is_stopped():
+                batch = self.queue.get_batch(self.batch_size, self.batch_ival)
+                if batch:
+                    self.send_batch(batch)
+        finally:
+            reader.remove_sink(sink)
+
+
+class AirtimeSampler(UniFlexThread):
+    """
+    Samples the nl80211 survey of interfaces every ival seconds, sends the
+    airtime utilization as AirtimeUtilizationEvent (if send_events) and
+    updates the noise floor estimate (if noise is given). Sampling is done
+    on a fixed schedule, i.e. the time needed for sampling does not add to ival.
+    Without utilization the survey is sampled without recording it, i.e.
+    the utilization window of the survey monitor is not affected.
+    """
+
+    def __init__(self, module, survey, ifaces, ival=0.1, noise=None, send_events=True, utilization=True):
         super().__init__(module)
+        self.survey = survey
+        self.ifaces = list(ifaces)
         self.ival = ival
+        self.noise = noise
+        self.send_events = send_events
+        self.utilization = utilization
+        # last utilization per interface
+        self.latest = {}
 
     def task(self):
+        deadline = time.monotonic()
         while not self.is_stopped():
-            self.module.log.info("CSI sample")
-            csi = csi_receiver.scan(debug=False)
-            sample = CSISampleEvent(sample=csi)
-            self.module.send_event(sample)
-            time.sleep(self.ival)
+            for iface in self.ifaces:
+                try:
+                    if self.utilization:
+                        util = self.survey.get_utilization(iface)
+                        sample = self.survey.get_last_sample(iface)
+                    else:
+                        util = None
+                        sample = self.survey.sample(iface, record=False)
+                except Exception as e:
+                    self.module.log.warning("Failed to sample survey of %s: %s" % (iface, str(e)))
+                    continue
+                if self.noise is not None:
+                    self.noise.update_survey(sample)
+                if util is None:
+                    continue
+                self.latest[iface] = util
+                if self.send_events:
+                    self.module.send_event(AirtimeUtilizationEvent(iface, util))
+
+            deadline += self.ival
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # overloaded; do not try to catch up
+                deadline = time.monotonic()
+
+
+class CSIRadio(object):
+    """
+    CSI pipeline of one radio, i.e. of one CSI device: ring buffer, reader
+    thread, collector, recorder, shared memory publisher and filters.
+    Radios are independent, every one is read and decoded by its own thread
+    or, with csi_decode_workers set, by the shared decode pool.
+    """
+
+    def __init__(self, csi_dev, iface=None, ring_capacity=1024, csi_repr=CSI_REPR_COMPLEX128, shared_ring=False):
+        self.csi_dev = csi_dev
+        self.iface = iface
+        self.phy = None
+        # decode pool workers decode into the ring, i.e. it has to be in shared memory
+        self.ring = CSIRingBuffer(ring_capacity, csi_repr, shared=shared_ring)
+        self.reader = None
+        self.collector = None
+        self.recorder = None
+        self.shm_publisher = None
+        self.filter = None
+
+
+# per flow TX power entry: flow mark, iptables marking rule, TX power
+FlowPowerEntry = collections.namedtuple('FlowPowerEntry', ['mark', 'rule', 'power'])
+
+# key of a flow in the per flow TX power index, has the attributes of a flowId
+FlowKey = collections.namedtuple('FlowKey', ['srcAddress', 'dstAddress', 'prot', 'srcPort', 'dstPort'])
 
 
 class AthModule(uniflex_module_wifi.WifiModule):
-    def __init__(self):
+    def __init__(self, csi_dev='/dev/CSI_dev', csi_ring_capacity=1024, csi_wait_mode=CSI_WAIT_POLL,
+                 csi_repr=CSI_REPR_COMPLEX128, debugfs_root='/sys/kernel/debug/ieee80211',
+                 debugfs_cache_ttl=0.1, survey_window=0, noise_alpha=0.1, csi_devs=None, csi_decode_workers=0):
         super(AthModule, self).__init__()
         self.log = logging.getLogger('AthModule')
-        self._csi_collector = None
+        self._phy_resolver = PhyResolver()
+        self._debugfs = DebugfsAccessor(debugfs_root)
+        self._debugfs_cache = DebugfsCache(debugfs_cache_ttl)
+        self._tc_mgr = TrafficControl()
+        # per flow TX power entries installed by this module: phy -> flow key -> FlowPowerEntry
+        self._flow_power_index = {}
+        # last applied EDCA parameters: phy -> queueId -> (aifs, cwmin, cwmax, txop)
+        self._edca_state = {}
+        self.csi_wait_mode = csi_wait_mode
+        self.csi_ring_capacity = csi_ring_capacity
+        self.csi_repr = csi_repr
+        # worker processes decoding CSI for the readers of all radios; 0 to
+        # decode in the reader threads
+        self.csi_decode_workers = csi_decode_workers
+        self._csi_decode_pool = None
+        # CSI radios: iface -> CSIRadio; w/o csi_devs (dict iface -> CSI device)
+        # a single radio w/o interface reads from csi_dev
+        self._csi_radios = collections.OrderedDict()
+        for iface, dev in (csi_devs.items() if csi_devs else [(None, csi_dev)]):
+            self.add_csi_radio(iface, dev)
+        self.csi_dev = next(iter(self._csi_radios.values())).csi_dev
+        self._survey = SurveyMonitor(survey_window)
+        self._airtime_sampler = None
+        self._noise_floor = NoiseFloorEstimator(noise_alpha)
+        self._noise_sampler = None
 
     def set_mac_access_parameters(self, iface, queueId, queueParams):
         '''
@@ -53,19 +434,8 @@ class AthModule(uniflex_module_wifi.WifiModule):
         self.log.debug("TxOp: {}".format(queueParams.getTxOp()))
 
         try:
-            cmd_str = ('sudo iw ' + iface + ' info')
-            cmd_output = subprocess.check_output(cmd_str, shell=True, stderr=subprocess.STDOUT)
-            cmd_output = cmd_output.decode("utf-8")
-            for item in cmd_output.split("\n"):
-                if "wiphy" in item:
-                    line = item.strip()
-
-            phyId = [int(s) for s in line.split() if s.isdigit()][0]
-
-            myfile = open('/sys/kernel/debug/ieee80211/phy'+str(phyId)+'/ath9k/txq_params', 'w')
-            value = str(queueId) + " " + str(queueParams.getAifs()) + " " + str(queueParams.getCwMin()) + " " + str(queueParams.getCwMax()) + " " + str(queueParams.getTxOp())
-            myfile.write(value)
-            myfile.close()
+            phyName = self._phy_resolver.get_phy_name(iface)
+            self._write_txq_params(phyName, queueId, queueParams)
             return True
         except Exception as e:
             self.log.fatal("Failed to set EDCA parameters: %s" % str(e))
@@ -73,23 +443,67 @@ class AthModule(uniflex_module_wifi.WifiModule):
                 func_name=inspect.currentframe().f_code.co_name,
                 err_msg='Failed to set EDCA parameters: ' + str(e))
 
-    def get_mac_access_parameters(self, iface):
-        self.log.debug("ATH9K gets EDCA parameters for interface: {}".format(iface))
+    def set_mac_access_parameters_bulk(self, iface, queueParams, force=False):
+        '''
+        Sets the MAC access parameters of several queues, e.g. all ACs, at once.
+        Only queues whose parameters differ from the last ones applied by this
+        module are written.
+        :param iface: the name of interface
+        :param queueParams: dict queueId -> queue parameters
+        :param force: write all queues, even if unchanged
+        :return: dict queueId -> 'written' or 'skipped'
+        '''
+        self.log.debug("ATH9K sets EDCA parameters for queues: {} on interface: {}".format(
+            sorted(queueParams), iface))
+
+        try:
+            phyName = self._phy_resolver.get_phy_name(iface)
+            applied = self._edca_state.get(phyName, {})
+
+            report = {}
+            for queueId, params in queueParams.items():
+                if not force and applied.get(queueId) == self._txq_params_tuple(params):
+                    report[queueId] = 'skipped'
+                    continue
+                self._write_txq_params(phyName, queueId, params)
+                report[queueId] = 'written'
+            return report
+        except Exception as e:
+            self.log.fatal("Failed to set EDCA parameters: %s" % str(e))
+            raise exceptions.FunctionExecutionFailedException(
+                func_name=inspect.currentframe().f_code.co_name,
+                err_msg='Failed to set EDCA parameters: ' + str(e))
+
+    @staticmethod
+    def _txq_params_tuple(queueParams):
+        return (queueParams.getAifs(), queueParams.getCwMin(), queueParams.getCwMax(), queueParams.getTxOp())
 
+    def _write_txq_params(self, phyName, queueId, queueParams):
+        params = self._txq_params_tuple(queueParams)
+        value = " ".join(str(v) for v in (queueId,) + params)
+        self._debugfs_cache.invalidate((phyName, 'txq_params'))
         try:
-            cmd_str = ('sudo iw ' + iface + ' info')
-            cmd_output = subprocess.check_output(cmd_str, shell=True, stderr=subprocess.STDOUT)
+            self._debugfs.write(phyName, 'ath9k', 'txq_params', value)
+        except Exception:
+            # the hardware state is unknown after a failed write
+            self._edca_state.get(phyName, {}).pop(queueId, None)
+            raise
+        self._edca_state.setdefault(phyName, {})[queueId] = params
 
-            for item in cmd_output.split("\n"):
-                 if "wiphy" in item:
-                    line = item.strip()
+    def get_mac_access_parameters(self, iface):
+        '''
+        Gets the MAC access parameters of all ACs; readbacks are cached for
+        debugfs_cache_ttl seconds or until changed by this module.
+        :return: ordered dict AC name (VO, VI, BE, BK) -> TxqParams
+        '''
+        self.log.debug("ATH9K gets EDCA parameters for interface: {}".format(iface))
 
-            phyId = [int(s) for s in line.split() if s.isdigit()][0]
+        try:
+            phyName = self._phy_resolver.get_phy_name(iface)
 
-            myfile = open('/sys/kernel/debug/ieee80211/phy'+str(phyId)+'/ath9k/txq_params', 'r')
-            data = myfile.read()
-            myfile.close()
-            return data
+            data = self._debugfs_cache.get((phyName, 'txq_params'), lambda: parse_txq_params(
+                self._debugfs.read(phyName, 'ath9k', 'txq_params')))
+            return data.copy()
         except Exception as e:
             self.log.fatal("Failed to get EDCA parameters: %s" % str(e))
             raise exceptions.FunctionExecutionFailedException(
@@ -100,36 +514,165 @@ class AthModule(uniflex_module_wifi.WifiModule):
         self.log.debug('set_per_flow_tx_power on iface: {}'.format(iface))
 
         try:
-            tcMgr = TrafficControl()
-            markId = tcMgr.generateMark()
-            self.setMarking(flowId, table="mangle", chain="POSTROUTING", markId=markId)
-
-            cmd_str = ('sudo iw ' + iface + ' info')
-            cmd_output = subprocess.check_output(cmd_str, shell=True, stderr=subprocess.STDOUT)
-
-            for item in cmd_output.split("\n"):
-                 if "wiphy" in item:
-                    line = item.strip()
+            self._apply_per_flow_tx_power(iface, [(flowId, txPower)])
+            return True
+        except Exception as e:
+            self.log.fatal("Failed to set per flow tx power: %s" % str(e))
+            raise exceptions.FunctionExecutionFailedException(
+                func_name=inspect.currentframe().f_code.co_name,
+                err_msg='Failed to set per flow tx power: ' + str(e))
 
-            phyId = [int(s) for s in line.split() if s.isdigit()][0]
+    def set_per_flow_tx_power_batch(self, iface, flowPowers, removeFlows=()):
+        """
+        Installs, updates and removes per flow TX power entries at once. All
+        iptables changes are done in a single transaction; flows already
+        installed by this module keep their mark and rule.
+        :param iface: the name of interface
+        :param flowPowers: dict or list of (flowId, txPower) to install or update
+        :param removeFlows: list of flowIds to remove
+        :return: dict 'added', 'updated', 'removed', 'unchanged' -> number of flows
+        """
+        self.log.debug('set_per_flow_tx_power_batch on iface: {}'.format(iface))
 
-            myfile = open('/sys/kernel/debug/ieee80211/phy'+str(phyId)+'/ath9k/per_flow_tx_power', 'w')
-            value = str(markId) + " " + str(txPower) + " 0"
-            myfile.write(value)
-            myfile.close()
-            return True
+        try:
+            if isinstance(flowPowers, dict):
+                flowPowers = flowPowers.items()
+            return self._apply_per_flow_tx_power(iface, flowPowers, removeFlows)
         except Exception as e:
             self.log.fatal("Failed to set per flow tx power: %s" % str(e))
             raise exceptions.FunctionExecutionFailedException(
                 func_name=inspect.currentframe().f_code.co_name,
                 err_msg='Failed to set per flow tx power: ' + str(e))
 
+    def reconcile_per_flow_tx_power(self, iface, flowPowers):
+        """
+        Brings the per flow TX power table into the desired state with the
+        minimal number of changes: flows not desired anymore are removed,
+        new flows added and only flows whose TX power in the driver differs
+        are rewritten. Unchanged flows keep their TX power throughout.
+        Driver entries not installed by this module are removed together with
+        their marking rules; new flows never reuse a mark in use.
+        :param iface: the name of interface
+        :param flowPowers: dict or list of (flowId, txPower), the full desired state
+        :return: dict 'added', 'updated', 'removed', 'unchanged', 'stale' -> number of entries
+        """
+        self.log.debug('reconcile_per_flow_tx_power on iface: {}'.format(iface))
+
+        try:
+            if isinstance(flowPowers, dict):
+                flowPowers = flowPowers.items()
+            flowPowers = list(flowPowers)
+
+            phyName = self._phy_resolver.get_phy_name(iface)
+            index = self._flow_power_index.setdefault(phyName, {})
+
+            # current driver state, bypassing the readback cache
+            self._debugfs_cache.invalidate((phyName, 'per_flow_tx_power'))
+            data = self._debugfs.read(phyName, 'ath9k', 'per_flow_tx_power')
+            table = parse_per_flow_tx_power(data)
+            truncated = is_truncated(data)
+
+            # entries whose driver state differs from the index are rewritten;
+            # entries beyond the end of a truncated readback are trusted
+            for key, entry in index.items():
+                if entry.mark not in table and truncated:
+                    continue
+                if table.get(entry.mark) != entry.power:
+                    index[key] = entry._replace(power=None)
+
+            # driver entries and their marking rules left by someone else
+            marks = set(entry.mark for entry in index.values())
+            stale = [mark for mark in table if mark not in marks]
+            rules = self._get_marking_rules()
+            leftover = [rule for mark, rule in rules if mark in table and mark not in marks]
+            reserved = set(table) | set(mark for mark, rule in rules)
+
+            # removed first, new flows must not be cleared afterwards
+            self._debugfs_cache.invalidate((phyName, 'per_flow_tx_power'))
+            for mark in stale:
+                self._write_per_flow_tx_power(phyName, -mark, 0)
+
+            desired = set(self._flow_key(flowId) for flowId, txPower in flowPowers)
+            removeFlows = [key for key in index if key not in desired]
+            report = self._apply_per_flow_tx_power(iface, flowPowers, removeFlows,
+                                                   deleteRules=leftover, reservedMarks=reserved)
+            report['stale'] = len(stale)
+            return report
+        except Exception as e:
+            self.log.fatal("Failed to reconcile per flow tx power: %s" % str(e))
+            raise exceptions.FunctionExecutionFailedException(
+                func_name=inspect.currentframe().f_code.co_name,
+                err_msg='Failed to reconcile per flow tx power: ' + str(e))
+
+    @staticmethod
+    def _flow_key(flowId):
+        return FlowKey(flowId.srcAddress, flowId.dstAddress, flowId.prot, flowId.srcPort, flowId.dstPort)
+
+    def _apply_per_flow_tx_power(self, iface, flowPowers, removeFlows=(), deleteRules=(), reservedMarks=()):
+        phyName = self._phy_resolver.get_phy_name(iface)
+        index = self._flow_power_index.setdefault(phyName, {})
+
+        removed = {}
+        for flowId in removeFlows:
+            key = self._flow_key(flowId)
+            if key in index:
+                removed[key] = index[key]
+
+        added = {}
+        updated = {}
+        unchanged = 0
+        for flowId, txPower in flowPowers:
+            key = self._flow_key(flowId)
+            if key in removed or key in added or key in updated:
+                raise ValueError('Flow %s given more than once' % str(key))
+
+            entry = index.get(key)
+            if entry is None:
+                markId = self._tc_mgr.generateMark()
+                while markId in reservedMarks:
+                    markId = self._tc_mgr.generateMark()
+                added[key] = FlowPowerEntry(markId, self._make_marking_rule(flowId, markId), txPower)
+            elif entry.power != txPower:
+                updated[key] = entry._replace(power=txPower)
+            else:
+                unchanged += 1
+
+        # iptables rules of all flows in one transaction
+        if added or removed or deleteRules:
+            self._update_marking_rules(insert=[e.rule for e in added.values()],
+                                       delete=[e.rule for e in removed.values()] + list(deleteRules))
+
+        # the index follows iptables; power is set once written to the driver
+        for key in removed:
+            del index[key]
+        for key, entry in added.items():
+            index[key] = entry._replace(power=None)
+
+        self._debugfs_cache.invalidate((phyName, 'per_flow_tx_power'))
+        for entry in removed.values():
+            self._write_per_flow_tx_power(phyName, -entry.mark, 0)
+        for key, entry in list(added.items()) + list(updated.items()):
+            self._write_per_flow_tx_power(phyName, entry.mark, entry.power)
+            index[key] = entry
+
+        return {'added': len(added), 'updated': len(updated),
+                'removed': len(removed), 'unchanged': unchanged}
+
+    def _write_per_flow_tx_power(self, phyName, markId, txPower):
+        # mark > 0: add or update entry, mark < 0: remove entry, mark = 0: clear table
+        value = str(markId) + " " + str(txPower) + " 0"
+        self._debugfs.write(phyName, 'ath9k', 'per_flow_tx_power', value)
+
     ''' Helper '''
     def setMarking(self, flowId, table="mangle", chain="POSTROUTING", markId=None):
         if not markId:
-            tcMgr = TrafficControl()
-            markId = tcMgr.generateMark()
+            markId = self._tc_mgr.generateMark()
 
+        rule = self._make_marking_rule(flowId, markId)
+        chain = iptc.Chain(iptc.Table(table), chain)
+        chain.insert_rule(rule)
+
+    def _make_marking_rule(self, flowId, markId):
         rule = iptc.Rule()
 
         if flowId.srcAddress:
@@ -153,26 +696,61 @@ class AthModule(uniflex_module_wifi.WifiModule):
         target = iptc.Target(rule, "MARK")
         target.set_mark = str(markId)
         rule.target = target
-        chain = iptc.Chain(iptc.Table(table), chain)
-        chain.insert_rule(rule)
+        return rule
+
+    def _update_marking_rules(self, insert=(), delete=(), table="mangle", chain="POSTROUTING"):
+        table = iptc.Table(table)
+        table.autocommit = False
+        try:
+            chain = iptc.Chain(table, chain)
+            for rule in delete:
+                chain.delete_rule(rule)
+            for rule in insert:
+                chain.insert_rule(rule)
+            table.commit()
+        except Exception:
+            # discard the uncommitted changes
+            table.refresh()
+            raise
+        finally:
+            table.autocommit = True
+
+    def _get_marking_rules(self, table="mangle", chain="POSTROUTING"):
+        # current MARK rules of the chain: list of (mark, rule)
+        table = iptc.Table(table)
+        table.refresh()
+        rules = []
+        for rule in iptc.Chain(table, chain).rules:
+            if rule.target is None or rule.target.name != "MARK":
+                continue
+            mark = self._marking_rule_mark(rule)
+            if mark is not None:
+                rules.append((mark, rule))
+        return rules
+
+    @staticmethod
+    def _marking_rule_mark(rule):
+        # e.g. {'set-xmark': ['0x1/0xffffffff']}
+        params = rule.target.get_all_parameters()
+        values = params.get('set-xmark') or params.get('set-mark')
+        if not values:
+            return None
+        return int(values[0].split('/')[0], 0)
 
     def clean_per_flow_tx_power_table(self, iface):
         self.log.debug('clean_per_flow_tx_power_table on iface: {}'.format(iface))
 
         try:
-            cmd_str = ('sudo iw ' + iface + ' info')
-            cmd_output = subprocess.check_output(cmd_str, shell=True, stderr=subprocess.STDOUT)
-
-            for item in cmd_output.split("\n"):
-                 if "wiphy" in item:
-                    line = item.strip()
+            phyName = self._phy_resolver.get_phy_name(iface)
 
-            phyId = [int(s) for s in line.split() if s.isdigit()][0]
+            # remove the marking rules installed by this module
+            index = self._flow_power_index.get(phyName)
+            if index:
+                self._update_marking_rules(delete=[e.rule for e in index.values()])
+                index.clear()
 
-            myfile = open('/sys/kernel/debug/ieee80211/phy'+str(phyId)+'/ath9k/per_flow_tx_power', 'w')
-            value = "0 0 0"
-            myfile.write(value)
-            myfile.close()
+            self._debugfs_cache.invalidate((phyName, 'per_flow_tx_power'))
+            self._write_per_flow_tx_power(phyName, 0, 0)
             return True
         except Exception as e:
             self.log.fatal("Failed to clean per flow tx power: %s" % str(e))
@@ -181,62 +759,147 @@ class AthModule(uniflex_module_wifi.WifiModule):
                 err_msg='Failed to clean per flow tx power: ' + str(e))
 
     def get_per_flow_tx_power_table(self, iface):
+        '''
+        Gets the per flow TX power table; readbacks are cached for
+        debugfs_cache_ttl seconds or until changed by this module.
+        :return: dict flow mark -> TX power
+        '''
         self.log.debug('get_per_flow_tx_power_table on iface: {}'.format(iface))
 
         try:
-            cmd_str = ('sudo iw ' + iface + ' info')
-            cmd_output = subprocess.check_output(cmd_str, shell=True, stderr=subprocess.STDOUT)
-
-            for item in cmd_output.split("\n"):
-                 if "wiphy" in item:
-                    line = item.strip()
+            phyName = self._phy_resolver.get_phy_name(iface)
 
-            phyId = [int(s) for s in line.split() if s.isdigit()][0]
-
-            myfile = open('/sys/kernel/debug/ieee80211/phy'+str(phyId)+'/ath9k/per_flow_tx_power', 'r')
-            data = myfile.read()
-            myfile.close()
-            return data
+            data = self._debugfs_cache.get((phyName, 'per_flow_tx_power'), lambda: parse_per_flow_tx_power(
+                self._debugfs.read(phyName, 'ath9k', 'per_flow_tx_power')))
+            return data.copy()
         except Exception as e:
             self.log.fatal("Failed to get per flow tx power: %s" % str(e))
             raise exceptions.FunctionExecutionFailedException(
                 func_name=inspect.currentframe().f_code.co_name,
                 err_msg='Failed to get per flow tx power: ' + str(e))
 
-    def get_noise(self):
-        self.log.warn('Hard coded noise floor')
-        return -92
+    def get_noise(self, iface=None):
+        """
+        Returns the smoothed noise floor of the channel in use as measured in
+        the background (see noise_monitor_start and airtime_sampler_start).
+        Without any measurement yet, the survey of iface is sampled once.
+        :param iface: the name of interface
+        :return: the noise floor in dBm or None if not available
+        """
+        # channel in use by iface, if sampled before
+        survey = self._survey.get_last_sample(iface) if iface is not None else None
+        noise = self._noise_floor.get(survey.frequency if survey is not None else None)
+        if noise is not None or iface is None:
+            return noise
+
+        try:
+            self._noise_floor.update_survey(self._survey.sample(iface))
+            return self._noise_floor.get()
+        except Exception as e:
+            self.log.fatal("Failed to get noise floor: %s" % str(e))
+            raise exceptions.FunctionExecutionFailedException(
+                func_name=inspect.currentframe().f_code.co_name,
+                err_msg='Failed to get noise floor: ' + str(e))
+
+
+    def get_airtime_utilization(self, iface=None):
+        """
+        Returns the airtime utilization of the channel in use from the nl80211
+        survey counters, i.e. since the previous call or over the last
+        survey_window seconds. If the airtime sampler runs for the interface
+        its last result is returned.
+        :param iface: the name of interface
+        :return: AirtimeUtilization (busy, rx, tx fractions) or None if not available yet
+        """
+        if iface == None:
+            self.log.warn('Iface is required')
+            return
+
+        sampler = self._airtime_sampler
+        if sampler is not None and sampler.is_running() and iface in sampler.ifaces:
+            return sampler.latest.get(iface)
 
+        try:
+            return self._survey.get_utilization(iface)
+        except Exception as e:
+            self.log.fatal("Failed to get airtime utilization: %s" % str(e))
+            raise exceptions.FunctionExecutionFailedException(
+                func_name=inspect.currentframe().f_code.co_name,
+                err_msg='Failed to get airtime utilization: ' + str(e))
 
-    def get_airtime_utilization(self):
-        self.log.error('Get artime utilization function not yet implemented')
-        raise exceptions.UnsupportedFunctionException(
-            func_name=inspect.currentframe().f_code.co_name,
-            conn_module='AthModule')
 
+    def add_csi_radio(self, iface, csi_dev):
+        """
+        Adds a radio to collect CSI from, e.g. on APs with several Atheros radios.
+        Every radio has its own ring buffer, reader thread, collector and filters.
+        :param iface: the name of interface of the radio
+        :param csi_dev: the CSI device of the radio
+        :return: True if successful
+        """
+        if iface in self._csi_radios:
+            self.log.warn('CSI radio %s already configured; ignoring.' % iface)
+            return True
 
-    def get_csi(self, num_samples, withMetaData=False):
+        self._csi_radios[iface] = CSIRadio(csi_dev, iface, self.csi_ring_capacity, self.csi_repr,
+                                            shared_ring=bool(self.csi_decode_workers))
+        return True
+
+
+    def get_csi_radios(self):
         """
-        Reads the next csi values.
-        :param num_samples: the number of samples to read
-        :return: for withMetaData=True: tbd ELSE: the csi values as numpy matrix of dimension: num_samples x Ntx x Nrx x Nsc
+        :return: dict interface -> CSI device of the configured radios
         """
+        return collections.OrderedDict((iface, radio.csi_dev) for iface, radio in self._csi_radios.items())
+
+
+    def _get_csi_radio(self, iface=None):
+        radio = self._csi_radios.get(iface)
+        if radio is not None:
+            return radio
+        if iface is None or len(self._csi_radios) == 1:
+            # the first radio is the default one
+            return next(iter(self._csi_radios.values()))
+        raise ValueError('No CSI device configured for interface: %s' % iface)
+
+
+    def _get_csi_radio_phy(self, radio):
+        if radio.phy is None and radio.iface is not None:
+            try:
+                radio.phy = self._phy_resolver.get_phy_name(radio.iface)
+            except Exception as e:
+                self.log.warning("Failed to resolve phy of %s: %s" % (radio.iface, str(e)))
+        return radio.phy
 
-        if withMetaData:
-            # not yet implemented
-            raise exceptions.UnsupportedFunctionException()
 
-        # define receiver params
-        csi_dev = '/dev/CSI_dev'
+    def get_csi(self, num_samples, withMetaData=False, iface=None, shape=None):
+        """
+        Returns the latest csi values collected by the background CSI reader.
+        Does not wait for new samples, i.e. less than num_samples are returned
+        if not enough samples were received yet. Only samples of one matrix
+        shape are returned, by default the shape of the latest sample.
+        :param num_samples: the number of samples to read
+        :param withMetaData: also return the header metadata of the samples
+        :param iface: the radio to read from; default: the first one
+        :param shape: the CSI matrix shape (Nrx, Ntx, Nsc) of the samples to return
+        :return: the csi values as numpy matrix of dimension: num_samples x Nrx x Ntx x Nsc (x 2 for the int16 csi_repr);
+                 for withMetaData=True: tuple (csi, meta, valid) with meta a DTYPE_CSI_META array (timestamp, channel,
+                 bandwidth, rate, number of streams, phy error, rssi per chain, noise) and valid a bool array, False
+                 for samples with invalid header codes
+        """
+
+        radio = self._get_csi_radio(iface)
 
         # check CSI device
-        if not os.path.exists(csi_dev):
-            raise ValueError('Could not find CSI device: %s.' % csi_dev)
+        if not os.path.exists(radio.csi_dev):
+            raise ValueError('Could not find CSI device: %s.' % radio.csi_dev)
 
         try:
-            debug = False
-            csi = csi_receiver.scan(debug=debug)
+            self.csi_reader_start(iface)
+            hdrs, csi = radio.ring.latest(num_samples, shape=shape)
 
+            if withMetaData:
+                meta, valid = map_csi_hdrs(hdrs)
+                return csi, meta, valid
             return csi
 
         except Exception as e:
@@ -246,24 +909,277 @@ class AthModule(uniflex_module_wifi.WifiModule):
                 err_msg='Failed to get CSI: ' + str(e))
 
 
-    def csi_collector_start(self, ival):
+    def get_csi_merged(self, num_samples, withMetaData=False):
+        """
+        Returns the latest csi values of all radios merged in receive time order.
+        :param num_samples: the number of samples to read
+        :param withMetaData: also return the header metadata of the samples
+        :return: tuple (ifaces, csi) with the interface of every sample; csi is
+                 a list of matrices if the radios differ in matrix shape;
+                 for withMetaData=True: tuple (ifaces, csi, meta, valid), see get_csi
+        """
+        try:
+            streams = collections.OrderedDict()
+            for iface, radio in self._csi_radios.items():
+                if not os.path.exists(radio.csi_dev):
+                    self.log.warning('Could not find CSI device: %s.' % radio.csi_dev)
+                    continue
+                self.csi_reader_start(iface)
+                streams[iface] = radio.ring.latest(num_samples, rx_times=True)
+
+            ifaces, hdrs, csi, rx_times = merge_csi_samples(streams, num_samples)
+
+            if withMetaData:
+                meta, valid = map_csi_hdrs(hdrs)
+                return ifaces, csi, meta, valid
+            return ifaces, csi
+
+        except Exception as e:
+            self.log.fatal("Failed to get CSI: %s" % str(e))
+            raise exceptions.FunctionExecutionFailedException(
+                func_name=inspect.currentframe().f_code.co_name,
+                err_msg='Failed to get CSI: ' + str(e))
+
+
+    def csi_reader_start(self, iface=None, fill_ring=True, ival=None):
+        """
+        Starts the CSI reader of a radio, if not running yet.
+        :param iface: the radio; default: the first one
+        :param fill_ring: decode all records into the ring buffer, e.g. for
+                          get_csi; stays set once requested
+        :param ival: interval in seconds to check the CSI device in sleep
+                     mode; default: unchanged, initially 10 ms
+        :return: the CSIReaderThread
+        """
+        radio = self._get_csi_radio(iface)
+        if radio.reader is None:
+            radio.reader = CSIReaderThread(self, radio.ring, radio.csi_dev,
+                                           wait_mode=self.csi_wait_mode,
+                                           csi_filter=radio.filter,
+                                           decode_pool=self._get_csi_decode_pool())
+        if fill_ring:
+            radio.reader.fill_ring = True
+        if ival is not None:
+            radio.reader.ival = ival
+
+        if not radio.reader.is_running():
+            self.log.info("Start CSI reader on %s" % radio.csi_dev)
+            radio.reader.start()
+        return radio.reader
+
+
+    def _get_csi_decode_pool(self):
+        if self.csi_decode_workers and self._csi_decode_pool is None:
+            self._csi_decode_pool = CSIDecodePool(self.csi_decode_workers, self.csi_repr)
+        return self._csi_decode_pool
 
-        if self._csi_collector is None:
-            self._csi_collector = CSICollector(self, ival)
 
-        if self._csi_collector.is_running():
+    def csi_reader_stop(self, iface=None):
+        radio = self._get_csi_radio(iface)
+        self.log.info("Stop CSI reader on %s" % radio.csi_dev)
+        if radio.reader is not None:
+            radio.reader.stop()
+        return True
+
+
+    def set_csi_filters(self, filters, iface=None):
+        """
+        Sets the filters received CSI records have to pass before being
+        decoded or handed to any sink, see csi.filters.
+        :param filters: list of CSIFilter; empty to accept all records
+        :param iface: the radio; default: the first one
+        :return: True if successful
+        """
+        radio = self._get_csi_radio(iface)
+        radio.filter = CSIFilterChain(filters) if filters else None
+        if radio.reader is not None:
+            radio.reader.csi_filter = radio.filter
+        return True
+
+
+    def get_csi_filter_stats(self, iface=None):
+        """
+        :return: dict of passed records and dropped records per filter
+        """
+        radio = self._get_csi_radio(iface)
+        if radio.filter is None:
+            return None
+        return radio.filter.get_stats()
+
+
+    def csi_recorder_start(self, path, iface=None):
+        """
+        Starts appending all received raw CSI records to a recording.
+        Use csi.CSIRecording to read it.
+        :param path: the recording file; an index is stored in <path>.idx
+        :param iface: the radio; default: the first one
+        :return: True if successful
+        """
+        radio = self._get_csi_radio(iface)
+        if radio.recorder is not None:
+            self.log.warn('CSI recorder already running; ignoring.')
+            return True
+
+        self.log.info("Start CSI recorder: %s" % path)
+        radio.recorder = CSIRecorder(path)
+        self.csi_reader_start(iface, fill_ring=False).add_sink(radio.recorder.write, raw=True)
+        return True
+
+
+    def csi_recorder_stop(self, iface=None):
+        self.log.info("Stop CSI recorder")
+        radio = self._get_csi_radio(iface)
+        if radio.recorder is None:
+            return True
+
+        radio.reader.remove_sink(radio.recorder.write)
+        radio.recorder.close()
+        radio.recorder = None
+        return True
+
+
+    def csi_shm_publisher_start(self, name=None, capacity=1024, max_shape=(3, 3, 114), iface=None):
+        """
+        Starts publishing decoded CSI samples in a shared memory ring for
+        consumers in other processes, see csi.shm.CSISharedMemoryReader.
+        :param name: name of the shared memory segment; default: random
+        :param capacity: number of samples in the ring
+        :param max_shape: max. CSI matrix shape (nr, nc, num_tones)
+        :param iface: the radio; default: the first one
+        :return: the name of the shared memory segment
+        """
+        radio = self._get_csi_radio(iface)
+        if radio.shm_publisher is not None:
+            self.log.warn('CSI shared memory publisher already running; ignoring.')
+            return radio.shm_publisher.name
+
+        try:
+            # multiprocessing.shared_memory requires Python >= 3.8
+            from .csi.shm import CSISharedMemoryPublisher
+            radio.shm_publisher = CSISharedMemoryPublisher(name, capacity, max_shape, self.csi_repr)
+        except Exception as e:
+            self.log.fatal("Failed to create CSI shared memory: %s" % str(e))
+            raise exceptions.FunctionExecutionFailedException(
+                func_name=inspect.currentframe().f_code.co_name,
+                err_msg='Failed to create CSI shared memory: ' + str(e))
+
+        self.log.info("Start CSI shared memory publisher: %s" % radio.shm_publisher.name)
+        self.csi_reader_start(iface, fill_ring=False).add_sink(radio.shm_publisher.put)
+        return radio.shm_publisher.name
+
+
+    def csi_shm_publisher_stop(self, iface=None):
+        self.log.info("Stop CSI shared memory publisher")
+        radio = self._get_csi_radio(iface)
+        if radio.shm_publisher is None:
             return True
 
-        self.log.info("Start CSI collector")
-        self._csi_collector.start()
+        radio.reader.remove_sink(radio.shm_publisher.put)
+        radio.shm_publisher.close()
+        radio.shm_publisher = None
         return True
 
 
-    def csi_collector_stop(self):
+    def csi_collector_start(self, ival, batch_size=None, batch_ival=None,
+                            queue_size=1024, drop_policy=DROP_OLDEST, iface=None, lazy=False):
+        """
+        Starts sending CSI samples as CSISampleEvent; events are tagged with
+        the interface (iface) and phy (phy) of the radio.
+        :param ival: interval in seconds of the CSI reader in sleep mode
+        :param batch_size: max. number of samples per event; default: 1 w/o batch_ival
+        :param batch_ival: max. time in seconds to collect samples for one event
+        :param queue_size: max. number of samples queued for sending
+        :param drop_policy: drop-oldest or drop-newest sample if the queue is full
+        :param iface: the radio; default: the first one
+        :param lazy: send lists of CSIPacket, decoded by the consumer on access
+        :return: True if successful
+        """
+
+        radio = self._get_csi_radio(iface)
+        if radio.collector is None:
+            radio.collector = CSICollector(self, ival, batch_size, batch_ival,
+                                           queue_size, drop_policy, radio.iface,
+                                           self._get_csi_radio_phy(radio), lazy=lazy)
+
+        if radio.collector.is_running():
+            return True
+
+        self.log.info("Start CSI collector on %s" % radio.csi_dev)
+        radio.collector.start()
+        return True
+
+
+    def csi_collector_stop(self, iface=None):
         self.log.info("Stop CSI collector")
-        self._csi_collector.stop()
+        self._get_csi_radio(iface).collector.stop()
         return True
 
 
-    def is_csi_collector_running(self):
-        return self._csi_collector.is_running()
\ No newline at end of file
+    def is_csi_collector_running(self, iface=None):
+        return self._get_csi_radio(iface).collector.is_running()
+
+
+    def get_csi_collector_stats(self, iface=None):
+        """
+        :return: dict of received, dropped, queued and sent samples and sent events
+        """
+        radio = self._get_csi_radio(iface)
+        if radio.collector is None:
+            return None
+        return radio.collector.get_stats()
+
+
+    def airtime_sampler_start(self, ifaces, ival=0.1):
+        """
+        Starts sending the airtime utilization of interfaces as
+        AirtimeUtilizationEvent every ival seconds.
+        :param ifaces: list of interface names
+        :param ival: sampling interval in seconds
+        :return: True if successful
+        """
+        if self._airtime_sampler is not None and self._airtime_sampler.is_running():
+            self._airtime_sampler.stop()
+
+        self.log.info("Start airtime sampler on %s" % ', '.join(ifaces))
+        self._airtime_sampler = AirtimeSampler(self, self._survey, ifaces, ival, self._noise_floor)
+        self._airtime_sampler.start()
+        return True
+
+
+    def airtime_sampler_stop(self):
+        self.log.info("Stop airtime sampler")
+        if self._airtime_sampler is not None:
+            self._airtime_sampler.stop()
+        return True
+
+
+    def noise_monitor_start(self, iface=None, ival=1.0, use_csi=True):
+        """
+        Starts measuring the noise floor in the background from the nl80211
+        survey of iface every ival seconds and/or the noise of received CSI records.
+        :param iface: the name of interface; None to use CSI records only
+        :param ival: survey sampling interval in seconds
+        :param use_csi: use the noise field of received CSI records
+        :return: True if successful
+        """
+        self.noise_monitor_stop()
+
+        if use_csi:
+            self.csi_reader_start(iface, fill_ring=False).add_sink(self._noise_floor.csi_sink, raw=True)
+
+        if iface is not None:
+            self.log.info("Start noise floor sampler on %s" % iface)
+            self._noise_sampler = AirtimeSampler(self, self._survey, [iface], ival,
+                                                 self._noise_floor, send_events=False, utilization=False)
+            self._noise_sampler.start()
+        return True
+
+
+    def noise_monitor_stop(self):
+        for radio in self._csi_radios.values():
+            if radio.reader is not None:
+                radio.reader.remove_sink(self._noise_floor.csi_sink)
+        if self._noise_sampler is not None:
+            self._noise_sampler.stop()
+            self._noise_sampler = None
+        return True
@@ -0,0 +1,4 @@
+from .batch import CSIBatchDecoder, decode_csi_batch
+from .ring import CSIRingBuffer
+from .recorder import CSIRecorder, CSIRecording
+from .packet import CSIPacket, decode_csi_packets
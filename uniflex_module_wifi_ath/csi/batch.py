@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Batch decoding of CSI packets.
+
+Raw CSI buffers are grouped by their matrix shape (nr, nc, num_tones) and
+every group is decoded into one (N, nr, nc, num_tones) array, which can be
+supplied by the caller or is reused between calls.
+"""
+import numpy as np
+from .constants import CSI_REPR_COMPLEX128
+from .decoder import check_csi_buffer, csi_matrix_dtype, csi_matrix_shape, get_csi_matrices
+
+
+def group_csi_shapes(hdrs):
+    """
+    Groups CSI packets by matrix shape.
+    :param hdrs: CSI headers, i.e. array of DTYPE_CSI_HDR
+    :return: dict (nr, nc, num_tones) -> indices of packets with this shape
+    """
+    hdrs = np.asarray(hdrs)
+    dims = np.stack([hdrs['nr'], hdrs['nc'], hdrs['num_tones']], axis=1).astype(np.intp)
+    if len(dims) == 0:
+        return {}
+
+    shapes, inverse = np.unique(dims, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(shapes) + 1))
+
+    groups = {}
+    for ii, shape in enumerate(shapes):
+        groups[tuple(int(x) for x in shape)] = order[bounds[ii]:bounds[ii + 1]]
+    return groups
+
+
+def decode_csi_batch(bufs, hdrs, out=None, csi_repr=CSI_REPR_COMPLEX128):
+    """
+    Decodes a burst of CSI packets grouped by matrix shape.
+    Packets with invalid buffers or dimensions are skipped.
+    :param bufs: sequence of packed CSI buffers (uint8 arrays)
+    :param hdrs: the matching CSI headers, i.e. array of DTYPE_CSI_HDR
+    :param out: optional dict (nr, nc, num_tones) -> output array with at
+                least as many rows as packets of this shape; missing, too
+                small or mistyped arrays are (re-)allocated and stored in the dict
+    :param csi_repr: representation of the CSI matrices, see CSI_REPRS
+    :return: dict (nr, nc, num_tones) -> (packet indices, decoded matrices)
+    """
+    if out is None:
+        out = {}
+    dtype = csi_matrix_dtype(csi_repr)
+
+    result = {}
+    for shape, idx in group_csi_shapes(hdrs).items():
+        nr, nc, num_tones = shape
+        idx = np.array([ii for ii in idx if check_csi_buffer(bufs[ii], nr, nc, num_tones)],
+                       dtype=np.intp)
+        if len(idx) == 0:
+            continue
+
+        buf = out.get(shape)
+        if buf is None or len(buf) < len(idx) or buf.dtype != dtype:
+            buf = np.empty((_capacity(len(idx)),) + csi_matrix_shape(nr, nc, num_tones, csi_repr),
+                           dtype=dtype)
+            out[shape] = buf
+
+        matrices = get_csi_matrices([bufs[ii] for ii in idx], nr, nc, num_tones, out=buf[:len(idx)])
+        result[shape] = (idx, matrices)
+
+    return result
+
+
+def _capacity(num_pkts):
+    # grow output arrays in powers of two to avoid frequent reallocation
+    capacity = 1
+    while capacity < num_pkts:
+        capacity <<= 1
+    return capacity
+
+
+class CSIBatchDecoder(object):
+    """
+    Decodes bursts of CSI packets into output arrays that are kept between
+    calls, i.e. in steady state decoding a burst allocates no output memory.
+    Note: the returned matrices are views, which are overwritten by the next
+    call to decode.
+    """
+
+    def __init__(self, csi_repr=CSI_REPR_COMPLEX128):
+        self.csi_repr = csi_repr
+        self._out = {}
+
+    def decode(self, bufs, hdrs):
+        return decode_csi_batch(bufs, hdrs, out=self._out, csi_repr=self.csi_repr)
+
+    def clear(self):
+        self._out.clear()
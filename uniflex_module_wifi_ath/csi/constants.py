@@ -26,6 +26,18 @@ DTYPE_CSI_HDR = np.dtype([
     ("pld_len", np.uint8),
 ])
 
+# CSI matrix representations:
+# - complex128: complex matrix of shape (nr, nc, num_tones)
+# - complex64: as complex128, half the size
+# - int16: real and imag part as int16 pairs, shape (nr, nc, num_tones, 2)
+CSI_REPR_COMPLEX128 = 'complex128'
+CSI_REPR_COMPLEX64 = 'complex64'
+CSI_REPR_INT16 = 'int16'
+CSI_REPRS = [CSI_REPR_COMPLEX128, CSI_REPR_COMPLEX64, CSI_REPR_INT16]
+
+# max. CSI matrix shape (nr, nc, num_tones), i.e. 3 chains and HT40
+CSI_MAX_SHAPE = (3, 3, 114)
+
 # CSI bandwidth codes
 CSI_BWS = [20, 40]
 
@@ -57,3 +69,21 @@ CSI_PHY_ERRS = ['success',
                 'radar detect',
                 'illegal service',
                 'transmit override receive']
+
+
+# CSI rate codes of the HT MCS 0..23
+CSI_RATE_CODES = range(128, 152, 1)
+
+
+# CSI header metadata mapped to physical units, see mapper.map_csi_hdrs
+DTYPE_CSI_META = np.dtype([
+    ("tstamp", np.uint64),
+    ("channel", np.uint16),
+    ("bw", np.uint16),  # MHz
+    ("rate", np.float32),  # Mbps
+    ("num_streams", np.uint8),
+    ("phyerr", "U25"),
+    ("rssi", np.uint8),
+    ("rssi_chain", np.uint8, (3,)),
+    ("noise", np.int8),  # dBm
+])
@@ -5,7 +5,14 @@ Created on Fri Jan 29 17:19:19 2016
 @author: olbrich
 """
 import warnings
+from functools import lru_cache
 import numpy as np
+from .constants import CSI_REPR_COMPLEX128, CSI_REPR_INT16, CSI_REPRS
+
+
+BITS_PER_SYMBOL = 10
+SYMBOL_MASK = (1 << BITS_PER_SYMBOL) - 1
+SYMBOL_SIGN = 1 << (BITS_PER_SYMBOL - 1)
 
 
 def signbit_convert(data, maxbit):
@@ -14,17 +21,196 @@ def signbit_convert(data, maxbit):
     return data
 
 
-def get_csi_matrix(buf, nr, nc, num_tones):
+def check_csi_buffer(buf, nr, nc, num_tones):
 
-    # check input
+    # check input, returns True if buffer can be decoded
     if (len(buf)*8/(2*10)) < (int(nr)*int(nc)*int(num_tones)):
-        warnings.warn('Invalid CSI buffer length detected.', RuntimeWarning, stacklevel=2)
-        return np.array([], dtype=complex)
+        warnings.warn('Invalid CSI buffer length detected.', RuntimeWarning, stacklevel=3)
+        return False
     elif buf.dtype != np.dtype(np.uint8):
-        warnings.warn('Invalid CSI buffer data type detected.', RuntimeWarning, stacklevel=2)
-        return np.array([], dtype=complex)
+        warnings.warn('Invalid CSI buffer data type detected.', RuntimeWarning, stacklevel=3)
+        return False
     elif (nr == 0) or (nc == 0) or (num_tones == 0):
-        warnings.warn('Invalid CSI matrix dimensions detected.', RuntimeWarning, stacklevel=2)
+        warnings.warn('Invalid CSI matrix dimensions detected.', RuntimeWarning, stacklevel=3)
+        return False
+    return True
+
+
+@lru_cache(maxsize=32)
+def _symbol_index(num_symbols):
+
+    # byte index and bit shift of every 10 bit symbol in the buffer
+    # symbols are stored back-to-back in a little endian bit stream, so a
+    # symbol starting at bit b spans at most the three bytes b>>3 ... (b>>3)+2
+    bit_pos = np.arange(num_symbols, dtype=np.intp) * BITS_PER_SYMBOL
+    byte_idx = bit_pos >> 3
+    shift = (bit_pos & 7).astype(np.uint32)
+    byte_idx.setflags(write=False)
+    shift.setflags(write=False)
+    return byte_idx, shift
+
+
+def unpack_csi_symbols(buf, num_symbols):
+    """
+    Unpacks num_symbols signed 10 bit values from the packed CSI buffer.
+    Bytes beyond the end of the buffer are read as zero, exactly like the
+    reference decoder does for the last (incomplete) 16 bit word.
+    :param buf: packed CSI data, uint8 array of shape (..., csi_len)
+    :param num_symbols: number of 10 bit symbols to unpack
+    :return: int16 array of shape (..., num_symbols)
+    """
+    byte_idx, shift = _symbol_index(num_symbols)
+
+    # zero pad, so that every symbol can be read from three bytes
+    num_bytes = int(byte_idx[-1]) + 3
+    padded = np.zeros(buf.shape[:-1] + (num_bytes,), dtype=np.uint32)
+    used = min(buf.shape[-1], num_bytes)
+    padded[..., :used] = buf[..., :used]
+
+    data = (padded[..., byte_idx]
+            | (padded[..., byte_idx + 1] << 8)
+            | (padded[..., byte_idx + 2] << 16))
+    data = (data >> shift) & SYMBOL_MASK
+
+    # two's complement sign extension
+    data = data.astype(np.int16)
+    data -= (data & SYMBOL_SIGN) << 1
+    return data
+
+
+def csi_matrix_dtype(csi_repr=CSI_REPR_COMPLEX128):
+    if csi_repr not in CSI_REPRS:
+        raise ValueError('Invalid CSI representation: %s' % csi_repr)
+    return np.dtype(csi_repr)
+
+
+def csi_matrix_repr(csi_matrix):
+    # representation of a CSI matrix, i.e. the inverse of csi_matrix_dtype
+    return CSI_REPR_INT16 if csi_matrix.dtype == np.int16 else csi_matrix.dtype.name
+
+
+def csi_matrix_shape(nr, nc, num_tones, csi_repr=CSI_REPR_COMPLEX128):
+    if csi_repr == CSI_REPR_INT16:
+        return (int(nr), int(nc), int(num_tones), 2)
+    return (int(nr), int(nc), int(num_tones))
+
+
+def csi_to_complex(csi, dtype=complex):
+    """
+    Converts CSI matrices of any representation to complex.
+    :param csi: complex matrices or int16 (real, imag) pairs
+    :param dtype: complex64 or complex128
+    """
+    if csi.dtype == np.int16:
+        out = np.empty(csi.shape[:-1], dtype=dtype)
+        out.real = csi[..., 0]
+        out.imag = csi[..., 1]
+        return out
+    return csi.astype(dtype, copy=False)
+
+
+def csi_to_int16(csi):
+    """
+    Converts complex CSI matrices to int16 (real, imag) pairs.
+    """
+    if csi.dtype == np.int16:
+        return csi
+    return np.stack([csi.real, csi.imag], axis=-1).round().astype(np.int16)
+
+
+def pack_csi_matrix(csi_matrix):
+    """
+    Packs a CSI matrix into the 10 bit format of the CSI device, i.e. the
+    inverse of get_csi_matrix. Real and imaginary parts are rounded and
+    clipped to the signed 10 bit range.
+    :param csi_matrix: CSI matrix in any representation, see CSI_REPRS
+    :return: packed CSI data as uint8 array
+    """
+    csi_matrix = csi_to_complex(csi_matrix)
+    lim = 1 << (BITS_PER_SYMBOL - 1)
+    # symbols are ordered as (tone, nc, nr, imag/real)
+    data = np.stack([csi_matrix.imag, csi_matrix.real], axis=-1).transpose(2, 1, 0, 3)
+    data = np.clip(np.rint(data), -lim, lim - 1).astype(np.int16).reshape(-1)
+    data = data.astype(np.uint16) & SYMBOL_MASK
+
+    bits = (data[:, None] >> np.arange(BITS_PER_SYMBOL, dtype=np.uint16)) & 1
+    return np.packbits(bits.astype(np.uint8).reshape(-1), bitorder='little')
+
+
+def _store_csi(data, out):
+
+    # data: symbols of shape (..., nr, nc, num_tones, imag/real)
+    if out.dtype == np.int16:
+        out[..., 0] = data[..., 1]
+        out[..., 1] = data[..., 0]
+    else:
+        out.real = data[..., 1]
+        out.imag = data[..., 0]
+
+
+def get_csi_matrix(buf, nr, nc, num_tones, csi_repr=CSI_REPR_COMPLEX128):
+
+    # check input
+    if not check_csi_buffer(buf, nr, nc, num_tones):
+        return np.array([], dtype=csi_matrix_dtype(csi_repr))
+
+    nr, nc, num_tones = int(nr), int(nc), int(num_tones)
+
+    # symbols are ordered as (tone, nc, nr, imag/real)
+    data = unpack_csi_symbols(buf, 2*nr*nc*num_tones)
+    data = data.reshape(num_tones, nc, nr, 2).transpose(2, 1, 0, 3)
+
+    csi_matrix = np.empty(csi_matrix_shape(nr, nc, num_tones, csi_repr), dtype=csi_matrix_dtype(csi_repr))
+    _store_csi(data, csi_matrix)
+
+    return csi_matrix
+
+
+def get_csi_matrices(bufs, nr, nc, num_tones, out=None, csi_repr=CSI_REPR_COMPLEX128):
+    """
+    Decodes several CSI buffers of the same matrix shape at once.
+    :param bufs: sequence of packed CSI buffers (uint8 arrays)
+    :param nr, nc, num_tones: CSI matrix dimensions of all buffers
+    :param out: optional output array of shape (len(bufs), nr, nc, num_tones)
+                or (len(bufs), nr, nc, num_tones, 2) for int16; its dtype
+                takes precedence over csi_repr
+    :param csi_repr: representation of the CSI matrices, see CSI_REPRS
+    :return: the decoded matrices, i.e. out if given
+    """
+    nr, nc, num_tones = int(nr), int(nc), int(num_tones)
+    num_pkts = len(bufs)
+    num_symbols = 2*nr*nc*num_tones
+
+    if out is None:
+        out = np.empty((num_pkts,) + csi_matrix_shape(nr, nc, num_tones, csi_repr),
+                       dtype=csi_matrix_dtype(csi_repr))
+    else:
+        csi_repr = csi_matrix_repr(out)
+        if out.shape != (num_pkts,) + csi_matrix_shape(nr, nc, num_tones, csi_repr):
+            raise ValueError('Invalid output shape %s for %d CSI matrices of shape %s.'
+                             % (out.shape, num_pkts, (nr, nc, num_tones)))
+
+    if num_pkts == 0:
+        return out
+
+    # gather all buffers into one array, only the used bytes are copied
+    num_bytes = (num_symbols*BITS_PER_SYMBOL + 7) // 8
+    raw = np.zeros((num_pkts, num_bytes), dtype=np.uint8)
+    for ii, buf in enumerate(bufs):
+        used = min(len(buf), num_bytes)
+        raw[ii, :used] = buf[:used]
+
+    data = unpack_csi_symbols(raw, num_symbols)
+    data = data.reshape(num_pkts, num_tones, nc, nr, 2).transpose(0, 3, 2, 1, 4)
+    _store_csi(data, out)
+
+    return out
+
+
+def get_csi_matrix_scalar(buf, nr, nc, num_tones):
+
+    # reference implementation of get_csi_matrix, decodes symbol by symbol
+    if not check_csi_buffer(buf, nr, nc, num_tones):
         return np.array([], dtype=complex)
     else:
         buf = buf.tolist()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+CSI record filters applied to the raw header and payload, i.e. before the
+CSI matrix is decoded. Rejecting a record costs a few byte lookups.
+"""
+import abc
+import numpy as np
+from .constants import DTYPE_CSI_HDR
+
+
+# offset of the transmitter address (addr2) in the 802.11 header of the payload
+WLAN_TA_OFFSET = 10
+
+
+def _hdr_field_offset(field):
+    dtype, offset = DTYPE_CSI_HDR.fields[field][:2]
+    if dtype != np.uint8:
+        raise ValueError('Only uint8 header fields can be filtered: %s' % field)
+    return offset
+
+
+def parse_mac(mac):
+    if isinstance(mac, bytes):
+        return mac
+    return bytes(int(b, 16) for b in mac.split(':'))
+
+
+class CSIFilter(abc.ABC):
+    """
+    Base class of CSI filters. accept() is called with the header as
+    1-element DTYPE_CSI_HDR array, the header as bytes (cheap to index)
+    and the payload (uint8 array); records are dropped if it returns False.
+    """
+
+    def __init__(self, name=None):
+        self.name = name if name is not None else type(self).__name__
+        self.dropped = 0
+
+    @abc.abstractmethod
+    def accept(self, hdr, raw, pld):
+        pass
+
+
+class FieldFilter(CSIFilter):
+    """
+    Accepts records whose uint8 header field has one of the given values.
+    """
+
+    def __init__(self, field, values, name=None):
+        super().__init__(name if name is not None else field)
+        self._offset = _hdr_field_offset(field)
+        lut = bytearray(256)
+        for v in values:
+            lut[v] = 1
+        self._lut = bytes(lut)
+
+    def accept(self, hdr, raw, pld):
+        return self._lut[raw[self._offset]]
+
+
+class PhyErrFilter(FieldFilter):
+    def __init__(self, phyerrs=(0,)):
+        super().__init__('phyerr', phyerrs)
+
+
+class RateFilter(FieldFilter):
+    def __init__(self, rates):
+        super().__init__('rate', rates)
+
+
+class ChanBwFilter(FieldFilter):
+    def __init__(self, chanbws):
+        super().__init__('chanbw', chanbws)
+
+
+class StreamsFilter(CSIFilter):
+    """
+    Accepts records with the given numbers of receive (nr) and/or transmit (nc) chains.
+    """
+
+    def __init__(self, nr=None, nc=None):
+        super().__init__('streams')
+        self._nr = FieldFilter('nr', nr) if nr is not None else None
+        self._nc = FieldFilter('nc', nc) if nc is not None else None
+
+    def accept(self, hdr, raw, pld):
+        return ((self._nr is None or self._nr.accept(hdr, raw, pld)) and
+                (self._nc is None or self._nc.accept(hdr, raw, pld)))
+
+
+class RSSIFilter(CSIFilter):
+    """
+    Accepts records with rssi (or the RSSI of a chain, e.g. rssi_0) >= min_rssi.
+    """
+
+    def __init__(self, min_rssi, field='rssi'):
+        super().__init__(field)
+        self.min_rssi = min_rssi
+        self._offset = _hdr_field_offset(field)
+
+    def accept(self, hdr, raw, pld):
+        return raw[self._offset] >= self.min_rssi
+
+
+class PayloadFilter(CSIFilter):
+    """
+    Accepts records whose payload contains pattern, at offset if given.
+    """
+
+    def __init__(self, pattern, offset=None, name='payload'):
+        super().__init__(name)
+        self.pattern = bytes(pattern)
+        self.offset = offset
+
+    def accept(self, hdr, raw, pld):
+        if self.offset is None:
+            return self.pattern in pld.tobytes()
+        end = self.offset + len(self.pattern)
+        return end <= len(pld) and pld[self.offset:end].tobytes() == self.pattern
+
+
+class MACFilter(CSIFilter):
+    """
+    Accepts records of frames sent by one of the given transmitters, i.e.
+    matches the transmitter address of the 802.11 header in the payload.
+    """
+
+    def __init__(self, macs, offset=WLAN_TA_OFFSET):
+        super().__init__('mac')
+        if isinstance(macs, (str, bytes)):
+            macs = [macs]
+        self.macs = frozenset(parse_mac(mac) for mac in macs)
+        self.offset = offset
+
+    def accept(self, hdr, raw, pld):
+        return pld[self.offset:self.offset + 6].tobytes() in self.macs
+
+
+class CSIFilterChain(object):
+    """
+    Applies filters in order; a record is dropped by the first filter
+    rejecting it, which is counted in its dropped counter.
+    """
+
+    def __init__(self, filters=()):
+        self.filters = tuple(filters)
+        self.passed = 0
+
+    def __call__(self, hdr, pld):
+        if not self.filters:
+            self.passed += 1
+            return True
+
+        raw = hdr.tobytes()
+        for f in self.filters:
+            if not f.accept(hdr, raw, pld):
+                f.dropped += 1
+                return False
+        self.passed += 1
+        return True
+
+    def get_stats(self):
+        """
+        :return: dict of passed records and dropped records per filter name
+        """
+        stats = {'passed': self.passed}
+        for f in self.filters:
+            stats[f.name] = stats.get(f.name, 0) + f.dropped
+        return stats
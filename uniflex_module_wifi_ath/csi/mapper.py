@@ -5,27 +5,42 @@ Created on Sun Mar 20 20:20:34 2016
 @author: olbrich
 """
 import warnings
-from .constants import CSI_BWS, CSI_HT20_RATES, CSI_HT40_RATES, CSI_PHY_ERRS
+import numpy as np
+from .constants import CSI_BWS, CSI_HT20_RATES, CSI_HT40_RATES, CSI_NUM_STREAMS, CSI_PHY_ERRS, \
+    CSI_RATE_CODES, DTYPE_CSI_META
 
 
-def map_csi_pkt_bw(chanbw):
-    chanbw_codes = [0, 1]
+# lookup tables indexed by the uint8 header codes; invalid codes map to
+# 0 (bw, streams), NaN (rate) and '' (phyerr)
+CSI_BW_LUT = np.zeros(256, dtype=np.uint16)
+CSI_BW_LUT[:len(CSI_BWS)] = CSI_BWS
+
+CSI_RATE_LUT = np.full((256, 256), np.nan, dtype=np.float32)  # [chanbw, rate]
+CSI_RATE_LUT[0, CSI_RATE_CODES.start:CSI_RATE_CODES.stop] = CSI_HT20_RATES
+CSI_RATE_LUT[1, CSI_RATE_CODES.start:CSI_RATE_CODES.stop] = CSI_HT40_RATES
+
+CSI_NUM_STREAMS_LUT = np.zeros(256, dtype=np.uint8)
+CSI_NUM_STREAMS_LUT[CSI_RATE_CODES.start:CSI_RATE_CODES.stop] = CSI_NUM_STREAMS
+
+CSI_PHY_ERR_LUT = np.full(256, '', dtype=DTYPE_CSI_META['phyerr'])
+CSI_PHY_ERR_LUT[:len(CSI_PHY_ERRS)] = CSI_PHY_ERRS
 
-    if chanbw in chanbw_codes:
-        return CSI_BWS[chanbw]  # MHz
+for _lut in (CSI_BW_LUT, CSI_RATE_LUT, CSI_NUM_STREAMS_LUT, CSI_PHY_ERR_LUT):
+    _lut.flags.writeable = False
+
+
+def map_csi_pkt_bw(chanbw):
+    if 0 <= chanbw < 256 and CSI_BW_LUT[chanbw]:
+        return int(CSI_BW_LUT[chanbw])  # MHz
     else:
         warnings.warn('Invalid CSI chanBW code.', RuntimeWarning, stacklevel=2)
         return None
 
 
 def map_csi_pkt_rate(rate, chanbw):
-    rate_codes = range(128, 152, 1)
-    chanbw_codes = [0, 1]
-    rates = [CSI_HT20_RATES, CSI_HT40_RATES]
-
-    if rate in rate_codes:
-        if chanbw in chanbw_codes:
-            return rates[chanbw][rate_codes.index(rate)]  # Mbps
+    if rate in CSI_RATE_CODES:
+        if chanbw in [0, 1]:
+            return CSI_RATE_LUT[chanbw, rate].item()  # Mbps
         else:
             warnings.warn('Invalid CSI chanBW code.', RuntimeWarning, stacklevel=2)
             return None
@@ -35,10 +50,39 @@ def map_csi_pkt_rate(rate, chanbw):
 
 
 def map_csi_pkt_phyerr(phyerr):
-    codes = range(0, 8, 1)
-
-    if phyerr in codes:
-        return CSI_PHY_ERRS[codes.index(phyerr)]
+    if 0 <= phyerr < 256 and CSI_PHY_ERR_LUT[phyerr]:
+        return str(CSI_PHY_ERR_LUT[phyerr])
     else:
         warnings.warn('Invalid CSI phyerr code.', RuntimeWarning, stacklevel=2)
         return None
+
+
+def map_csi_hdrs(hdrs, out=None):
+    """
+    Maps CSI headers to physical units at once, see DTYPE_CSI_META.
+    Invalid codes are not warned about but flagged in the returned mask.
+    :param hdrs: structured array of DTYPE_CSI_HDR
+    :param out: optional array of DTYPE_CSI_META and the same length to fill
+    :return: (meta, valid): DTYPE_CSI_META array and bool array, False for
+             headers with invalid chanbw, rate or phyerr code
+    """
+    if out is None:
+        out = np.empty(hdrs.shape, dtype=DTYPE_CSI_META)
+
+    chanbw = hdrs['chanbw']
+    rate = hdrs['rate']
+    out['tstamp'] = hdrs['tstamp']
+    out['channel'] = hdrs['channel']
+    out['bw'] = CSI_BW_LUT[chanbw]
+    out['rate'] = CSI_RATE_LUT[chanbw, rate]
+    out['num_streams'] = CSI_NUM_STREAMS_LUT[rate]
+    out['phyerr'] = CSI_PHY_ERR_LUT[hdrs['phyerr']]
+    out['rssi'] = hdrs['rssi']
+    out['rssi_chain'][..., 0] = hdrs['rssi_0']
+    out['rssi_chain'][..., 1] = hdrs['rssi_1']
+    out['rssi_chain'][..., 2] = hdrs['rssi_2']
+    # noise is a signed dBm value in an uint8 field
+    out['noise'] = hdrs['noise'].view(np.int8)
+
+    valid = (out['bw'] != 0) & ~np.isnan(out['rate']) & (out['phyerr'] != '')
+    return out, valid
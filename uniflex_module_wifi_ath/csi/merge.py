@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Merging of the CSI samples of several radios into one stream.
+"""
+import numpy as np
+from .constants import DTYPE_CSI_HDR
+
+
+def merge_csi_samples(streams, num_samples=None):
+    """
+    Merges the samples of several CSI streams, e.g. radios, in receive time
+    order. The hardware timestamps (tstamp) of different radios are not
+    synchronized, so the host receive times are used.
+    :param streams: dict name -> (hdrs, matrices, rx_times), each oldest first
+    :param num_samples: keep only the latest num_samples samples
+    :return: tuple (names, hdrs, matrices, rx_times), oldest first; names holds
+             the stream name of every sample, matrices is one array if all
+             streams have the same matrix shape, otherwise a list of matrices
+    """
+    streams = [(name, s) for name, s in streams.items() if len(s[0])]
+    if not streams:
+        return np.empty(0, dtype=object), np.empty(0, dtype=DTYPE_CSI_HDR), [], np.empty(0)
+
+    names = np.empty(len(streams), dtype=object)
+    names[:] = [name for name, s in streams]
+    src = np.repeat(np.arange(len(streams)), [len(s[0]) for name, s in streams])
+    rx_times = np.concatenate([s[2] for name, s in streams])
+
+    order = np.argsort(rx_times, kind='stable')
+    if num_samples is not None:
+        order = order[max(0, len(order) - num_samples):]
+
+    hdrs = np.concatenate([s[0] for name, s in streams])[order]
+    mats = [s[1] for name, s in streams]
+    if len(set((m.shape[1:], m.dtype) for m in mats)) == 1:
+        matrices = np.concatenate(mats)[order]
+    else:
+        offsets = np.cumsum([0] + [len(m) for m in mats])
+        matrices = [mats[ss][ii - offsets[ss]].copy() for ii, ss in zip(order, src[order])]
+
+    return names[src[order]], hdrs, matrices, rx_times[order]
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Lazily decoded CSI packets.
+
+A CSIPacket keeps the header, the packed 10 bit CSI data and the payload,
+i.e. about 1/6 of the size of a complex128 CSI matrix. The matrix is only
+decoded when accessed and then cached; the cache is not pickled.
+"""
+import numpy as np
+from .constants import DTYPE_CSI_HDR, CSI_REPR_COMPLEX128
+from .decoder import get_csi_matrix, pack_csi_matrix, csi_matrix_repr
+from .batch import decode_csi_batch
+from .receiver import make_csi_pkt
+
+
+class CSIPacket(object):
+    """
+    CSI packet decoding its CSI matrix on first access.
+    :param header: CSI header, DTYPE_CSI_HDR array of length one
+    :param csi: packed CSI data (uint8 array or bytes)
+    :param payload: payload (uint8 array or bytes)
+    :param csi_repr: representation of the decoded CSI matrix, see CSI_REPRS
+    """
+
+    __slots__ = ('header', 'csi', 'payload', 'csi_repr', '_csi_matrix')
+
+    def __init__(self, header, csi, payload=b'', csi_repr=CSI_REPR_COMPLEX128):
+        self.header = np.array(header, dtype=DTYPE_CSI_HDR).reshape(1)
+        self.csi = bytes(csi)
+        self.payload = bytes(payload)
+        self.csi_repr = csi_repr
+        self._csi_matrix = None
+
+    @property
+    def tstamp(self):
+        return int(self.header[0]['tstamp'])
+
+    @property
+    def channel(self):
+        return int(self.header[0]['channel'])
+
+    @property
+    def rate(self):
+        return int(self.header[0]['rate'])
+
+    @property
+    def rssi(self):
+        return int(self.header[0]['rssi'])
+
+    @property
+    def noise(self):
+        # signed dBm value in an uint8 field
+        return int(self.header['noise'].view(np.int8)[0])
+
+    @property
+    def shape(self):
+        hdr = self.header[0]
+        return int(hdr['nr']), int(hdr['nc']), int(hdr['num_tones'])
+
+    @property
+    def is_decoded(self):
+        return self._csi_matrix is not None
+
+    @property
+    def csi_matrix(self):
+        """
+        The CSI matrix, decoded on first access.
+        """
+        if self._csi_matrix is None:
+            self._csi_matrix = get_csi_matrix(np.frombuffer(self.csi, dtype=np.uint8), *self.shape,
+                                              csi_repr=self.csi_repr)
+        return self._csi_matrix
+
+    def to_structured(self):
+        """
+        :return: the packet as structured array, see receiver.make_csi_pkt
+        """
+        return make_csi_pkt(self.header, self.csi_matrix, np.frombuffer(self.payload, dtype=np.uint8))
+
+    @classmethod
+    def from_structured(cls, csi_pkt):
+        """
+        Creates a packet from its structured array form; the CSI matrix is
+        packed again and kept as decoded matrix.
+        :param csi_pkt: structured CSI packet, see receiver.make_csi_pkt
+        """
+        csi_matrix = csi_pkt['csi_matrix'][0]
+        pkt = cls(csi_pkt['header'], pack_csi_matrix(csi_matrix), csi_pkt['payload'][0], csi_matrix_repr(csi_matrix))
+        pkt._csi_matrix = csi_matrix.copy()
+        return pkt
+
+    def __getstate__(self):
+        return self.header.tobytes(), self.csi, self.payload, self.csi_repr
+
+    def __setstate__(self, state):
+        header, self.csi, self.payload, self.csi_repr = state
+        self.header = np.frombuffer(header, dtype=DTYPE_CSI_HDR).copy()
+        self._csi_matrix = None
+
+    def __repr__(self):
+        return 'CSIPacket(tstamp=%d, shape=%s, decoded=%s)' % (self.tstamp, self.shape, self.is_decoded)
+
+
+def decode_csi_packets(packets):
+    """
+    Decodes the CSI matrices of packets not decoded yet at once, grouped by
+    matrix shape and representation.
+    :param packets: sequence of CSIPacket
+    :return: the packets
+    """
+    todo = {}
+    for pkt in packets:
+        if not pkt.is_decoded:
+            todo.setdefault(pkt.csi_repr, []).append(pkt)
+
+    for csi_repr, pkts in todo.items():
+        hdrs = np.concatenate([pkt.header for pkt in pkts])
+        bufs = [np.frombuffer(pkt.csi, dtype=np.uint8) for pkt in pkts]
+        for shape, (idx, matrices) in decode_csi_batch(bufs, hdrs, csi_repr=csi_repr).items():
+            for ii, csi_matrix in zip(idx, matrices):
+                pkts[ii]._csi_matrix = csi_matrix
+    return packets
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Worker process pool decoding CSI records.
+
+Decoding the packed CSI dominates the cost of reading CSI. Reader threads
+of several radios share the GIL, so with many radios or high packet rates
+the records of a wakeup can be decoded by worker processes instead. Records
+are split into chunks, each decoded by decode_csi_batch in a worker.
+
+decode_into() has the workers decode directly into reserved slots of a
+CSI ring in shared memory: only the packed CSI (about 1/6 of a complex128
+matrix) is sent to the workers and nothing but completion is sent back.
+decode() returns the matrices instead, i.e. pickles them back.
+"""
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from .constants import CSI_REPR_COMPLEX128
+from .batch import decode_csi_batch
+
+# shared memory rings mapped by this (worker) process: name -> (shm, matrices)
+_mapped_rings = {}
+
+
+def decode_into_slots(matrices, slots, hdrs, data, lengths, csi_repr=CSI_REPR_COMPLEX128):
+    """
+    Decodes CSI records into slots of the matrices of a CSI ring.
+    :param matrices: the matrices of the ring
+    :param slots: slot of every record
+    :param hdrs: CSI headers, i.e. array of DTYPE_CSI_HDR
+    :param data: the packed CSI buffers of all records concatenated (bytes)
+    :param lengths: the length of every packed CSI buffer
+    :param csi_repr: representation of the matrices, see CSI_REPRS
+    """
+    bufs = np.split(np.frombuffer(data, dtype=np.uint8), np.cumsum(lengths)[:-1])
+    for (nr, nc, num_tones), (idx, decoded) in decode_csi_batch(bufs, hdrs, csi_repr=csi_repr).items():
+        matrices[slots[idx], :nr, :nc, :num_tones] = decoded
+
+
+def _decode_into_ring(shm_name, shape, dtype, slots, hdrs, data, lengths, csi_repr):
+    mapped = _mapped_rings.get(shm_name)
+    if mapped is None:
+        from .shm import _attach
+        shm = _attach(shm_name)
+        mapped = _mapped_rings[shm_name] = (shm, np.ndarray(shape, dtype, shm.buf))
+    decode_into_slots(mapped[1], slots, hdrs, data, lengths, csi_repr)
+
+
+class CSIDecodePool(object):
+    """
+    Pool of num_workers processes decoding chunks of up to chunk_size CSI
+    records. Workers are started by a fork server, i.e. they do not inherit
+    the threads and open devices of the module.
+    """
+
+    def __init__(self, num_workers, csi_repr=CSI_REPR_COMPLEX128, chunk_size=64):
+        self.num_workers = num_workers
+        self.csi_repr = csi_repr
+        self.chunk_size = chunk_size
+        self._executor = ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context('forkserver'))
+
+    def decode(self, hdrs, bufs):
+        """
+        Decodes CSI records in the worker processes.
+        :param hdrs: CSI headers, i.e. array of DTYPE_CSI_HDR
+        :param bufs: the matching packed CSI buffers (uint8 arrays)
+        :return: list of decoded matrices in record order, None for invalid records
+        :raise BrokenProcessPool: if a worker died
+        """
+        futures = []
+        for start in range(0, len(bufs), self.chunk_size):
+            stop = start + self.chunk_size
+            futures.append((start, self._executor.submit(decode_csi_batch, bufs[start:stop], hdrs[start:stop],
+                                                         csi_repr=self.csi_repr)))
+
+        matrices = [None] * len(bufs)
+        for start, future in futures:
+            for idx, decoded in future.result().values():
+                for ii, csi_matrix in zip(idx, decoded):
+                    matrices[start + ii] = csi_matrix
+        return matrices
+
+    def decode_into(self, ring, slots, hdrs, bufs):
+        """
+        Decodes CSI records in the worker processes into reserved slots of a
+        shared CSI ring, see CSIRingBuffer.reserve; returns when all are done.
+        :param ring: CSIRingBuffer created with shared set
+        :param slots: the reserved slot of every record
+        :param hdrs: CSI headers, i.e. array of DTYPE_CSI_HDR
+        :param bufs: the matching packed CSI buffers (bytes), all valid
+        :raise BrokenProcessPool: if a worker died
+        """
+        if ring.shm_name is None:
+            raise ValueError('CSI ring is not in shared memory')
+
+        futures = []
+        for start in range(0, len(bufs), self.chunk_size):
+            stop = start + self.chunk_size
+            chunk = bufs[start:stop]
+            futures.append(self._executor.submit(_decode_into_ring, ring.shm_name, ring.matrices.shape,
+                                                 ring.dtype.str, slots[start:stop], hdrs[start:stop],
+                                                 b''.join(chunk), [len(buf) for buf in chunk], ring.csi_repr))
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self._executor.shutdown()
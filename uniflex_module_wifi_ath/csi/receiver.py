@@ -5,12 +5,193 @@ Created on Fri Jan 29 17:19:19 2016
 @author: olbrich
 """
 import os
+import stat
+from functools import lru_cache
 import numpy as np
-from .decoder import get_csi_matrix
-from .constants import DTYPE_CSI_HDR
+from .decoder import get_csi_matrix, csi_matrix_dtype, csi_matrix_shape, csi_matrix_repr
+from .constants import DTYPE_CSI_HDR, CSI_REPR_COMPLEX128
 
 
-def scan(csi_dev='/dev/CSI_dev', debug=False):
+# layout of a CSI record as returned by the CSI device:
+# header (DTYPE_CSI_HDR), one spare byte, CSI data (csi_len), payload (pld_len)
+CSI_HDR_LEN = DTYPE_CSI_HDR.itemsize
+CSI_DATA_OFFSET = CSI_HDR_LEN + 1
+
+# size of the CSI device buffer, see: csi_fun.c
+CSI_BUF_SIZE = 4096
+
+
+@lru_cache(maxsize=64)
+def get_csi_pkt_dtype(nr, nc, num_tones, pld_len, csi_repr=CSI_REPR_COMPLEX128):
+
+    # structured CSI packet type, i.e. header, CSI matrix and payload
+    return np.dtype([
+        ("header", DTYPE_CSI_HDR),
+        ("csi_matrix", csi_matrix_dtype(csi_repr), csi_matrix_shape(nr, nc, num_tones, csi_repr)),
+        ("payload", np.uint8, (pld_len,)),
+    ])
+
+
+def make_csi_pkt(hdr, csi_matrix, pld):
+
+    # combine data into common structure, the CSI representation is kept
+    nr, nc, num_tones = csi_matrix.shape[:3]
+    csi_repr = csi_matrix_repr(csi_matrix)
+    dtype_csi_pkt = get_csi_pkt_dtype(nr, nc, num_tones, len(pld), csi_repr)
+
+    csi_pkt = np.empty(1, dtype=dtype_csi_pkt)
+    csi_pkt["header"] = hdr
+    csi_pkt["csi_matrix"] = csi_matrix
+    csi_pkt["payload"] = pld
+    return csi_pkt
+
+
+class CSIReader(object):
+    """
+    Keeps the CSI device open and reads CSI records into a reusable buffer.
+
+    Every record is returned as tuple (hdr, csi, pld) of NumPy views into
+    the read buffer: hdr is a DTYPE_CSI_HDR array of length one, csi the
+    packed CSI data and pld the payload (both uint8). The views are only
+    valid until the next record is read; copy them to keep them longer.
+
+    Framing:
+    - 'record': every read returns exactly one record (CSI device)
+    - 'stream': records are stored back-to-back (regular files, FIFOs)
+    - None: 'record' for character devices, 'stream' otherwise
+    """
+
+    def __init__(self, csi_dev='/dev/CSI_dev', buf_size=CSI_BUF_SIZE, framing=None):
+        self.csi_dev = csi_dev
+        self.framing = framing
+        self._fd = None
+        self._buf = bytearray(buf_size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self.truncated = 0
+
+    def open(self):
+        if self._fd is not None:
+            return self
+
+        self._fd = os.open(self.csi_dev, os.O_RDONLY | os.O_NONBLOCK)
+        if self.framing is None:
+            mode = os.fstat(self._fd).st_mode
+            self.framing = 'record' if stat.S_ISCHR(mode) else 'stream'
+        self._start = self._end = 0
+        return self
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def fileno(self):
+        return self._fd
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, max_records=None):
+        """
+        Yields all CSI records currently available.
+        :param max_records: stop after this number of records
+        """
+        count = 0
+        while max_records is None or count < max_records:
+            rec = self.read()
+            if rec is None:
+                return
+            count += 1
+            yield rec
+
+    def read(self):
+        """
+        Reads the next CSI record.
+        :return: tuple (hdr, csi, pld) or None if no record is available
+        """
+        if self._fd is None:
+            self.open()
+
+        if self.framing == 'record':
+            return self._read_record()
+        return self._read_stream()
+
+    def _fill(self, offset):
+        try:
+            return os.readv(self._fd, [self._view[offset:]])
+        except BlockingIOError:
+            return 0
+
+    def _parse(self, offset, size):
+        # returns record at offset or None if incomplete; all zero-copy views
+        if size < CSI_DATA_OFFSET:
+            return None
+
+        hdr = np.frombuffer(self._buf, dtype=DTYPE_CSI_HDR, count=1, offset=offset)
+        csi_len = int(hdr[0]['csi_len'])
+        pld_len = int(hdr[0]['pld_len'])
+        if size < CSI_DATA_OFFSET + csi_len + pld_len:
+            return None
+
+        csi = np.frombuffer(self._buf, dtype=np.uint8, count=csi_len,
+                            offset=offset + CSI_DATA_OFFSET)
+        pld = np.frombuffer(self._buf, dtype=np.uint8, count=pld_len,
+                            offset=offset + CSI_DATA_OFFSET + csi_len)
+        return hdr, csi, pld
+
+    def _read_record(self):
+        while True:
+            size = self._fill(0)
+            if size == 0:
+                return None
+            rec = self._parse(0, size)
+            if rec is not None:
+                return rec
+            # drop truncated record
+            self.truncated += 1
+
+    def _read_stream(self):
+        while True:
+            rec = self._parse(self._start, self._end - self._start)
+            if rec is not None:
+                hdr, csi, pld = rec
+                self._start += CSI_DATA_OFFSET + len(csi) + len(pld)
+                return rec
+
+            # incomplete record: move it to the front and read more data
+            pending = self._end - self._start
+            if self._start > 0:
+                self._buf[:pending] = self._buf[self._start:self._end]
+                self._start, self._end = 0, pending
+
+            if pending >= CSI_DATA_OFFSET:
+                hdr = np.frombuffer(self._buf, dtype=DTYPE_CSI_HDR, count=1)
+                needed = CSI_DATA_OFFSET + int(hdr[0]['csi_len']) + int(hdr[0]['pld_len'])
+                if needed > len(self._buf):
+                    self._grow(needed)
+
+            size = self._fill(self._end)
+            if size == 0:
+                return None
+            self._end += size
+
+    def _grow(self, size):
+        # views handed out before keep the old buffer alive
+        buf = bytearray(max(size, 2 * len(self._buf)))
+        buf[:self._end] = self._buf[:self._end]
+        self._buf = buf
+        self._view = memoryview(buf)
+
+
+def scan(csi_dev='/dev/CSI_dev', debug=False, csi_repr=CSI_REPR_COMPLEX128, csi_filter=None, lazy=False):
 
     # init return
     csi_pkt = None
@@ -19,64 +200,42 @@ def scan(csi_dev='/dev/CSI_dev', debug=False):
     if debug:
         print("Start reading CSI data from CSI device...")
 
-    # open CSI device and read CSI header
-    # here we need buffered I/O with Python 3, otherwise get always segfaults
-    fd = open(csi_dev, 'rb')
-    fd.seek(0, os.SEEK_SET)
-    buf = fd.read(24)
-
-    # read and decode CSI device buffer if we have data in it
-    if buf:
-
-        # decode packet header
-        hdr = np.frombuffer(buf, dtype=DTYPE_CSI_HDR)
-
-        if debug:
-            print("Receiving CSI header: %s" % hdr)
-
-        # open CSI device and read data from device directly
-        # here we need direct I/O with Python 3, otherwise NumPy complaints
-        fdd = open(csi_dev, 'rb', buffering=0)
-        csi_len = hdr[0][1]
-        fdd.seek(25, os.SEEK_SET)
-        csi = np.fromfile(fdd, dtype=np.uint8, count=csi_len)
-
-        # calculate CSI matrix
-        nr = hdr[0][8]
-        nc = hdr[0][9]
-        num_tones = hdr[0][7]
-        csi_matrix = get_csi_matrix(csi, nr, nc, num_tones)
-
-        if debug:
-            print("Receiving CSI matrix:")
-            np.set_printoptions(formatter={'float': '{: 0.1f}'.format}, linewidth=120)
-            print(csi_matrix)
-
-        # read payload data
-        pld_len = hdr[0][14]
-        fdd.seek(25 + csi_len, os.SEEK_SET)
-        pld = np.fromfile(fdd, dtype=np.uint8, count=pld_len)
-
-        # combine data into common structure
-        dtype_csi_pkt = np.dtype([
-            ("header", DTYPE_CSI_HDR),
-            ("csi_matrix", np.complex, (nr, nc, num_tones)),
-            ("payload", np.uint8, (pld_len,)),
-        ])
-
-        csi_pkt = np.array([
-            (hdr, csi_matrix, pld),
-        ], dtype=dtype_csi_pkt)
-
-        # close CSI device
-        fdd.close()
-
-    else:
-        if debug:
-            print("CSI device buffer empty...")
-
-    # close CSI device
-    fd.close()
+    # open CSI device and read the next CSI record (accepted by csi_filter)
+    with CSIReader(csi_dev) as reader:
+        rec = reader.read()
+        while rec is not None and csi_filter is not None and not csi_filter(rec[0], rec[2]):
+            rec = reader.read()
+
+        # decode CSI record if we have data
+        if rec is not None:
+            hdr, csi, pld = rec
+
+            if debug:
+                print("Receiving CSI header: %s" % hdr)
+
+            if lazy:
+                # packet decoding the CSI matrix on access; imported here
+                # as the packet module imports this one
+                from .packet import CSIPacket
+                return CSIPacket(hdr, csi, pld, csi_repr)
+
+            # calculate CSI matrix
+            nr = hdr[0]['nr']
+            nc = hdr[0]['nc']
+            num_tones = hdr[0]['num_tones']
+            csi_matrix = get_csi_matrix(csi, nr, nc, num_tones, csi_repr)
+
+            if debug:
+                print("Receiving CSI matrix:")
+                np.set_printoptions(formatter={'float': '{: 0.1f}'.format}, linewidth=120)
+                print(csi_matrix)
+
+            if csi_matrix.size:
+                csi_pkt = make_csi_pkt(hdr, csi_matrix, pld)
+
+        else:
+            if debug:
+                print("CSI device buffer empty...")
 
     # finish
     if debug:
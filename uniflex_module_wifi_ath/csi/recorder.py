@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only recording of raw CSI records.
+
+A recording consists of two files:
+- <path>: records back-to-back, each header (DTYPE_CSI_HDR), packed CSI
+  data (csi_len bytes) and payload (pld_len bytes)
+- <path>.idx: one DTYPE_CSI_IDX entry (offset, tstamp) per record
+
+Both files are memory-mapped for reading, so opening a recording costs
+the same for any size and CSI matrices are only decoded on access.
+"""
+import os
+import threading
+import numpy as np
+from .constants import DTYPE_CSI_HDR, CSI_REPR_COMPLEX128
+from .batch import decode_csi_batch
+from .decoder import get_csi_matrix
+
+
+# index entry of a CSI recording
+DTYPE_CSI_IDX = np.dtype([
+    ("offset", np.uint64),
+    ("tstamp", np.uint64),
+])
+
+CSI_IDX_SUFFIX = '.idx'
+
+
+class CSIRecorder(object):
+    """
+    Appends raw CSI records to a recording; an existing recording is continued.
+    A partial record or index entry at its end, e.g. after a crash, is
+    truncated first, so that new records are appended at a valid offset.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        _truncate_recording(path)
+        self._data = open(path, 'ab')
+        self._idx = open(path + CSI_IDX_SUFFIX, 'ab')
+        self._offset = self._data.tell()
+        self._entry = np.zeros(1, dtype=DTYPE_CSI_IDX)
+        self.num_records = self._idx.tell() // DTYPE_CSI_IDX.itemsize
+        # the recorder may be closed while the CSI reader thread writes
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, hdr, csi, pld):
+        """
+        Appends a CSI record.
+        :param hdr: CSI header (DTYPE_CSI_HDR array of length one)
+        :param csi: packed CSI data (uint8)
+        :param pld: payload (uint8)
+        """
+        with self._lock:
+            if self._data.closed:
+                return
+
+            self._data.write(hdr)
+            self._data.write(csi)
+            self._data.write(pld)
+
+            self._entry[0] = (self._offset, hdr[0]['tstamp'])
+            self._idx.write(self._entry)
+
+            self._offset += DTYPE_CSI_HDR.itemsize + len(csi) + len(pld)
+            self.num_records += 1
+
+    def flush(self):
+        # data first, so that the index never points beyond the data file
+        self._data.flush()
+        self._idx.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._data.closed:
+                self.flush()
+                self._data.close()
+                self._idx.close()
+
+
+class CSIRecording(object):
+    """
+    Read-only, memory-mapped access to a CSI recording.
+
+    Records are addressed by record number; rec[i] returns (hdr, csi, pld)
+    as views into the mapped file. Timestamps have to be non-decreasing for
+    the time based lookups, which holds for recordings of a single device.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        data_size = os.path.getsize(path)
+        idx_size = os.path.getsize(path + CSI_IDX_SUFFIX)
+        num_idx = idx_size // DTYPE_CSI_IDX.itemsize
+
+        self.data = _memmap(path, np.uint8, data_size)
+        index = _memmap(path + CSI_IDX_SUFFIX, DTYPE_CSI_IDX, num_idx)
+
+        # ignore index entries of records not (completely) written
+        num_records = int(np.searchsorted(index['offset'], data_size - DTYPE_CSI_HDR.itemsize, side='right'))
+        if num_records and not self._complete(index['offset'][num_records - 1], data_size):
+            num_records -= 1
+        self.index = index[:num_records]
+
+    def _complete(self, offset, data_size):
+        hdr = self.header(offset)
+        return offset + DTYPE_CSI_HDR.itemsize + int(hdr[0]['csi_len']) + int(hdr[0]['pld_len']) <= data_size
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, ii):
+        return self.record(self.index['offset'][ii])
+
+    def __iter__(self):
+        for offset in self.index['offset']:
+            yield self.record(offset)
+
+    @property
+    def tstamps(self):
+        return self.index['tstamp']
+
+    def header(self, offset):
+        offset = int(offset)
+        return self.data[offset:offset + DTYPE_CSI_HDR.itemsize].view(DTYPE_CSI_HDR)
+
+    def record(self, offset):
+        offset = int(offset)
+        hdr = self.header(offset)
+        csi_start = offset + DTYPE_CSI_HDR.itemsize
+        pld_start = csi_start + int(hdr[0]['csi_len'])
+        csi = self.data[csi_start:pld_start]
+        pld = self.data[pld_start:pld_start + int(hdr[0]['pld_len'])]
+        return hdr, csi, pld
+
+    def headers(self, indices=slice(None)):
+        """
+        :param indices: record numbers (slice or array)
+        :return: array of DTYPE_CSI_HDR of the selected records
+        """
+        offsets = self.index['offset'][indices].astype(np.intp)
+        hdr_bytes = self.data[offsets[:, None] + np.arange(DTYPE_CSI_HDR.itemsize)]
+        return hdr_bytes.view(DTYPE_CSI_HDR).reshape(-1)
+
+    def time_range(self, start=None, stop=None):
+        """
+        :param start: first timestamp (inclusive), None for the first record
+        :param stop: last timestamp (exclusive), None for the last record
+        :return: slice of the record numbers within the time range
+        """
+        tstamps = self.index['tstamp']
+        first = 0 if start is None else int(np.searchsorted(tstamps, start, side='left'))
+        last = len(tstamps) if stop is None else int(np.searchsorted(tstamps, stop, side='left'))
+        return slice(first, max(first, last))
+
+    def csi_matrix(self, ii, csi_repr=CSI_REPR_COMPLEX128):
+        hdr, csi, pld = self[ii]
+        return get_csi_matrix(csi, hdr[0]['nr'], hdr[0]['nc'], hdr[0]['num_tones'], csi_repr)
+
+    def csi_matrices(self, indices=slice(None), out=None, csi_repr=CSI_REPR_COMPLEX128):
+        """
+        Decodes the CSI of the selected records grouped by matrix shape.
+        :return: dict (nr, nc, num_tones) -> (record numbers, decoded matrices)
+        """
+        records = np.arange(len(self))[indices]
+        hdrs = self.headers(records)
+        bufs = [self.record(offset)[1] for offset in self.index['offset'][records]]
+        result = decode_csi_batch(bufs, hdrs, out, csi_repr)
+        return dict((shape, (records[idx], matrices)) for shape, (idx, matrices) in result.items())
+
+    def close(self):
+        self.data = None
+        self.index = None
+
+
+def _truncate_recording(path):
+    # keep the complete index entries up to the last complete record
+    idx_path = path + CSI_IDX_SUFFIX
+    for p in (path, idx_path):
+        open(p, 'ab').close()
+
+    with open(path, 'r+b') as data, open(idx_path, 'r+b') as idx:
+        data_size = os.fstat(data.fileno()).st_size
+        num_records = os.fstat(idx.fileno()).st_size // DTYPE_CSI_IDX.itemsize
+        end = 0
+        while num_records:
+            idx.seek((num_records - 1) * DTYPE_CSI_IDX.itemsize)
+            offset = int(np.frombuffer(idx.read(DTYPE_CSI_IDX.itemsize), dtype=DTYPE_CSI_IDX)[0]['offset'])
+            end = _record_end(data, offset, data_size)
+            if end is not None:
+                break
+            num_records -= 1
+
+        idx.truncate(num_records * DTYPE_CSI_IDX.itemsize)
+        data.truncate(end or 0)
+
+
+def _record_end(data, offset, data_size):
+    # end of the record at offset or None if not completely written
+    if offset + DTYPE_CSI_HDR.itemsize > data_size:
+        return None
+    data.seek(offset)
+    hdr = np.frombuffer(data.read(DTYPE_CSI_HDR.itemsize), dtype=DTYPE_CSI_HDR)
+    end = offset + DTYPE_CSI_HDR.itemsize + int(hdr[0]['csi_len']) + int(hdr[0]['pld_len'])
+    return end if end <= data_size else None
+
+
+def _memmap(path, dtype, count):
+    # np.memmap can not map empty files
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed-capacity ring buffer of decoded CSI samples.
+"""
+import time
+import threading
+import numpy as np
+from .constants import DTYPE_CSI_HDR, CSI_REPR_COMPLEX128, CSI_MAX_SHAPE
+from .decoder import check_csi_buffer, csi_matrix_dtype, csi_matrix_shape, get_csi_matrices
+
+
+class CSIRingBuffer(object):
+    """
+    Preallocated ring buffer holding the latest CSI headers and matrices.
+
+    Every slot is allocated for max_shape (nr, nc, num_tones), so samples
+    of different shape (e.g. HT20 and HT40 or varying nc) share the ring.
+    Smaller matrices occupy the leading part of their slot; samples
+    exceeding max_shape are dropped (counted in dropped).
+
+    There is a single writer (the CSI reader), which decodes every packet
+    directly into its slot. Readers get the latest samples of one shape as
+    contiguous copies. Readers do not block the writer: the write index is
+    checked before and after copying and the read is retried if the writer
+    overwrote one of the copied slots meanwhile.
+
+    With shared set, the matrices are allocated in shared memory (shm_name)
+    so that worker processes can decode into slots reserved by the writer,
+    see csi.pool.CSIDecodePool.decode_into.
+
+    The host receive time (time.time()) of every sample is kept as well,
+    e.g. to merge the samples of several radios whose hardware timestamps
+    are not synchronized.
+    """
+
+    def __init__(self, capacity=1024, csi_repr=CSI_REPR_COMPLEX128, max_shape=CSI_MAX_SHAPE, shared=False):
+        # one slot is kept free for the writer, so that readers never see
+        # a sample being decoded
+        self.capacity = int(capacity)
+        self.csi_repr = csi_repr
+        self.max_shape = tuple(max_shape)
+        self.dtype = csi_matrix_dtype(csi_repr)
+        self.hdrs = np.zeros(self.capacity, dtype=DTYPE_CSI_HDR)
+        self.rx_times = np.zeros(self.capacity, dtype=np.float64)
+        shape = (self.capacity,) + csi_matrix_shape(*self.max_shape, csi_repr=csi_repr)
+        self._shm = None
+        if shared:
+            # multiprocessing.shared_memory requires Python >= 3.8
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * self.dtype.itemsize)
+            self.matrices = np.ndarray(shape, self.dtype, self._shm.buf)
+        else:
+            self.matrices = np.empty(shape, dtype=self.dtype)
+        self.dropped = 0
+        # samples written (committed) and slots handed out to the writer
+        self._count = 0
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.capacity - 1)
+
+    @property
+    def count(self):
+        # total number of samples written since the last clear
+        return self._count
+
+    @property
+    def shm_name(self):
+        # name of the shared memory segment of the matrices, None if not shared
+        return self._shm.name if self._shm is not None else None
+
+    def accepts(self, hdr, csi):
+        """
+        Checks a record before decoding: the packed CSI has to be complete
+        and the matrix has to fit into a slot (counted in dropped otherwise).
+        :return: True if the record can be stored
+        """
+        shape = (int(hdr[0]['nr']), int(hdr[0]['nc']), int(hdr[0]['num_tones']))
+        if not check_csi_buffer(csi, *shape):
+            return False
+        if any(n > m for n, m in zip(shape, self.max_shape)):
+            self.dropped += 1
+            return False
+        return True
+
+    def append(self, hdr, csi, rx_time=None):
+        """
+        Decodes a packed CSI buffer into the next slot of the ring.
+        :param hdr: CSI header (DTYPE_CSI_HDR array of length one)
+        :param csi: packed CSI data
+        :param rx_time: host receive time; default: now
+        :return: the decoded matrix (a view into the ring) or None if invalid
+        """
+        shape = (int(hdr[0]['nr']), int(hdr[0]['nc']), int(hdr[0]['num_tones']))
+        if not check_csi_buffer(csi, *shape):
+            return None
+        slot = self._next_slot(hdr, shape, rx_time)
+        if slot is None:
+            return None
+
+        nr, nc, num_tones = shape
+        get_csi_matrices([csi], *shape, out=self.matrices[slot:slot + 1, :nr, :nc, :num_tones])
+        return self._commit(slot, shape)
+
+    def put(self, hdr, csi_matrix, rx_time=None):
+        """
+        Stores an already decoded CSI matrix, e.g. decoded by a worker
+        process, in the next slot of the ring.
+        :param hdr: CSI header (DTYPE_CSI_HDR array of length one)
+        :param csi_matrix: the decoded matrix in the representation of the ring
+        :param rx_time: host receive time; default: now
+        :return: the stored matrix (a view into the ring) or None if too large
+        """
+        shape = (int(hdr[0]['nr']), int(hdr[0]['nc']), int(hdr[0]['num_tones']))
+        slot = self._next_slot(hdr, shape, rx_time)
+        if slot is None:
+            return None
+
+        nr, nc, num_tones = shape
+        self.matrices[slot, :nr, :nc, :num_tones] = csi_matrix
+        return self._commit(slot, shape)
+
+    def reserve(self, hdrs, rx_times):
+        """
+        Reserves the next slots for samples decoded elsewhere, e.g. by worker
+        processes; readers do not see them before commit().
+        :param hdrs: CSI headers (DTYPE_CSI_HDR array) of records passing accepts()
+        :param rx_times: host receive times
+        :return: the slots (array of indices into matrices)
+        """
+        num = len(hdrs)
+        if num >= self.capacity:
+            raise ValueError('Can not reserve %d of %d slots' % (num, self.capacity))
+        with self._lock:
+            start = self._reserved
+            self._reserved += num
+
+        slots = (np.arange(start, start + num) % self.capacity).astype(np.intp)
+        self.hdrs[slots] = hdrs
+        self.rx_times[slots] = rx_times
+        return slots
+
+    def commit(self, slots):
+        """
+        Makes samples decoded into reserved slots visible to readers.
+        :return: list of the stored matrices (views into the ring)
+        """
+        with self._lock:
+            self._count += len(slots)
+
+        matrices = []
+        for hdr, slot in zip(self.hdrs[slots], slots):
+            matrices.append(self.matrices[slot, :int(hdr['nr']), :int(hdr['nc']), :int(hdr['num_tones'])])
+        return matrices
+
+    def _next_slot(self, hdr, shape, rx_time):
+        if any(n > m for n, m in zip(shape, self.max_shape)):
+            self.dropped += 1
+            return None
+
+        with self._lock:
+            slot = self._reserved % self.capacity
+            self._reserved += 1
+        self.hdrs[slot] = hdr[0]
+        self.rx_times[slot] = time.time() if rx_time is None else rx_time
+        return slot
+
+    def _commit(self, slot, shape):
+        with self._lock:
+            self._count += 1
+
+        nr, nc, num_tones = shape
+        return self.matrices[slot, :nr, :nc, :num_tones]
+
+    def latest(self, num_samples, rx_times=False, shape=None):
+        """
+        Returns the latest samples of one matrix shape without waiting for new ones.
+        :param num_samples: max. number of samples to return
+        :param rx_times: also return the host receive times
+        :param shape: matrix shape (nr, nc, num_tones); default: the shape of the latest sample
+        :return: tuple (hdrs, matrices) or (hdrs, matrices, rx_times) with at
+                 most num_samples rows, oldest first; contiguous copies
+        """
+        hdrs, matrices, times = self._latest(num_samples, shape)
+        if rx_times:
+            return hdrs, matrices, times
+        return hdrs, matrices
+
+    def _latest(self, num_samples, shape):
+        while True:
+            with self._lock:
+                count = self._count
+            latest = self._copy_latest(count, num_samples, shape)
+            with self._lock:
+                reserved = self._reserved
+            # meanwhile the writer may have decoded samples up to reserved - 1
+            # into the slots of samples up to reserved - 1 - capacity, retry
+            # if any of them was copied
+            if latest[3] is None or reserved - 1 - self.capacity < latest[3]:
+                return latest[:3]
+
+    def _copy_latest(self, count, num_samples, shape):
+        available = min(count, self.capacity - 1)
+        num_samples = max(0, min(int(num_samples), available))
+
+        if shape is None and available:
+            hdr = self.hdrs[(count - 1) % self.capacity]
+            shape = (int(hdr['nr']), int(hdr['nc']), int(hdr['num_tones']))
+        if shape is None or num_samples == 0:
+            return self._empty(shape)
+        nr, nc, num_tones = shape
+
+        # usually the latest samples all have the shape, otherwise search the whole ring
+        seqs = np.arange(count - num_samples, count)
+        if not self._match(seqs % self.capacity, shape).all():
+            seqs = np.arange(count - available, count)
+            seqs = seqs[self._match(seqs % self.capacity, shape)][-num_samples:]
+        if not len(seqs):
+            return self._empty(shape)
+
+        slots = (seqs % self.capacity).astype(np.intp)
+        return (self.hdrs[slots], np.ascontiguousarray(self.matrices[slots, :nr, :nc, :num_tones]),
+                self.rx_times[slots], seqs[0])
+
+    def _empty(self, shape):
+        matrices = np.empty((0,) + csi_matrix_shape(*(shape or (0, 0, 0)), csi_repr=self.csi_repr), dtype=self.dtype)
+        return self.hdrs[:0].copy(), matrices, self.rx_times[:0].copy(), None
+
+    def _match(self, slots, shape):
+        hdrs = self.hdrs[slots]
+        return (hdrs['nr'] == shape[0]) & (hdrs['nc'] == shape[1]) & (hdrs['num_tones'] == shape[2])
+
+    def clear(self):
+        with self._lock:
+            self._count = self._reserved = 0
+
+    def close(self):
+        """
+        Removes the shared memory segment, if any; the ring can not be used
+        afterwards.
+        """
+        if self._shm is not None:
+            self.matrices = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
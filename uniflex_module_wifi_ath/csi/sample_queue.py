@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded queue between the CSI reader and the CSI event sender.
+"""
+import collections
+import threading
+import time
+
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+DROP_POLICIES = [DROP_OLDEST, DROP_NEWEST]
+
+
+class CSISampleQueue(object):
+    """
+    Bounded FIFO of CSI samples with a configurable drop policy:
+    - drop-oldest: a new sample replaces the oldest queued one
+    - drop-newest: a new sample is discarded while the queue is full
+    """
+
+    def __init__(self, maxlen=1024, drop_policy=DROP_OLDEST):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError('Invalid drop policy: %s' % drop_policy)
+
+        self.maxlen = int(maxlen)
+        self.drop_policy = drop_policy
+        self.received = 0
+        self.dropped = 0
+        self._items = collections.deque()
+        self._first_ts = None
+        self._interrupted = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        """
+        :return: True if the item was queued, False if it was dropped
+        """
+        with self._cond:
+            self.received += 1
+            if len(self._items) >= self.maxlen:
+                self.dropped += 1
+                if self.drop_policy == DROP_NEWEST:
+                    return False
+                self._items.popleft()
+
+            if not self._items:
+                self._first_ts = time.monotonic()
+            self._items.append(item)
+            self._cond.notify()
+            return True
+
+    def get_batch(self, max_items=1, max_wait=None, timeout=None):
+        """
+        Waits for a batch of items.
+        :param max_items: return as soon as this number of items is queued
+        :param max_wait: return at the latest max_wait seconds after the
+                         first item of the batch was queued
+        :param timeout: max. time to wait for the first item; default: until
+                        an item is queued or interrupt() is called
+        :return: list of up to max_items items, empty on timeout or interrupt
+        """
+        with self._cond:
+            if not self._items:
+                if not self._interrupted:
+                    self._cond.wait(timeout)
+                if not self._items:
+                    return []
+
+            if max_wait:
+                deadline = self._first_ts + max_wait
+                while len(self._items) < max_items and not self._interrupted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            num_items = min(max_items, len(self._items))
+            batch = [self._items.popleft() for _ in range(num_items)]
+            if self._items:
+                self._first_ts = time.monotonic()
+            return batch
+
+    def interrupt(self):
+        """
+        Wakes up waiting consumers; get_batch does not wait for items
+        anymore until resume() is called.
+        """
+        with self._cond:
+            self._interrupted = True
+            self._cond.notify_all()
+
+    def resume(self):
+        with self._cond:
+            self._interrupted = False
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Shared memory ring of decoded CSI samples for consumers in other processes.
+
+The publisher (single writer) copies every sample into the next slot of a
+multiprocessing.shared_memory segment; any number of readers map the
+segment and get the samples as NumPy views, without pickling or copies.
+
+Every slot has a sequence counter (seqlock): while sample n is written it
+holds 2n+1, afterwards 2n+2. Readers check it to detect samples that were
+overwritten before or while being read (overrun). The counters rely on
+stores becoming visible in program order, as on x86.
+
+Segment layout: control block, slot counters, headers, matrices. Matrices
+are allocated for max_shape (nr, nc, num_tones); smaller matrices occupy
+the leading part of their slot and are returned as views of their shape.
+"""
+import sys
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from .constants import DTYPE_CSI_HDR, CSI_REPR_COMPLEX128
+from .decoder import csi_matrix_dtype, csi_matrix_shape
+
+
+CSI_SHM_MAGIC = 0x43534952  # 'CSIR'
+CSI_SHM_VERSION = 1
+
+DTYPE_CSI_SHM_CTRL = np.dtype([
+    ("count", np.uint64),  # number of samples written
+    ("magic", np.uint32),
+    ("version", np.uint32),
+    ("capacity", np.uint64),
+    ("max_nr", np.uint16),
+    ("max_nc", np.uint16),
+    ("max_tones", np.uint16),
+    ("csi_repr", "S16"),
+], align=True)
+
+CSI_SHM_ALIGN = 64
+
+
+def _aligned(size):
+    return (size + CSI_SHM_ALIGN - 1) // CSI_SHM_ALIGN * CSI_SHM_ALIGN
+
+
+def _layout(capacity, max_shape, csi_repr):
+    dtype = csi_matrix_dtype(csi_repr)
+    slot_shape = csi_matrix_shape(*max_shape, csi_repr=csi_repr)
+    offsets = {}
+    offset = 0
+    for name, size in [('ctrl', DTYPE_CSI_SHM_CTRL.itemsize),
+                       ('seqs', 8 * capacity),
+                       ('hdrs', DTYPE_CSI_HDR.itemsize * capacity),
+                       ('matrices', dtype.itemsize * int(np.prod(slot_shape)) * capacity)]:
+        offsets[name] = offset
+        offset += _aligned(size)
+    return offsets, offset, dtype, slot_shape
+
+
+class _CSISharedMemoryRing(object):
+
+    def _map(self, capacity, max_shape, csi_repr):
+        offsets, size, dtype, slot_shape = _layout(capacity, max_shape, csi_repr)
+        buf = self._shm.buf
+        self.capacity = capacity
+        self.max_shape = tuple(max_shape)
+        self.csi_repr = csi_repr
+        self._ctrl = np.ndarray((), DTYPE_CSI_SHM_CTRL, buf, offsets['ctrl'])
+        # plain uint64 view of the counter, written with a single store
+        self._count = np.ndarray((1,), np.uint64, buf, offsets['ctrl'])
+        self._seqs = np.ndarray((capacity,), np.uint64, buf, offsets['seqs'])
+        self._hdrs = np.ndarray((capacity,), DTYPE_CSI_HDR, buf, offsets['hdrs'])
+        self._matrices = np.ndarray((capacity,) + slot_shape, dtype, buf, offsets['matrices'])
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def count(self):
+        # total number of samples written
+        return int(self._count[0])
+
+    def _release(self):
+        self._ctrl = self._count = self._seqs = self._hdrs = self._matrices = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # samples are still referenced; unmapped once they are released
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CSISharedMemoryPublisher(_CSISharedMemoryRing):
+    """
+    Creates a shared memory CSI ring and writes samples into it; put() has
+    the signature of a CSI reader sink. Samples exceeding max_shape are
+    dropped (counted in dropped).
+    """
+
+    def __init__(self, name=None, capacity=1024, max_shape=(3, 3, 114), csi_repr=CSI_REPR_COMPLEX128):
+        capacity = int(capacity)
+        size = _layout(capacity, max_shape, csi_repr)[1]
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._map(capacity, max_shape, csi_repr)
+        self._ctrl['magic'] = CSI_SHM_MAGIC
+        self._ctrl['version'] = CSI_SHM_VERSION
+        self._ctrl['capacity'] = capacity
+        self._ctrl['max_nr'], self._ctrl['max_nc'], self._ctrl['max_tones'] = max_shape
+        self._ctrl['csi_repr'] = csi_repr.encode('ascii')
+        self._next = 0
+        self.dropped = 0
+        # close() may be called while the reader thread is in put()
+        self._lock = threading.Lock()
+
+    def put(self, hdr, csi_matrix, pld=None):
+        nr, nc, num_tones = csi_matrix.shape[:3]
+        if nr > self.max_shape[0] or nc > self.max_shape[1] or num_tones > self.max_shape[2]:
+            self.dropped += 1
+            return
+
+        with self._lock:
+            if self._shm is None:
+                return
+            seq = self._next
+            slot = seq % self.capacity
+            self._seqs[slot] = 2 * seq + 1
+            self._hdrs[slot] = hdr[0]
+            self._matrices[slot, :nr, :nc, :num_tones] = csi_matrix
+            self._seqs[slot] = 2 * seq + 2
+            self._next = seq + 1
+            self._count[0] = self._next
+
+    def close(self):
+        """
+        Removes the segment; mapped readers keep their mapping until closed.
+        """
+        with self._lock:
+            if self._shm is None:
+                return
+            self._shm.unlink()
+            self._release()
+            self._shm = None
+
+
+class CSISharedMemoryReader(_CSISharedMemoryRing):
+    """
+    Maps a shared memory CSI ring created by CSISharedMemoryPublisher and
+    reads the samples written since the last read. Every reader has its
+    own position; samples overwritten before being read are skipped and
+    counted in overruns.
+
+    Samples are returned as views into the ring: they stay valid until the
+    publisher wraps around, which is_valid(seq) checks after processing.
+    """
+
+    def __init__(self, name, latest=True):
+        self._shm = _attach(name)
+        ctrl = np.ndarray((), DTYPE_CSI_SHM_CTRL, self._shm.buf, 0)
+        if ctrl['magic'] != CSI_SHM_MAGIC or ctrl['version'] != CSI_SHM_VERSION:
+            self._shm.close()
+            raise ValueError('No CSI shared memory ring: %s' % name)
+        self._map(int(ctrl['capacity']), (int(ctrl['max_nr']), int(ctrl['max_nc']), int(ctrl['max_tones'])),
+                  ctrl['csi_repr'].item().decode('ascii'))
+        del ctrl
+        # start with new samples or with the oldest one available
+        self.position = self.count if latest else max(0, self.count - self.capacity + 1)
+        self.overruns = 0
+
+    def is_valid(self, seq):
+        """
+        :return: True if sample seq was not overwritten yet
+        """
+        return self._seqs[seq % self.capacity] == 2 * seq + 2
+
+    def read(self, max_samples=None, copy=False):
+        """
+        Yields the samples written since the last read.
+        :param max_samples: stop after this number of samples
+        :param copy: yield copies, which stay valid
+        :return: generator of (seq, hdr, csi_matrix); hdr is a DTYPE_CSI_HDR array of length one
+        """
+        num = 0
+        while max_samples is None or num < max_samples:
+            count = self.count
+            # the slot of the oldest sample is being reused by the writer
+            oldest = count - self.capacity + 1
+            if self.position < oldest:
+                self.overruns += oldest - self.position
+                self.position = oldest
+            if self.position >= count:
+                return
+
+            seq = self.position
+            self.position += 1
+            slot = seq % self.capacity
+            if self._seqs[slot] != 2 * seq + 2:
+                self.overruns += 1
+                continue
+
+            hdr = self._hdrs[slot:slot + 1]
+            shape = (int(hdr[0]['nr']), int(hdr[0]['nc']), int(hdr[0]['num_tones']))
+            csi_matrix = self._matrices[slot, :shape[0], :shape[1], :shape[2]]
+            if copy:
+                hdr, csi_matrix = hdr.copy(), csi_matrix.copy()
+                if not self.is_valid(seq):
+                    self.overruns += 1
+                    continue
+
+            num += 1
+            yield seq, hdr, csi_matrix
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._release()
+        self._shm = None
+
+
+def _attach(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # w/o track=False the resource tracker would unlink the segment of the
+    # publisher once this process exits, so do not register it
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic CSI source.
+
+Generates valid CSI records (header, 10 bit packed CSI matrix, payload) in
+the layout of the CSI device, so that the CSI pipeline can be exercised
+and benchmarked without Atheros hardware. Records can be written to a
+regular file or streamed into a FIFO, both readable by CSIReader.
+"""
+import os
+import threading
+import time
+import numpy as np
+from .constants import DTYPE_CSI_HDR
+from .decoder import BITS_PER_SYMBOL, pack_csi_matrix
+from .receiver import CSI_DATA_OFFSET
+
+
+# number of tones per CSI bandwidth code
+CSI_NUM_TONES = [56, 114]
+
+# default CSI matrix shapes (nr, nc, num_tones)
+CSI_SIM_SHAPES = [(3, 3, 114)]
+
+
+def random_csi_matrix(nr, nc, num_tones, rng=None):
+    rng = np.random if rng is None else rng
+    lim = 1 << (BITS_PER_SYMBOL - 1)
+    shape = (nr, nc, num_tones)
+    return (rng.randint(-lim, lim, shape) + 1j*rng.randint(-lim, lim, shape)).astype(complex)
+
+
+def make_csi_record(csi_matrix, pld=b'', tstamp=0, channel=2437, phyerr=0, noise=0,
+                    rate=None, rssi=(40, 40, 40)):
+    """
+    Creates a CSI record as returned by the CSI device.
+    :param csi_matrix: complex array of shape (nr, nc, num_tones)
+    :param pld: payload bytes
+    :param rate: CSI rate code; default: MCS matching the number of streams
+    :param rssi: RSSI per receive chain
+    :return: the record as bytes
+    """
+    nr, nc, num_tones = csi_matrix.shape[:3]
+    csi = pack_csi_matrix(csi_matrix)
+
+    hdr = np.zeros(1, dtype=DTYPE_CSI_HDR)
+    hdr['tstamp'] = tstamp
+    hdr['csi_len'] = len(csi)
+    hdr['channel'] = channel
+    hdr['phyerr'] = phyerr
+    hdr['noise'] = noise
+    hdr['rate'] = (128 + 8*(nc - 1)) if rate is None else rate
+    hdr['chanbw'] = 1 if num_tones > CSI_NUM_TONES[0] else 0
+    hdr['num_tones'] = num_tones
+    hdr['nr'] = nr
+    hdr['nc'] = nc
+    hdr['rssi'] = max(rssi)
+    hdr['rssi_0'], hdr['rssi_1'], hdr['rssi_2'] = rssi
+    hdr['pld_len'] = len(pld)
+
+    spare = b'\0' * (CSI_DATA_OFFSET - DTYPE_CSI_HDR.itemsize)
+    return hdr.tobytes() + spare + csi.tobytes() + bytes(pld)
+
+
+def generate_csi_records(num_records, shapes=CSI_SIM_SHAPES, pld_len=64, seed=None, tstamp_ival=1000):
+    """
+    Yields synthetic CSI records, cycling through the given matrix shapes.
+    Matrices are drawn once per shape and reused, so generating records is
+    cheap compared to reading and decoding them.
+    """
+    rng = np.random.RandomState(seed)
+    matrices = [random_csi_matrix(nr, nc, num_tones, rng) for nr, nc, num_tones in shapes]
+    pld = rng.randint(0, 256, pld_len).astype(np.uint8).tobytes()
+
+    for ii in range(num_records):
+        yield make_csi_record(matrices[ii % len(matrices)], pld, tstamp=ii * tstamp_ival)
+
+
+def write_csi_file(path, num_records, shapes=CSI_SIM_SHAPES, pld_len=64, seed=None):
+    with open(path, 'wb') as f:
+        for rec in generate_csi_records(num_records, shapes, pld_len, seed):
+            f.write(rec)
+    return path
+
+
+class CSISimulator(object):
+    """
+    Streams synthetic CSI records into a FIFO (created if missing) or a
+    file at a given packet rate; rate=None writes as fast as possible.
+    """
+
+    def __init__(self, path, num_records, shapes=CSI_SIM_SHAPES, rate=None, pld_len=64, seed=None):
+        self.path = path
+        self.num_records = num_records
+        self.shapes = shapes
+        self.rate = rate
+        self.pld_len = pld_len
+        self.seed = seed
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not os.path.exists(self.path):
+            os.mkfifo(self.path)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def run(self):
+        # opening a FIFO blocks until the reader opened it
+        with open(self.path, 'wb', buffering=0) as f:
+            start = time.monotonic()
+            for rec in generate_csi_records(self.num_records, self.shapes, self.pld_len, self.seed):
+                if self._stop.is_set():
+                    break
+                if self.rate:
+                    delay = start + self.sent / float(self.rate) - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                f.write(rec)
+                self.sent += 1
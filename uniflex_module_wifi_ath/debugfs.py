@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import errno
+import threading
+from collections import namedtuple, OrderedDict
+
+__author__ = "Piotr Gawlowicz, Anatolij Zubow"
+__copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
+__version__ = "0.1.0"
+__email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
+
+
+# errors of an access through a stale file descriptor, e.g. after the
+# driver was reloaded; other errors (e.g. EINVAL for a rejected value) are
+# reported by the driver and not retried
+DEBUGFS_STALE_ERRNOS = (errno.EBADF, errno.ENOENT, errno.ENODEV)
+
+
+class DebugfsFile(object):
+    """
+    Open debugfs control file; all access is done with positional reads and
+    writes at offset 0 and serialized by a per-file lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = None
+        self.open()
+
+    def open(self):
+        # some control files are write- or read-only
+        for flags in (os.O_RDWR, os.O_WRONLY, os.O_RDONLY):
+            try:
+                self.fd = os.open(self.path, flags)
+                return
+            except PermissionError:
+                continue
+        raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), self.path)
+
+    def close(self):
+        if self.fd is not None:
+            fd, self.fd = self.fd, None
+            try:
+                os.close(fd)
+            except OSError:
+                # descriptor is stale already
+                pass
+
+    def write(self, value):
+        if not isinstance(value, bytes):
+            value = str(value).encode('ascii')
+        with self.lock:
+            return os.pwrite(self.fd, value, 0)
+
+    def read(self, size=4096):
+        chunks = []
+        offset = 0
+        with self.lock:
+            while True:
+                chunk = os.pread(self.fd, size, offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+        return b''.join(chunks).decode('ascii')
+
+
+class DebugfsAccessor(object):
+    """
+    Access to the debugfs control files of the wireless drivers, i.e.
+    <root>/<phy>/<driver>/<name>. Files are opened on first use and kept
+    open; they are re-opened once if an access fails with a stale file
+    descriptor, e.g. because the driver was reloaded. The root can be
+    changed for testing.
+    """
+
+    def __init__(self, root='/sys/kernel/debug/ieee80211'):
+        self.root = root
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def path(self, phy, driver, name):
+        return os.path.join(self.root, phy, driver, name)
+
+    def get(self, phy, driver, name):
+        key = (phy, driver, name)
+        dfile = self._files.get(key)
+        if dfile is None:
+            with self._lock:
+                dfile = self._files.get(key)
+                if dfile is None:
+                    dfile = DebugfsFile(self.path(phy, driver, name))
+                    self._files[key] = dfile
+        return dfile
+
+    def _access(self, phy, driver, name, func):
+        dfile = self.get(phy, driver, name)
+        try:
+            return func(dfile)
+        except OSError as e:
+            if e.errno not in DEBUGFS_STALE_ERRNOS:
+                raise
+            # stale file descriptor, retry with a fresh one
+            self.close(phy, driver, name)
+            return func(self.get(phy, driver, name))
+
+    def write(self, phy, driver, name, value):
+        return self._access(phy, driver, name, lambda dfile: dfile.write(value))
+
+    def read(self, phy, driver, name):
+        return self._access(phy, driver, name, lambda dfile: dfile.read())
+
+    def close(self, phy=None, driver=None, name=None):
+        """
+        Closes the matching files, all files if called w/o arguments.
+        """
+        with self._lock:
+            for key in list(self._files):
+                if all(v is None or v == k for v, k in zip((phy, driver, name), key)):
+                    self._files.pop(key).close()
+
+
+class DebugfsCache(object):
+    """
+    Short-lived cache of parsed debugfs readbacks. Entries expire after
+    ttl seconds and have to be invalidated by whoever writes the file.
+    """
+
+    def __init__(self, ttl=0.1):
+        self.ttl = ttl
+        self._entries = {}
+
+    def get(self, key, load):
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+
+        value = load()
+        self._entries[key] = (now, value)
+        return value
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+# per access category TX queue parameters, see read_file_txq_params
+TxqParams = namedtuple('TxqParams', ['qnum', 'aifs', 'cwmin', 'cwmax', 'burstTime', 'readyTime'])
+
+# size of the readback buffers of the patched driver
+DRIVER_READ_BUF_SIZE = 1024
+
+# complete lines only, the driver truncates readbacks at DRIVER_READ_BUF_SIZE
+_TXQ_PARAMS_RE = re.compile(r'\((\w+)\):\s*' + r'\s*'.join(r'%s:\s*(-?\d+)' % f for f in TxqParams._fields) + r'\n')
+_PER_FLOW_TX_POWER_RE = re.compile(r'Mark:\s*(-?\d+)\s+Power:\s*(-?\d+)\s+Rate:\s*-?\d+\n')
+
+
+def parse_txq_params(data):
+    """
+    Parses the txq_params readback of the patched ath9k driver.
+    :return: ordered dict AC name (VO, VI, BE, BK) -> TxqParams
+    """
+    result = OrderedDict()
+    for match in _TXQ_PARAMS_RE.finditer(data):
+        result[match.group(1)] = TxqParams(*[int(v) for v in match.groups()[1:]])
+    return result
+
+
+def parse_per_flow_tx_power(data):
+    """
+    Parses the per_flow_tx_power readback of the patched ath9k driver.
+    :return: dict flow mark -> TX power
+    """
+    return dict((int(mark), int(power)) for mark, power in _PER_FLOW_TX_POWER_RE.findall(data))
+
+
+def is_truncated(data):
+    """
+    True if a readback filled the driver buffer, i.e. entries may be missing.
+    """
+    return len(data) >= DRIVER_READ_BUF_SIZE - 1
@@ -0,0 +1,17 @@
+from uniflex.core.events import EventBase
+
+__author__ = "Piotr Gawlowicz, Anatolij Zubow"
+__copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
+__version__ = "0.1.0"
+__email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
+
+
+class AirtimeUtilizationEvent(EventBase):
+    """
+    Airtime utilization of an interface, see survey.AirtimeUtilization.
+    """
+
+    def __init__(self, iface, utilization):
+        super().__init__()
+        self.iface = iface
+        self.utilization = utilization
@@ -0,0 +1,353 @@
+import time
+import logging
+import threading
+import subprocess
+import zmq
+from collections import OrderedDict
+
+__author__ = "Piotr Gawlowicz, Anatolij Zubow"
+__copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
+__version__ = "0.1.0"
+__email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
+
+
+def hmac_conf_key(hmac_conf):
+    """
+    Fingerprint of a hMAC configuration, i.e. slot duration, number of slots
+    and the (MAC address, TID map) entries of each slot.
+    :return: hashable key or None if the configuration can not be inspected
+    """
+    try:
+        slots = []
+        for ii in range(hmac_conf.getNumSlots()):
+            policy = hmac_conf.getAccessPolicy(ii)
+            entries = policy.getEntries() if policy is not None else []
+            slots.append(tuple(tuple(entry) for entry in entries))
+        return (hmac_conf.getSlotDuration(), hmac_conf.getNumSlots(), tuple(slots))
+    except (AttributeError, TypeError):
+        return None
+
+
+class HMACConfCache(object):
+    """
+    Compiled hMAC configuration strings keyed on the configuration contents,
+    so that re-sending a known schedule does not rebuild the string. Least
+    recently used configurations are evicted beyond maxsize.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, hmac_conf, kind, compile):
+        key = hmac_conf_key(hmac_conf)
+        if key is None:
+            self.misses += 1
+            return compile()
+
+        key = (kind, key)
+        conf_str = self._cache.get(key)
+        if conf_str is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return conf_str
+
+        self.misses += 1
+        conf_str = compile()
+        self._cache[key] = conf_str
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return conf_str
+
+    def conf_string(self, hmac_conf):
+        """
+        :return: hmac_conf.createConfString(), cached
+        """
+        return self._get(hmac_conf, 'conf', hmac_conf.createConfString)
+
+    def allow_all_string(self, hmac_conf):
+        """
+        :return: hmac_conf.createAllowAllConfString(), cached
+        """
+        return self._get(hmac_conf, 'allow_all', hmac_conf.createAllowAllConfString)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class HMACControlChannel(object):
+    """
+    Persistent control connection to the hMAC userspace daemon (ZMQ REQ/REP).
+
+    Requests time out after timeout seconds. A REQ socket can not be used
+    anymore after a timeout, so it is closed and a new one connected for
+    the next request (retries times per request).
+
+    Asynchronous updates are coalesced: submit() only keeps the latest not
+    yet sent message, i.e. a burst of updates results in sending the last
+    configuration, never stale ones. They are sent by a worker thread,
+    which is stopped by close(); the channel can not be used afterwards.
+    """
+
+    def __init__(self, port=1217, host='localhost', timeout=1.0, retries=1, context=None):
+        self.log = logging.getLogger('HMACControlChannel')
+        self.endpoint = "tcp://" + host + ":" + str(port)
+        self.timeout = timeout
+        self.retries = retries
+        self.context = context if context is not None else zmq.Context.instance()
+        self._socket = None
+        # REQ sockets require strict send/recv alternation
+        self._lock = threading.Lock()
+
+        # asynchronous updates
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._worker = None
+        self._closed = False
+        self.sent = 0
+        self.coalesced = 0
+        self.last_error = None
+
+    def _connect(self):
+        sock = self.context.socket(zmq.REQ)
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.connect(self.endpoint)
+        return sock
+
+    def reset(self):
+        """
+        Drops the current connection, e.g. after the daemon was restarted.
+        """
+        with self._lock:
+            self._close_socket()
+
+    def _close_socket(self):
+        if self._socket is not None:
+            self._socket.close(linger=0)
+            self._socket = None
+
+    def request(self, msg, timeout=None, retries=None):
+        """
+        Sends a control message and waits for the reply.
+        :param msg: the message (str or bytes)
+        :param timeout: timeout per attempt in seconds; default: the channel timeout
+        :param retries: number of retries after a timeout; default: the channel retries
+        :return: the reply (bytes)
+        :raise zmq.Again: if the daemon did not answer in time
+        :raise RuntimeError: if the channel is closed
+        """
+        if not isinstance(msg, bytes):
+            msg = msg.encode('ascii')
+        timeout_ms = int((self.timeout if timeout is None else timeout) * 1000)
+        retries = self.retries if retries is None else retries
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('hMAC control channel closed')
+            for attempt in range(retries + 1):
+                if self._socket is None:
+                    self._socket = self._connect()
+                self._socket.setsockopt(zmq.RCVTIMEO, timeout_ms)
+                self._socket.setsockopt(zmq.SNDTIMEO, timeout_ms)
+                try:
+                    self._socket.send(msg)
+                    reply = self._socket.recv()
+                    self.sent += 1
+                    return reply
+                except zmq.Again:
+                    # socket is stuck in send or recv state, reconnect
+                    self._close_socket()
+                    if attempt == retries:
+                        raise
+                    self.log.warning("hMAC control request timed out (%d/%d)" % (attempt + 1, retries + 1))
+
+    def submit(self, msg, callback=None):
+        """
+        Sends a control message asynchronously; replaces a message that was
+        submitted before and is not sent yet.
+        :param callback: called as callback(reply, error) after sending
+        :raise RuntimeError: if the channel is closed
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('hMAC control channel closed')
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (msg, callback)
+            self._cond.notify_all()
+
+            if self._worker is None or not self._worker.is_alive():
+                self._busy = False
+                self._worker = threading.Thread(target=self._run)
+                self._worker.daemon = True
+                self._worker.start()
+
+    def cancel(self):
+        """
+        Drops a submitted but not yet sent message.
+        """
+        with self._cond:
+            self._pending = None
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Waits until all submitted messages are sent.
+        :return: True if nothing is pending anymore
+        :raise RuntimeError: if the worker thread died with messages pending
+        """
+        with self._cond:
+            if self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout):
+                return True
+            if self._worker is None or not self._worker.is_alive():
+                raise RuntimeError('hMAC control worker died')
+            return False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                if self._closed:
+                    return
+                msg, callback = self._pending
+                self._pending = None
+                self._busy = True
+
+            reply, error = None, None
+            try:
+                reply = self.request(msg)
+            except Exception as e:
+                self.log.error("Asynchronous hMAC control request failed: %s" % str(e))
+                error = e
+            self.last_error = error
+
+            if callback is not None:
+                try:
+                    callback(reply, error)
+                except Exception as e:
+                    self.log.error("hMAC control callback failed: %s" % str(e))
+
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def close(self):
+        """
+        Drops pending messages, stops the worker thread after the message in
+        flight, if any, and closes the connection.
+        """
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify_all()
+            worker = self._worker
+        if worker is not None:
+            worker.join(self.timeout * (self.retries + 1) + 1.0)
+            if worker.is_alive():
+                self.log.warning("hMAC control worker did not stop")
+        self.reset()
+
+
+class HMACSupervisor(object):
+    """
+    Runs the hMAC userspace daemon as child process.
+
+    The daemon is ready as soon as it answers a request on the control
+    channel, i.e. start() returns once the daemon can be configured instead
+    of after a fixed delay. stop() terminates the daemon via the control channel and
+    waits for the process to exit; it is killed if it does not exit in time.
+    """
+
+    def __init__(self, channel, ready_timeout=5.0, stop_timeout=1.0):
+        self.log = logging.getLogger('HMACSupervisor')
+        self.channel = channel
+        self.ready_timeout = ready_timeout
+        self.stop_timeout = stop_timeout
+        self.proc = None
+        self.args = None
+
+    def is_running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self, args, probe=b''):
+        """
+        Starts the daemon and waits until it is ready.
+        :param args: the command line as list
+        :param probe: control message sent to check readiness, e.g. the
+            initial configuration; default: empty message
+        :raise RuntimeError: if the daemon exits or is not ready in time;
+            a daemon not ready in time is killed
+        """
+        if self.is_running():
+            self.kill()
+
+        self.args = list(args)
+        self.proc = subprocess.Popen(self.args, shell=False)
+        # connect to the new daemon on next request
+        self.channel.reset()
+        try:
+            self.wait_ready(self.ready_timeout, probe)
+        except RuntimeError:
+            # do not leave a daemon behind that can not be configured
+            self.kill()
+            raise
+        return self.proc
+
+    def wait_ready(self, timeout, probe=b''):
+        deadline = time.monotonic() + timeout
+        attempt_timeout = 0.01
+        while True:
+            if self.proc.poll() is not None:
+                raise RuntimeError('hMAC daemon exited with code %d' % self.proc.returncode)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError('hMAC daemon not ready after %.1f s' % timeout)
+            # the request is queued until the daemon binds its control port;
+            # short attempts to notice if the daemon exits meanwhile
+            try:
+                self.channel.request(probe, timeout=min(attempt_timeout, remaining), retries=0)
+                self.log.debug("hMAC daemon ready (pid %d)" % self.proc.pid)
+                return
+            except zmq.Again:
+                pass
+            attempt_timeout = min(2 * attempt_timeout, 0.1)
+
+    def stop(self, conf_str=None):
+        """
+        Terminates the daemon, optionally after installing a last
+        configuration (e.g. allow all).
+        """
+        try:
+            if conf_str is not None:
+                self.channel.request(conf_str)
+            self.channel.request(b'TERMINATE')
+        except (zmq.ZMQError, RuntimeError) as e:
+            if self.proc is None:
+                raise
+            self.log.warning("Failed to terminate hMAC daemon: %s; killing it" % str(e))
+            self.kill()
+            return
+
+        if self.proc is not None:
+            try:
+                self.proc.wait(self.stop_timeout)
+            except subprocess.TimeoutExpired:
+                self.log.warning("hMAC daemon did not exit; killing it")
+                self.kill()
+            self.proc = None
+        self.channel.reset()
+
+    def kill(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+        self.channel.reset()
+
+    def restart(self, args=None):
+        if self.is_running():
+            self.stop()
+        return self.start(args if args is not None else self.args)
@@ -0,0 +1,57 @@
+import logging
+import numpy as np
+
+__author__ = "Piotr Gawlowicz, Anatolij Zubow"
+__copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
+__version__ = "0.1.0"
+__email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
+
+
+class NoiseFloorEstimator(object):
+    """
+    Noise floor per channel (center frequency in MHz), smoothed by an
+    exponentially weighted moving average:
+        noise = noise + alpha * (sample - noise)
+
+    Samples come from the nl80211 survey or the noise field of received
+    CSI records. Reading the estimate does not block, i.e. it is updated
+    by the background threads and read as is.
+    """
+
+    def __init__(self, alpha=0.1):
+        self.log = logging.getLogger('NoiseFloorEstimator')
+        self.alpha = alpha
+        self._noise = {}
+        # channel of the latest sample, i.e. the channel in use
+        self.channel = None
+        self.samples = 0
+
+    def update(self, channel, noise):
+        # noise floor is negative; 0 means not reported by the driver
+        if noise is None or noise >= 0:
+            return
+        old = self._noise.get(channel)
+        self._noise[channel] = float(noise) if old is None else old + self.alpha * (noise - old)
+        self.channel = channel
+        self.samples += 1
+
+    def update_survey(self, survey):
+        if survey is not None:
+            self.update(survey.frequency, survey.noise)
+
+    def csi_sink(self, hdr, csi, pld):
+        # raw CSI sink; noise is a signed dBm value in an uint8 field
+        self.update(int(hdr['channel'][0]), int(hdr['noise'].view(np.int8)[0]))
+
+    def get(self, channel=None):
+        """
+        :param channel: center frequency in MHz; default: the channel in use
+        :return: the smoothed noise floor in dBm or None if not measured yet
+        """
+        if channel is None:
+            channel = self.channel
+        return self._noise.get(channel)
+
+    def clear(self):
+        self._noise.clear()
+        self.channel = None
@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+
+__author__ = "Piotr Gawlowicz, Anatolij Zubow"
+__copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
+__version__ = "0.1.0"
+__email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
+
+
+class PhyResolver(object):
+    """
+    Resolves the wiphy index of a network interface without spawning
+    processes: the index is read from sysfs (phy80211/index) or, if not
+    available, requested via nl80211. Results are cached per interface.
+
+    The cache is invalidated by rtnetlink link events, i.e. whenever an
+    interface is added, removed or changed. An interface can only change
+    its wiphy by being deleted and re-created, so link events also cover
+    wiphy changes. Events carry the new name of a renamed interface, so
+    entries are matched by interface index as well.
+    """
+
+    def __init__(self, sysfs_root='/sys/class/net', monitor=True):
+        self.log = logging.getLogger('PhyResolver')
+        self.sysfs_root = sysfs_root
+        self._cache = {}
+        # interface index of cached interfaces, if known
+        self._ifindex = {}
+        self._lock = threading.Lock()
+        self._monitor = None
+        self._ipr = None
+        if monitor:
+            self.start_monitor()
+
+    def get_phy_index(self, iface):
+        phy_idx = self._cache.get(iface)
+        if phy_idx is None:
+            phy_idx, ifindex = self._resolve(iface)
+            with self._lock:
+                self._cache[iface] = phy_idx
+                self._ifindex[iface] = ifindex
+        return phy_idx
+
+    def get_phy_name(self, iface):
+        return 'phy' + str(self.get_phy_index(iface))
+
+    def invalidate(self, iface=None):
+        with self._lock:
+            if iface is None:
+                self._cache.clear()
+                self._ifindex.clear()
+            else:
+                self._cache.pop(iface, None)
+                self._ifindex.pop(iface, None)
+
+    def _resolve(self, iface):
+        # returns (wiphy index, interface index or None)
+        path = os.path.join(self.sysfs_root, iface)
+        if os.path.isdir(self.sysfs_root) and not os.path.isdir(path):
+            raise ValueError('Unknown interface: %s' % iface)
+        try:
+            with open(os.path.join(path, 'phy80211', 'index'), 'r') as f:
+                phy_idx = int(f.read())
+            return phy_idx, self._read_ifindex(path)
+        except (IOError, OSError, ValueError):
+            pass
+
+        # fall back to nl80211
+        from pyroute2 import IW, IPRoute
+        with IPRoute() as ipr:
+            ifindex = ipr.link_lookup(ifname=iface)
+        if not ifindex:
+            raise ValueError('Unknown interface: %s' % iface)
+
+        iw = IW()
+        try:
+            for msg in iw.get_interface_by_ifindex(ifindex[0]):
+                return int(msg.get_attr('NL80211_ATTR_WIPHY')), ifindex[0]
+        finally:
+            iw.close()
+        raise ValueError('No wiphy found for interface: %s' % iface)
+
+    @staticmethod
+    def _read_ifindex(path):
+        try:
+            with open(os.path.join(path, 'ifindex'), 'r') as f:
+                return int(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def start_monitor(self):
+        if self._monitor is not None:
+            return
+
+        try:
+            from pyroute2 import IPRoute
+            self._ipr = IPRoute()
+            self._ipr.bind()
+        except Exception as e:
+            # w/o monitor cached entries stay valid until invalidated
+            self.log.warning("Failed to monitor link events: %s" % str(e))
+            self._ipr = None
+            return
+
+        self._monitor = threading.Thread(target=self._run_monitor)
+        self._monitor.daemon = True
+        self._monitor.start()
+
+    def stop_monitor(self):
+        if self._ipr is not None:
+            self._ipr.close()
+            self._ipr = None
+        self._monitor = None
+
+    def _run_monitor(self):
+        ipr = self._ipr
+        try:
+            while self._ipr is ipr:
+                for msg in ipr.get():
+                    self._handle_link_event(msg)
+        except Exception as e:
+            if self._ipr is ipr:
+                self.log.warning("Link event monitor stopped: %s" % str(e))
+                self.invalidate()
+
+    def _handle_link_event(self, msg):
+        if msg.get('event') not in ('RTM_NEWLINK', 'RTM_DELLINK'):
+            return
+
+        # a renamed interface is reported under its new name
+        name, ifindex = msg.get_attr('IFLA_IFNAME'), msg.get('index')
+        stale = [iface for iface in list(self._cache)
+                 if iface == name or (ifindex is not None and self._ifindex.get(iface) == ifindex)]
+        for iface in stale:
+            self.log.debug("Link event on %s; invalidate phy" % iface)
+            self.invalidate(iface)
@@ -0,0 +1,166 @@
+import time
+import socket
+import logging
+import threading
+import collections
+
+__author__ = "Piotr Gawlowicz, Anatolij Zubow"
+__copyright__ = "Copyright (c) 2015, Technische Universität Berlin"
+__version__ = "0.1.0"
+__email__ = "{gawlowicz, zubow}@tkn.tu-berlin.de"
+
+# survey of the channel in use; times are the driver counters in ms,
+# noise in dBm (None if not reported)
+SurveySample = collections.namedtuple('SurveySample',
+                                      ['tstamp', 'frequency', 'noise', 'time', 'busy', 'ext_busy', 'rx', 'tx'])
+
+# fraction of time the channel was busy, receiving or transmitting during duration seconds
+AirtimeUtilization = collections.namedtuple('AirtimeUtilization',
+                                            ['tstamp', 'frequency', 'duration', 'busy', 'rx', 'tx'])
+
+
+def parse_survey(msgs, tstamp=None):
+    """
+    Extracts the survey of the channel in use from a NL80211_CMD_GET_SURVEY dump.
+    :return: SurveySample or None if no channel is in use
+    """
+    tstamp = time.monotonic() if tstamp is None else tstamp
+    # read the whole dump, the rest would be left on the netlink socket
+    msgs = list(msgs)
+    for msg in msgs:
+        info = msg.get_attr('NL80211_ATTR_SURVEY_INFO')
+        if info is None or not info.get_attr('NL80211_SURVEY_INFO_IN_USE'):
+            continue
+
+        noise = info.get_attr('NL80211_SURVEY_INFO_NOISE')
+        if noise is not None and noise > 127:
+            # signed dBm value reported as u8
+            noise -= 256
+        return SurveySample(tstamp, info.get_attr('NL80211_SURVEY_INFO_FREQUENCY'), noise,
+                            info.get_attr('NL80211_SURVEY_INFO_TIME'),
+                            info.get_attr('NL80211_SURVEY_INFO_TIME_BUSY'),
+                            info.get_attr('NL80211_SURVEY_INFO_TIME_EXT_BUSY'),
+                            info.get_attr('NL80211_SURVEY_INFO_TIME_RX'),
+                            info.get_attr('NL80211_SURVEY_INFO_TIME_TX'))
+    return None
+
+
+def airtime_utilization(old, new):
+    """
+    Airtime utilization between two survey samples of the same channel.
+    :return: AirtimeUtilization or None if the counters were reset, the
+             channel changed or the driver does not report channel time
+    """
+    if old is None or new is None or old.frequency != new.frequency:
+        return None
+    if old.time is None or new.time is None or new.time <= old.time:
+        return None
+
+    active = float(new.time - old.time)
+
+    def fraction(attr):
+        v_old, v_new = getattr(old, attr), getattr(new, attr)
+        if v_old is None or v_new is None or v_new < v_old:
+            return None
+        return min((v_new - v_old) / active, 1.0)
+
+    return AirtimeUtilization(new.tstamp, new.frequency, new.tstamp - old.tstamp,
+                              fraction('busy'), fraction('rx'), fraction('tx'))
+
+
+class SurveyMonitor(object):
+    """
+    Samples nl80211 survey counters over a persistent netlink socket and
+    derives the airtime utilization from counter deltas.
+
+    With window=0 the utilization refers to the time since the previous
+    sample of the interface, otherwise to the last window seconds (at
+    least the time since the previous sample).
+    """
+
+    def __init__(self, window=0):
+        self.log = logging.getLogger('SurveyMonitor')
+        self.window = window
+        self._iw = None
+        self._ifindex = {}
+        self._samples = {}
+        # netlink requests/responses must not interleave
+        self._lock = threading.RLock()
+
+    def _get_ifindex(self, iface):
+        ifindex = self._ifindex.get(iface)
+        if ifindex is None:
+            ifindex = self._ifindex[iface] = socket.if_nametoindex(iface)
+        return ifindex
+
+    def sample(self, iface, record=True):
+        """
+        Dumps the survey of an interface.
+        :param record: keep the sample for the utilization window; without,
+            e.g. for the noise floor only, get_utilization is not affected
+        :return: SurveySample of the channel in use or None
+        """
+        with self._lock:
+            if self._iw is None:
+                from pyroute2 import IW
+                self._iw = IW()
+            try:
+                msgs = self._iw.survey(self._get_ifindex(iface))
+                survey = parse_survey(msgs)
+            except Exception:
+                # interface may have been re-created, socket may be broken
+                self._ifindex.pop(iface, None)
+                self._close()
+                raise
+
+            if not record:
+                return survey
+            samples = self._samples.get(iface)
+            if samples is None:
+                samples = self._samples[iface] = collections.deque()
+            if survey is not None:
+                samples.append(survey)
+                # keep the oldest sample that still covers the window
+                while len(samples) > 2 and survey.tstamp - samples[1].tstamp >= self.window:
+                    samples.popleft()
+            return survey
+
+    def get_utilization(self, iface):
+        """
+        Samples the survey of an interface and computes the airtime utilization.
+        :return: AirtimeUtilization or None if not available yet
+        """
+        with self._lock:
+            new = self.sample(iface)
+            samples = self._samples[iface]
+            if new is None or len(samples) < 2:
+                return None
+
+            util = airtime_utilization(samples[0], new)
+            if util is None:
+                # counters reset or channel changed; restart the window
+                samples.clear()
+                samples.append(new)
+            return util
+
+    def get_last_sample(self, iface):
+        samples = self._samples.get(iface)
+        return samples[-1] if samples else None
+
+    def reset(self, iface=None):
+        with self._lock:
+            if iface is None:
+                self._samples.clear()
+                self._ifindex.clear()
+            else:
+                self._samples.pop(iface, None)
+                self._ifindex.pop(iface, None)
+
+    def _close(self):
+        if self._iw is not None:
+            self._iw.close()
+            self._iw = None
+
+    def close(self):
+        with self._lock:
+            self._close()